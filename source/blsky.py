@@ -1,36 +1,159 @@
+import aiohttp
 import asyncio
+import json
 import re
-import urlextract
-from atproto import Client
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from atproto import AsyncClient
+from atproto import Session, SessionEvent
 from atproto import models
+from atproto import AtUri
+from atproto_client.request import AsyncRequest
+from atproto_client.exceptions import RequestErrorBase
 
 import main
 import bot
 import sql
+import jetstream
+import metrics
+from cache import TTLCache
+from ratelimit import RateLimitBudget
+from scheduler import poll_scheduler
 from reconnect_decorator import reconnect_api_with_backoff
 
-postFetchCount = 5 # number of posts to fetch from Bluesky API per API call. (More than one is necessary if multiple posts are made in a short time)
+postFetchCount = 5 # first page size for authors without a posting history yet
+MIN_PAGE_SIZE = 2 # first page size for quiet authors, enough for the "anything new?" check
+MAX_PAGE_SIZE = 100 # Bluesky API limit, used for follow-up pages
+MAX_FEED_PAGES = 5 # upper bound of pages fetched per author per cycle
+MAX_CATCHUP_AGE = 24 * 60 * 60 # posts older than this (seconds) are never shared, e.g. after long downtime
+POST_RATE_SMOOTHING = 0.3 # weight of the latest cycle in the posting rate average
 postFetchTimer = 60 # time in seconds to wait before fetching new posts.
 
+# Jetstream push ingestion (optional, enabled by BLUESKY_JETSTREAM_URL)
+BLUESKY_STREAM_FALLBACK_TIMER = 600 # polling interval while the stream is connected, only used to fill gaps
+JETSTREAM_CURSOR_KEY = "bluesky_jetstream_cursor"
+JETSTREAM_CURSOR_SAVE_INTERVAL = 10 # seconds between cursor checkpoints
+JETSTREAM_FILTER_REFRESH_INTERVAL = 60 # seconds between checks for added/removed subscriptions
+JETSTREAM_DEBOUNCE = 3 # seconds to wait after a commit before fetching, lets bursts and AppView indexing settle
+
+jetstream_connected = False
+bluesky_channel_locks = {} # channel id -> lock, so polling and streaming never share the same channel at once
+# DID <-> handle resolution cache, persisted in the database and kept current from profile fetches and identity events
+bluesky_did_handles = None # DID -> handle, loaded on first use
+bluesky_handle_dids = {} # handle -> DID
+pending_stream_channels = set()
+stream_share_tasks = set() # keeps the scheduled fetches referenced until they finish
+bluesky_high_water_marks = None # internal id -> newest shared post, loaded on first use
+
+# List feed polling (optional, enabled by BLUESKY_LIST_FEED)
+BLUESKY_LIST_KEY = "bluesky_list_uri"
+BLUESKY_LIST_HIGH_WATER_KEY = "bluesky_list_feed_high_water"
+pending_list_high_water = None # (mark, covered channel ids) of the list feed fetched this cycle, saved once they are all shared
+BLUESKY_LIST_NAME = "Dreamcatcher subscriptions"
+MAX_LIST_FEED_PAGES = 10 # upper bound of list feed pages fetched per cycle
+
+PROFILE_BATCH_SIZE = 25 # max actors per app.bsky.actor.getProfiles call
+# Profiles keyed by both DID and handle, missing profiles are cached for a shorter time
+bluesky_profile_cache = TTLCache(ttl=30 * 60, negative_ttl=5 * 60)
+
+POST_BATCH_SIZE = 25 # max URIs per app.bsky.feed.getPosts call
+# Reply parents keyed by post URI, shared across accounts and cycles. Deleted or hidden posts are cached as missing.
+bluesky_post_cache = TTLCache(ttl=60 * 60, maxsize=2000, negative_ttl=5 * 60)
+
 # Modifies Bluesky URI format (at://<DID>/<COLLECTION>/<RKEY>) into standard URL
 URI_TO_URL_REGEX = re.compile(r"at://([^/]+)/([^/]+)/([^/]+)")
 
+# Budgets announced by the Bluesky servers in the ratelimit-* headers of every response, per XRPC method
+bluesky_rate_limits = RateLimitBudget()
+metrics.register_source("Bluesky rate limits", bluesky_rate_limits.snapshot)
+
+def record_bluesky_rate_limit(endpoint: str, status_code: int, headers: dict) -> None:
+	metrics.increment("bluesky.requests")
+	if bluesky_rate_limits.update(endpoint, status_code, headers):
+		metrics.increment("bluesky.throttled")
+		main.logger.warning(f"Bluesky rate limit hit on {endpoint}, holding further requests until the limit resets.\n")
+
+class BlueskyRequest(AsyncRequest):
+	"""
+	AsyncRequest that waits for the rate limit budget of the called XRPC method before sending, and reads the new budget from the response.
+	"""
+	async def _send_request(self, method: str, url: str, **kwargs):
+		endpoint = url.rsplit("/", 1)[-1]
+		await bluesky_rate_limits.acquire(endpoint)
+		try:
+			response = await super()._send_request(method, url, **kwargs)
+		except RequestErrorBase as e:
+			if getattr(e, "response", None) is not None:
+				record_bluesky_rate_limit(endpoint, e.response.status_code, e.response.headers)
+			raise
+		record_bluesky_rate_limit(endpoint, response.status_code, response.headers)
+		return response
+
+# Shared HTTP transport, keeps one connection pool alive across client re-initializations
+bluesky_request = BlueskyRequest()
+
+client = None
+public_client = None # unauthenticated, for clusters that never log in, see get_public_bluesky_client()
+BLUESKY_PUBLIC_API = "https://public.api.bsky.app/xrpc"
+
+# createSession is heavily rate limited (30 per 5 minutes, 300 per day), so the session is stored
+# and reused across restarts and reconnects. A password login is the last resort.
+BLUESKY_SESSION_KEY = "bluesky_session"
+PASSWORD_LOGIN_COOLDOWN = 5 * 60 # minimum seconds between password logins
+REINITIALIZE_GRACE = 5 # seconds during which a fresh initialization is reused by other failing calls
+
+bluesky_login_lock = asyncio.Lock()
+last_password_login = None
+last_initialized = None
+
+async def save_bluesky_session(event: SessionEvent, session: Session) -> None:
+	"""
+	Session change callback: persists created and refreshed sessions.
+	"""
+	if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+		sql.set_bot_state(BLUESKY_SESSION_KEY, session.export())
+
 async def initialize_bluesky_client() -> None:
+	"""
+	Logs the Bluesky client in, preferring the stored session (refreshed through refreshSession when its
+	access token has expired) over a password login. Concurrent reconnect attempts share one login.
+	"""
 	global client
-	global extractor
+	global last_password_login
+	global last_initialized
 
-	try:
-		# Initialize Bluesky API client
-		client = Client()
-		client.login(main.BLUESKY_USERNAME, main.BLUESKY_PASSWORD)
-		main.logger.info(f"Bluesky API initalized successfully.\n")
+	async with bluesky_login_lock:
+		# another failing call just re-initialized the client, reuse that
+		if last_initialized is not None and time.monotonic() - last_initialized < REINITIALIZE_GRACE:
+			return
 
-		# Initialize URL extractor
-		extractor = urlextract.URLExtract()
+		try:
+			if client is None:
+				# Initialize Bluesky API client
+				client = AsyncClient(request=bluesky_request)
+				client.on_session_change(save_bluesky_session)
 
-	except Exception as e:
-		main.logger.error(f"Failed to initialize Bluesky API client: {e}\n")
-		raise
+			session_string = sql.get_bot_state(BLUESKY_SESSION_KEY)
+			if session_string:
+				try:
+					await client.login(session_string=session_string)
+					last_initialized = time.monotonic()
+					main.logger.info(f"Bluesky API initalized successfully from the stored session.\n")
+					return
+				except Exception as e:
+					main.logger.warning(f"Stored Bluesky session could not be reused, logging in with password: {e}\n")
+
+			if last_password_login is not None and time.monotonic() - last_password_login < PASSWORD_LOGIN_COOLDOWN:
+				raise Exception("Bluesky password login attempted too soon after the previous one, waiting for the cooldown")
+			last_password_login = time.monotonic()
+			await client.login(main.BLUESKY_USERNAME, main.BLUESKY_PASSWORD)
+			last_initialized = time.monotonic()
+			main.logger.info(f"Bluesky API initalized successfully.\n")
+
+		except Exception as e:
+			main.logger.error(f"Failed to initialize Bluesky API client: {e}\n")
+			raise
 
 # --------------------------------- BLUESKY API INTEGRATION ---------------------------------#
 
@@ -57,23 +180,59 @@ def convert_bluesky_uri_to_url(at_uri: str):
 def convert_bluesky_uri_to_video_url(at_uri: str):
 	"""
 	Converts a Bluesky AT URI to a direct video embed URL for Discord (d.bksye.app).
+	The handle comes from the identity cache, no network calls are made.
 	"""
 	match = URI_TO_URL_REGEX.match(at_uri)
 	if match:
 		did = match.group(1)
 		rkey = match.group(3)
-		try:
-			# Attempt to fetch the public handle for the DID
-			profile = client.get_profile(did)
-			handle = getattr(profile, 'handle', None)
-			if handle:
-				return f"https://d.bskye.app/profile/{handle}/post/{rkey}"
-		except Exception:
-			pass
-		# Fallback to DID if handle not found
+		handle = get_cached_bluesky_handle(did)
+		if handle:
+			return f"https://d.bskye.app/profile/{handle}/post/{rkey}"
+		# Fallback to DID if handle not known
 		return f"https://d.bskye.app/profile/{did}/post/{rkey}"
 	return None
 
+#
+#	Bluesky identity cache
+#
+
+def load_bluesky_identities() -> None:
+	global bluesky_did_handles
+	if bluesky_did_handles is None:
+		bluesky_did_handles = sql.get_bluesky_identities()
+		for did, handle in bluesky_did_handles.items():
+			bluesky_handle_dids[handle] = did
+
+def get_cached_bluesky_handle(did: str) -> str | None:
+	load_bluesky_identities()
+	return bluesky_did_handles.get(did)
+
+def remember_bluesky_identity(did: str, handle: str | None) -> None:
+	"""
+	Records the current handle of a DID. If the DID's handle (or the handle's owner) changed,
+	the stale mappings and cached profiles are dropped. Only changes are written to the database.
+	"""
+	if not did or not handle or handle == "handle.invalid":
+		return
+	load_bluesky_identities()
+	old_handle = bluesky_did_handles.get(did)
+	old_did = bluesky_handle_dids.get(handle)
+	if old_handle == handle and old_did == did:
+		return
+
+	if old_handle and old_handle != handle:
+		main.logger.info(f"Bluesky handle changed for {did}: {old_handle} -> {handle}\n")
+		bluesky_handle_dids.pop(old_handle, None)
+		bluesky_profile_cache.pop(old_handle)
+	if old_did and old_did != did:
+		bluesky_did_handles.pop(old_did, None)
+		bluesky_profile_cache.pop(handle)
+
+	bluesky_did_handles[did] = handle
+	bluesky_handle_dids[handle] = did
+	sql.save_bluesky_identity(did, handle)
+
 def extract_media(post: any) -> list | None:
 	"""
 	Extracts image URLs from a Bluesky post, if available.
@@ -169,287 +328,827 @@ def extract_links(post: any) -> list:
 			main.logger.info(f"Error extracting links from post: {e}\n")
 	return full_links if full_links else []
 
-def replace_urls(text: str, links: list) -> str:
+def extract_link_ranges(post: any) -> list:
+	"""
+	Returns the UTF-8 byte ranges (start, end, uri) of the link facets in a Bluesky post's text.
+	"""
+	ranges = []
+	record = getattr(post, "record", None)
+	for facet in getattr(record, "facets", None) or []:
+		index = getattr(facet, "index", None)
+		if index is None:
+			continue
+		for feature in facet.features or []:
+			uri = getattr(feature, "uri", None)
+			if uri:
+				ranges.append((index.byte_start, index.byte_end, uri))
+	return ranges
+
+def is_link_text(segment: bytes, uri: str) -> bool:
 	"""
-	Replaces truncated URLs in text with full URLs.
-	NOTE: Currently used to remove truncated URLs from text, as they are posted separately to enable previews.
+	Checks whether a facet's text is the (possibly truncated) URL itself rather than custom anchor text.
+	Clients display links without the scheme and shorten long ones with an ellipsis, e.g. "example.com/some/pa...".
+	"""
+	shown = segment.decode("utf-8", errors="ignore").strip().removesuffix("...").removesuffix("\u2026")
+	if not shown:
+		return False
+	bare_uri = uri.split("://", 1)[-1]
+	return uri.startswith(shown) or bare_uri.startswith(shown) or bare_uri.removeprefix("www.").startswith(shown)
+
+def strip_link_facets(text: str, link_ranges: list) -> str:
+	"""
+	Removes the link URLs marked by the post's facets from its text, as they are posted separately to enable previews.
+	Links written as anchor text are kept. Works in one pass over the UTF-8 bytes the facet indices refer to.
 	"""
 	if not text:
 		return ""
-	truncated_links = extractor.find_urls(text)
-	# Replace truncated links with full URLs
-	if truncated_links and links:
-		# match short links with full links, replace in text
-		for short_link, full_link in zip(truncated_links, links):
-			text = text.replace(short_link, "")
-			# text = text.replace(short_link, f"[🔗 {short_link}]({full_link})")
-	return text
+	if not link_ranges:
+		return text
+	data = text.encode("utf-8")
+	parts = []
+	position = 0
+	for start, end, uri in sorted(link_ranges):
+		# skip malformed and overlapping ranges
+		if start < position or end <= start or end > len(data):
+			continue
+		if not is_link_text(data[start:end], uri):
+			continue
+		parts.append(data[position:start])
+		position = end
+	parts.append(data[position:])
+	# a broken index may split a character, drop the leftover bytes rather than fail
+	return b"".join(parts).decode("utf-8", errors="ignore")
 
 #
 #	Bluesky post sharing task
 #
 
+def profile_to_dict(profile: any) -> dict:
+	return {
+		"display_name": getattr(profile, 'display_name', None),
+		"avatar_url": getattr(profile, 'avatar', None),
+		"did": getattr(profile, 'did', None),
+		"handle": getattr(profile, 'handle', None)
+	}
+
 @reconnect_api_with_backoff(initialize_bluesky_client, "Bluesky")
-async def fetch_bluesky_profile(channel_id):
+async def fetch_bluesky_profiles_batch(actors: list) -> list | None:
 	"""
-	Fetches the profile (display name & avatar) of the target Bluesky user.
+	Fetches up to 25 profiles with a single app.bsky.actor.getProfiles call.
 	"""
 	try:
-		profile = client.get_profile(channel_id)
-		if profile:
-			display_name = getattr(profile, 'display_name', None)
-			avatar_url = getattr(profile, 'avatar', None)
-			did = getattr(profile, 'did', None)
-			return {"display_name": display_name, "avatar_url": avatar_url, "did": did}
-		else:
-			return None
-
+		response = await client.get_profiles(actors)
+		return [profile_to_dict(profile) for profile in response.profiles]
 	except Exception as e:
-		main.logger.error(f"Error fetching Bluesky profile: {e}\n")
+		main.logger.error(f"Error fetching Bluesky profiles: {e}\n")
+		return None
+
+async def prefetch_bluesky_profiles(actors) -> None:
+	"""
+	Fills the profile cache for the given handles/DIDs, 25 actors per request.
+	Actors the API doesn't return (deleted, suspended...) are cached as missing for a while.
+	"""
+	to_fetch = bluesky_profile_cache.missing(actor for actor in actors if actor)
+	for i in range(0, len(to_fetch), PROFILE_BATCH_SIZE):
+		batch = to_fetch[i:i + PROFILE_BATCH_SIZE]
+		profiles = await fetch_bluesky_profiles_batch(batch)
+		if profiles is None:
+			# request failed, don't mistake that for missing profiles
+			continue
+		for profile in profiles:
+			remember_bluesky_identity(profile["did"], profile["handle"])
+			bluesky_profile_cache.set(profile["did"], profile)
+			if profile["handle"]:
+				bluesky_profile_cache.set(profile["handle"], profile)
+		for actor in batch:
+			if actor not in bluesky_profile_cache:
+				bluesky_profile_cache.set(actor, None)
+
+async def fetch_bluesky_profile(channel_id):
+	"""
+	Returns the profile (display name & avatar) of the target Bluesky user, from the profile cache when possible.
+	"""
+	if channel_id not in bluesky_profile_cache:
+		await prefetch_bluesky_profiles([channel_id])
+	return bluesky_profile_cache.get(channel_id)
+
+def collect_profile_actors(channel_id: str, posts: list | None) -> list:
+	"""
+	Lists every actor whose profile sharing the given posts may need: the subscribed author, repost authors and reply parents.
+	"""
+	actors = [channel_id]
+	for post in posts or []:
+		actors.append(post.get("repost_author_did"))
+		actors.append(post.get("reply_parent_did"))
+	return actors
+
+def parse_feed_item(item: any) -> dict:
+	"""
+	Extracts the information needed for sharing from a FeedViewPost.
+	"""
+	reply_parent_uri = None
+	reply_parent_did = None
+
+	# check if post is a reply
+	if hasattr(item.post.record, "reply") and item.post.record.reply:
+		reply_parent_uri = item.post.record.reply.parent.uri
+		reply_parent_did = item.post.record.reply.parent.uri.split("/")[2]  # DID from at://
+
+	# Robust repost detection (per Bluesky spec)
+	is_repost = isinstance(
+		item.reason,
+		models.AppBskyFeedDefs.ReasonRepost
+	)
+	if (is_repost):
+		reposter = item.reason.by.handle
+		original_author = item.post.author.handle
+
+	# Quote post detection
+	is_quote = False
+	record = item.post.record
+	is_quote = isinstance(
+		record.embed,
+		models.AppBskyEmbedRecord.Main) or isinstance(
+		record.embed,
+		models.AppBskyEmbedRecordWithMedia.Main
+	)
+
+	#has_text = bool(getattr(record, "text", "").strip())
+	#has_embed = hasattr(record, "embed") and record.embed is not None
+
+	return {
+		"text": getattr(item.post.record, "text", ""),
+		"uri": item.post.uri,
+		"post_images": extract_media(item.post),
+		"video": contains_video(item.post),
+		"external": extract_external_embed(item.post),
+		"links": extract_links(item.post),
+		"link_ranges": extract_link_ranges(item.post),
+		"reply_parent_uri": reply_parent_uri,
+		"reply_parent_did": reply_parent_did,
+		"is_repost": is_repost,
+		"is_quote": is_quote,
+		"repost_author": original_author if is_repost else None,
+		"repost_author_did": item.post.author.did if is_repost else None,
+		# reposts are ordered by when they were reposted, not when the original was posted
+		"indexed_at": item.reason.indexed_at if is_repost else item.post.indexed_at
+	}
+
+def parse_bluesky_time(timestamp: str | None) -> datetime | None:
+	if not timestamp:
+		return None
+	try:
+		return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+	except ValueError:
 		return None
 
+def is_past_high_water(post: dict, high_water: dict | None, time_bound: datetime) -> bool:
+	"""
+	Returns True if the post is already covered by the high-water mark, or older than the catch-up time bound.
+	"""
+	post_time = parse_bluesky_time(post.get("indexed_at"))
+	if post_time and post_time < time_bound:
+		return True
+	if high_water:
+		if post["uri"] == high_water["post_uri"]:
+			return True
+		# the stored post may have been deleted, so also stop at anything that isn't newer
+		high_water_time = parse_bluesky_time(high_water.get("indexed_at"))
+		if post_time and high_water_time and post_time <= high_water_time:
+			return True
+	return False
+
 @reconnect_api_with_backoff(initialize_bluesky_client, "Bluesky")
 async def fetch_bluesky_posts(channel_id):
 	"""
-	Fetches the latest Bluesky posts from the API.
+	Fetches the Bluesky posts newer than the channel's high-water mark, newest first.
+	The first page is sized to the author's posting rate, further pages are followed with cursors
+	until a known post, the catch-up time bound or the page limit is reached.
 	"""
 	try:
-		feed = client.get_author_feed(actor=channel_id, limit=postFetchCount)
-		# Extract post text from FeedViewPost objects
+		internal_id = sql.get_id_for_channel_url(channel_id, "Bluesky")
+		high_water = get_bluesky_high_water(internal_id)
+		time_bound = datetime.now(timezone.utc) - timedelta(seconds=MAX_CATCHUP_AGE)
+		page_size = get_bluesky_page_size(high_water)
+
 		posts = []
+		cursor = None
+		for _ in range(MAX_FEED_PAGES):
+			feed = await client.get_author_feed(actor=channel_id, cursor=cursor, limit=page_size)
+			reached_known = False
+			for item in feed.feed:
+				post = parse_feed_item(item)
+				if is_past_high_water(post, high_water, time_bound):
+					reached_known = True
+					break
+				posts.append(post)
+			# without a high-water mark (new subscription) one page is enough to start from
+			if reached_known or not feed.cursor or high_water is None:
+				break
+			cursor = feed.cursor
+			page_size = MAX_PAGE_SIZE
+		return posts
+	except Exception as e:
+		main.logger.error(f"Error fetching Bluesky posts: {e}\n")
+		return None
 
-		for item in feed.feed:
-			reply_parent_uri = None
-			reply_parent_did = None
+#
+#	Bluesky high-water marks
+#
 
-			# check if post is a reply
-			if hasattr(item.post.record, "reply") and item.post.record.reply:
-				reply_parent_uri = item.post.record.reply.parent.uri
-				reply_parent_did = item.post.record.reply.parent.uri.split("/")[2]  # DID from at://
+def get_bluesky_high_water(internal_id: int) -> dict | None:
+	"""
+	Returns the newest shared post of a channel: {"post_uri", "indexed_at", "post_rate"}.
+	Channels tracked before high-water marks existed are seeded from their latest stored post.
+	"""
+	global bluesky_high_water_marks
+	if bluesky_high_water_marks is None:
+		bluesky_high_water_marks = sql.get_bluesky_high_water_marks()
+	if internal_id not in bluesky_high_water_marks:
+		last_post_id = sql.get_latest_post_id(internal_id)
+		bluesky_high_water_marks[internal_id] = {"post_uri": last_post_id, "indexed_at": None, "post_rate": None} if last_post_id else None
+	return bluesky_high_water_marks[internal_id]
 
-			# Robust repost detection (per Bluesky spec)
-			is_repost = isinstance(
-				item.reason,
-				models.AppBskyFeedDefs.ReasonRepost
-			)
-			if (is_repost):
-				reposter = item.reason.by.handle
-				original_author = item.post.author.handle
-
-			# Quote post detection
-			is_quote = False
-			record = item.post.record
-			is_quote = isinstance(
-				record.embed,
-				models.AppBskyEmbedRecord.Main) or isinstance(
-				record.embed,
-				models.AppBskyEmbedRecordWithMedia.Main
-			)
+def get_bluesky_page_size(high_water: dict | None) -> int:
+	"""
+	Sizes the first feed page to the author's recent posting rate (new posts per cycle).
+	Quiet authors cost a tiny request, busy ones are covered without paging.
+	"""
+	if not high_water or high_water.get("post_rate") is None:
+		return postFetchCount
+	return max(MIN_PAGE_SIZE, min(MAX_PAGE_SIZE, math.ceil(high_water["post_rate"] * 2) + 1))
 
-			#has_text = bool(getattr(record, "text", "").strip())
-			#has_embed = hasattr(record, "embed") and record.embed is not None
-
-			posts.append({
-				"text": getattr(item.post.record, "text", ""),
-				"uri": item.post.uri,
-				"post_images": extract_media(item.post),
-				"video": contains_video(item.post),
-				"external": extract_external_embed(item.post),
-				"links": extract_links(item.post),
-				"reply_parent_uri": reply_parent_uri,
-				"reply_parent_did": reply_parent_did,
-				"is_repost": is_repost,
-				"is_quote": is_quote,
-				"repost_author": original_author if is_repost else None
-			})
-		return posts
+def update_bluesky_high_water(internal_id: int, new_posts: list, outbox: list = None) -> list | None:
+	"""
+	Advances the channel's high-water mark to its newest post and updates its posting rate.
+	The database is only written when new posts were found, together with the outbox entries of their notifications.
+	Returns the ids of the outbox entries, or None if saving failed and the posts should be picked up again.
+	"""
+	high_water = get_bluesky_high_water(internal_id) or {"post_uri": None, "indexed_at": None, "post_rate": None}
+	previous_rate = high_water.get("post_rate")
+	post_rate = len(new_posts) if previous_rate is None else previous_rate * (1 - POST_RATE_SMOOTHING) + len(new_posts) * POST_RATE_SMOOTHING
+
+	outbox_ids = []
+	if new_posts:
+		newest = new_posts[0]
+		outbox_ids = sql.save_bluesky_high_water(internal_id, newest["uri"], newest.get("indexed_at"), post_rate, outbox)
+		if outbox_ids is None:
+			return None
+		high_water = {"post_uri": newest["uri"], "indexed_at": newest.get("indexed_at"), "post_rate": post_rate}
+	else:
+		high_water = dict(high_water, post_rate=post_rate)
+	bluesky_high_water_marks[internal_id] = high_water if high_water["post_uri"] else None
+	return outbox_ids
+
+def post_to_dict(post: any) -> dict:
+	"""
+	Extracts the information needed for sharing a reply parent from a PostView.
+	"""
+	return {
+		"text": getattr(post.record, "text", ""),
+		"uri": post.uri,
+		"images": extract_media(post),
+		"video": contains_video(post),
+		"external": extract_external_embed(post),
+		"links": extract_links(post),
+		"author_did": post.author.did,
+		"author_name": post.author.display_name,
+		"author_avatar": post.author.avatar
+	}
+
+@reconnect_api_with_backoff(initialize_bluesky_client, "Bluesky")
+async def fetch_bluesky_posts_batch(uris: list) -> list | None:
+	"""
+	Fetches up to 25 posts with a single app.bsky.feed.getPosts call.
+	"""
+	try:
+		response = await client.get_posts(uris)
+		return [post_to_dict(post) for post in response.posts]
 	except Exception as e:
-		main.logger.error(f"Error fetching Bluesky posts: {e}\n")
+		main.logger.error(f"Error fetching Bluesky posts by URI: {e}\n")
 		return None
 
-@reconnect_api_with_backoff(initialize_bluesky_client, "Bluesky")
+async def prefetch_bluesky_posts(uris) -> None:
+	"""
+	Fills the post cache for the given post URIs, 25 posts per request.
+	Posts the API doesn't return (deleted, blocked...) are cached as missing for a while.
+	"""
+	to_fetch = bluesky_post_cache.missing(uri for uri in uris if uri)
+	for i in range(0, len(to_fetch), POST_BATCH_SIZE):
+		batch = to_fetch[i:i + POST_BATCH_SIZE]
+		posts = await fetch_bluesky_posts_batch(batch)
+		if posts is None:
+			# request failed, don't mistake that for missing posts
+			continue
+		for post in posts:
+			bluesky_post_cache.set(post["uri"], post)
+		for uri in batch:
+			if uri not in bluesky_post_cache:
+				main.logger.error(f"Failed to fetch parent post {uri}: not returned by the API")
+				bluesky_post_cache.set(uri, None)
+
 async def fetch_bluesky_post_by_uri(uri: str):
 	"""
-	Directly fetches a single Bluesky post by its URI.
+	Returns a single Bluesky post by its URI, from the post cache when possible.
+	"""
+	if uri not in bluesky_post_cache:
+		await prefetch_bluesky_posts([uri])
+	return bluesky_post_cache.get(uri)
+
+def collect_parent_uris(channel_id: str, posts: list | None) -> list:
+	"""
+	Lists the reply parents that sharing the given posts will show, i.e. replies to someone else's post.
+	Expects the channel's profile to be prefetched, without it self-replies can't be told apart and are included.
+	"""
+	profile = bluesky_profile_cache.get(channel_id)
+	profile_did = profile.get("did") if profile else None
+	return [
+		post["reply_parent_uri"] for post in posts or []
+		if post["reply_parent_uri"] and post["reply_parent_did"] != profile_did
+	]
+
+def get_public_bluesky_client() -> AsyncClient:
+	"""
+	An unauthenticated client for the public AppView, created on first use. Shard clusters that don't poll use it
+	for slash command lookups: it has no session, so it never refreshes (and rotates) the bot account's stored session.
+	"""
+	global public_client
+	if public_client is None:
+		public_client = AsyncClient(base_url=BLUESKY_PUBLIC_API)
+	return public_client
+
+async def resolve_bluesky_handle(handle: str):
+	"""
+	Resolves a Bluesky handle to its DID. Raises AtProtocolError if the handle can't be resolved.
+	"""
+	return await (client or get_public_bluesky_client()).resolve_handle(handle)
+
+async def fetch_bluesky_feeds(channel_ids: list) -> dict:
+	"""
+	Fetches the feeds of all given Bluesky channels concurrently, at most main.BLUESKY_FETCH_CONCURRENCY at a time.
+	Returns a dict mapping channel id to its posts (None if the fetch failed).
+	"""
+	semaphore = asyncio.Semaphore(main.BLUESKY_FETCH_CONCURRENCY)
+
+	async def fetch_limited(channel_id):
+		async with semaphore:
+			return await fetch_bluesky_posts(channel_id)
+
+	results = await asyncio.gather(*(fetch_limited(channel_id) for channel_id in channel_ids), return_exceptions=True)
+	feeds = {}
+	for channel_id, result in zip(channel_ids, results):
+		if isinstance(result, Exception):
+			main.logger.error(f"Error fetching Bluesky feed for {channel_id}: {result}\n")
+			result = None
+		feeds[channel_id] = result
+	return feeds
+
+#
+#	Bluesky list feed polling
+#
+
+async def get_bluesky_list_uri() -> str:
+	"""
+	Returns the AT URI of the bot-owned curation list mirroring the Bluesky subscriptions, creating the list on first use.
+	"""
+	list_uri = sql.get_bot_state(BLUESKY_LIST_KEY)
+	if list_uri:
+		return list_uri
+	response = await client.app.bsky.graph.list.create(
+		client.me.did,
+		models.AppBskyGraphList.Record(
+			name=BLUESKY_LIST_NAME,
+			purpose="app.bsky.graph.defs#curatelist",
+			description="Accounts followed by the Dreamcatcher Discord bot.",
+			created_at=client.get_current_time_iso()
+		)
+	)
+	sql.set_bot_state(BLUESKY_LIST_KEY, response.uri)
+	main.logger.info(f"Created Bluesky list {response.uri} for list feed polling.\n")
+	return response.uri
+
+async def sync_bluesky_list(list_uri: str, dids) -> set:
+	"""
+	Adds and removes list items so the list holds exactly the given DIDs. Only the differences cause API calls.
+	Returns the DIDs that were already on the list before this sync.
+	"""
+	items = sql.get_bluesky_list_items()
+	listed = set(items)
+	for did in set(dids) - listed:
+		try:
+			response = await client.app.bsky.graph.listitem.create(
+				client.me.did,
+				models.AppBskyGraphListitem.Record(subject=did, list=list_uri, created_at=client.get_current_time_iso())
+			)
+			sql.save_bluesky_list_item(did, response.uri)
+		except Exception as e:
+			main.logger.error(f"Error adding {did} to the Bluesky list: {e}\n")
+	for did in listed - set(dids):
+		try:
+			await client.app.bsky.graph.listitem.delete(client.me.did, AtUri.from_str(items[did]).rkey)
+			sql.remove_bluesky_list_item(did)
+			listed.discard(did)
+		except Exception as e:
+			main.logger.error(f"Error removing {did} from the Bluesky list: {e}\n")
+	return listed
+
+def get_bluesky_list_high_water() -> dict | None:
+	value = sql.get_bot_state(BLUESKY_LIST_HIGH_WATER_KEY)
+	return json.loads(value) if value else None
+
+@reconnect_api_with_backoff(initialize_bluesky_client, "Bluesky")
+async def fetch_bluesky_list_feed(list_uri: str) -> list | None:
+	"""
+	Fetches the list feed posts newer than the list's high-water mark, newest first, following cursors
+	until a known post, the catch-up time bound or the page limit is reached.
+	Each post is tagged with "owner_did", the list member who posted or reposted it.
 	"""
 	try:
-		record = client.get_post_thread(uri)
-		parent = record.thread.post
+		high_water = get_bluesky_list_high_water()
+		time_bound = datetime.now(timezone.utc) - timedelta(seconds=MAX_CATCHUP_AGE)
 
-		return {
-			"text": parent.record.text,
-			"uri": parent.uri,
-			"images": extract_media(parent),
-			"video": contains_video(parent),
-			"external": extract_external_embed(parent),
-			"links": extract_links(parent),
-			"author_did": parent.author.did,
-			"author_name": parent.author.display_name,
-			"author_avatar": parent.author.avatar
-		}
+		posts = []
+		cursor = None
+		for _ in range(MAX_LIST_FEED_PAGES):
+			feed = await client.app.bsky.feed.get_list_feed({"list": list_uri, "cursor": cursor, "limit": MAX_PAGE_SIZE})
+			reached_known = False
+			for item in feed.feed:
+				post = parse_feed_item(item)
+				if is_past_high_water(post, high_water, time_bound):
+					reached_known = True
+					break
+				post["owner_did"] = item.reason.by.did if post["is_repost"] else item.post.author.did
+				posts.append(post)
+			if reached_known or not feed.cursor or high_water is None:
+				break
+			cursor = feed.cursor
+		return posts
 	except Exception as e:
-		main.logger.error(f"Failed to fetch parent post {uri}: {e}")
+		main.logger.error(f"Error fetching Bluesky list feed: {e}\n")
 		return None
 
-async def share_bluesky_posts() -> None:
-	main.logger.info(f"Starting the Bluesky post sharing task...\n")
+async def fetch_bluesky_list_feeds(channel_ids: list) -> dict:
+	"""
+	List feed mode: fetches the posts of every Bluesky channel with one paged getListFeed request
+	and sorts them back to their channels. Returns the same shape as fetch_bluesky_feeds().
+	Channels that weren't on the list before this cycle are fetched from their own feeds once, so
+	new subscriptions start from their recent posts like in the regular mode.
+	"""
+	try:
+		did_map = await resolve_subscribed_bluesky_dids()
+		list_uri = await get_bluesky_list_uri()
+		listed = await sync_bluesky_list(list_uri, did_map.keys())
+	except Exception as e:
+		main.logger.error(f"Error syncing the Bluesky list, fetching feeds separately: {e}\n")
+		return await fetch_bluesky_feeds(channel_ids)
 
-	first_run = True
+	global pending_list_high_water
+	pending_list_high_water = None
+	# a DID whose removal from the list failed is still listed but no longer subscribed
+	covered = {did: did_map.get(did) for did in listed if did_map.get(did) in channel_ids}
+	posts = await fetch_bluesky_list_feed(list_uri) if covered else []
+	if posts is None:
+		return await fetch_bluesky_feeds(channel_ids)
 
-	while True:
-		try:
-			# Fetch all YouTube subscriptions from the database
-			bluesky_subscriptions = sql.get_all_social_media_subscriptions_for_platform("Bluesky")
-			for channel_id in bluesky_subscriptions:
+	feeds = {channel_id: [] for channel_id in covered.values()}
+	for post in posts:
+		channel_id = covered.get(post["owner_did"])
+		if channel_id:
+			feeds[channel_id].append(post)
+	if posts:
+		pending_list_high_water = ({"post_uri": posts[0]["uri"], "indexed_at": posts[0]["indexed_at"]}, set(feeds))
 
-				internal_id = sql.get_id_for_channel_url(channel_id)
-
-				# Keep track of already shared post URIs to avoid duplicates for reposts and replies.
-				posted_post_uris = set()
-
-				# Fetch posts from Bluesky
-				posts = await fetch_bluesky_posts(channel_id)
-				if not posts:
-					continue
-
-				last_post_id = sql.get_latest_post_id(internal_id)
-				# Filter posts to include only those more recent than the stored post
-				new_posts = []
-				for post in posts:
-					if post['uri'] == last_post_id:
-						break
-					new_posts.append(post)
-				# if no new posts, skip to next channel
-				if len(new_posts) == 0:
-					continue
-				main.logger.info(f"Found {len(new_posts)} new posts for Bluesky channel {channel_id}...\n")
-				# get profile information for the channel
-				profile = await fetch_bluesky_profile(channel_id)
-				profile_did = profile.get("did") if profile else None
-
-				# Post new posts to Discord in reverse order (oldest first)
-				if not main.startup.silent:
-					for post in reversed(new_posts):
-						post_uri = post['uri']
-						contains_video = True if (post.get("video") == True) else False
-						post_type = "root"
-						notify_list = sql.get_discord_channels_for_social_channel(internal_id)
-						profile_display_name = profile.get("display_name") if profile else None
-						profile_avatar_url = profile.get("avatar_url") if profile else None
-
-						# Skip if we've already shared this post (repost or reply)
-						if post_uri in posted_post_uris:
-							continue
-
-						# Determine post type (repost, reply, self_reply, etc.)
-						if post['is_repost']:
-							post_type = "repost"
-						if post["reply_parent_uri"]:
-							post_type = "reply"
-							if profile_did and post["reply_parent_did"] == profile_did:
-								post_type = "self_reply"
-							else:
-								parent_uri = post["reply_parent_uri"]
-								if parent_uri not in posted_post_uris:
-									parent_post = await fetch_bluesky_post_by_uri(parent_uri)
-									if parent_post:
-										posted_post_uris.add(parent_uri)
-										for discord_channel in notify_list:
-											parent_has_video = parent_post.get("video")
-											if parent_has_video:
-												await bot.notify_bluesky_activity(
-													target_channel = discord_channel,
-													post_uri = parent_post["uri"],
-													content = None,
-													images = None,
-													links = [convert_bluesky_uri_to_url(parent_post["uri"])],
-													channel_name = parent_post["author_name"],
-													avatar_url = profile_avatar_url,
-													post_type = "parent_post",
-													author_url = parent_post["author_avatar"]
-												)
-											else:
-												await bot.notify_bluesky_activity(
-													target_channel = discord_channel,
-													post_uri = parent_post["uri"],
-													content = parent_post["text"],
-													images = parent_post["images"],
-													links = parent_post["links"],
-													channel_name = parent_post["author_name"],
-													avatar_url = profile_avatar_url,
-													post_type = "parent_post",
-													author_url = parent_post["author_avatar"]
-												)
-
-						posted_post_uris.add(post_uri)
-
-						for discord_channel in notify_list:
-							repost_profile = await fetch_bluesky_profile(post["repost_author"]) if post["repost_author"] else None
-
-							main.logger.info(f"Sending Bluesky post {post_uri} to Discord channel {discord_channel}...\n")
-							if contains_video:
-								video_url = convert_bluesky_uri_to_video_url(post_uri)
-								await bot.notify_bluesky_activity(
-									target_channel = discord_channel,
-									post_uri = post_uri,
-									content = replace_urls(post['text'], post['links']),
-									images = post['post_images'],
-									links = [video_url],
-									channel_name = profile_display_name,
-									avatar_url = profile_avatar_url, # Reposting user's avatar to maintain consistency/context
-									post_type = post_type,
-									author_url = repost_profile.get("avatar_url") if repost_profile else None
-								)
-							elif post_type == "repost":
-								
-								await bot.notify_bluesky_activity(
-									target_channel = discord_channel,
-									post_uri = post_uri,
-									content = replace_urls(post['text'], post['links']),
-									images = post['post_images'],
-									links = post['links'],
-									channel_name = repost_profile.get("display_name"),
-									avatar_url = profile_avatar_url, # Reposting user's avatar to maintain consistency/context
-									post_type = "repost",
-									author_url = repost_profile.get("avatar_url") if repost_profile else None
+	uncovered = [channel_id for channel_id in channel_ids if channel_id not in feeds]
+	if uncovered:
+		feeds.update(await fetch_bluesky_feeds(uncovered))
+	return feeds
+
+def save_bluesky_list_high_water(recorded_channels: set) -> None:
+	"""
+	Moves the list feed's high-water mark once every channel the fetched list feed covered has recorded its posts.
+	Otherwise the list feed is read from the old mark again, the channels' own marks filter what was already shared.
+	"""
+	global pending_list_high_water
+	if pending_list_high_water is None:
+		return
+	mark, channels = pending_list_high_water
+	pending_list_high_water = None
+	if channels <= recorded_channels:
+		sql.set_bot_state(BLUESKY_LIST_HIGH_WATER_KEY, json.dumps(mark))
+	else:
+		main.logger.warning("Not all Bluesky list feed posts were recorded, reading the list feed from its previous position next cycle.\n")
+
+async def share_new_bluesky_posts(channel_id: str, posts: list | None) -> bool:
+	"""
+	Shares the posts of a Bluesky channel that are newer than the last stored post.
+	Used by both the polling loop and the Jetstream ingester, one channel is processed at a time.
+	Returns False if the posts couldn't be recorded and have to be picked up again.
+	"""
+	async with bluesky_channel_locks.setdefault(channel_id, asyncio.Lock()):
+		return await _share_new_bluesky_posts(channel_id, posts)
+
+async def _share_new_bluesky_posts(channel_id: str, posts: list | None) -> bool:
+	internal_id = sql.get_id_for_channel_url(channel_id)
+
+	# Keep track of already shared post URIs to avoid duplicates for reposts and replies.
+	posted_post_uris = set()
+
+	if posts is None:
+		return True
+
+	# The fetch may have raced with another share of this channel, filter against the current high-water mark again
+	high_water = get_bluesky_high_water(internal_id)
+	time_bound = datetime.now(timezone.utc) - timedelta(seconds=MAX_CATCHUP_AGE)
+	new_posts = []
+	for post in posts:
+		if is_past_high_water(post, high_water, time_bound):
+			break
+		new_posts.append(post)
+	# if no new posts, nothing to share
+	if len(new_posts) == 0:
+		update_bluesky_high_water(internal_id, new_posts)
+		return True
+	main.logger.info(f"Found {len(new_posts)} new posts for Bluesky channel {channel_id}...\n")
+	# get profile information for the channel
+	profile = await fetch_bluesky_profile(channel_id)
+	profile_did = profile.get("did") if profile else None
+	notify_list = sql.get_discord_channels_for_social_channel(internal_id)
+	deliveries = []
+
+	# Post new posts to Discord in reverse order (oldest first)
+	if not main.startup.silent:
+		for post in reversed(new_posts):
+			post_uri = post['uri']
+			contains_video = True if (post.get("video") == True) else False
+			post_type = "root"
+			profile_display_name = profile.get("display_name") if profile else None
+			profile_avatar_url = profile.get("avatar_url") if profile else None
+
+			# Skip if we've already shared this post (repost or reply)
+			if post_uri in posted_post_uris:
+				continue
+
+			# Determine post type (repost, reply, self_reply, etc.)
+			if post['is_repost']:
+				post_type = "repost"
+			if post["reply_parent_uri"]:
+				post_type = "reply"
+				if profile_did and post["reply_parent_did"] == profile_did:
+					post_type = "self_reply"
+				else:
+					parent_uri = post["reply_parent_uri"]
+					if parent_uri not in posted_post_uris:
+						parent_post = await fetch_bluesky_post_by_uri(parent_uri)
+						if parent_post:
+							posted_post_uris.add(parent_uri)
+							if parent_post.get("video"):
+								parent_notification = bot.render_bluesky_activity(
+									post_uri = parent_post["uri"],
+									content = None,
+									images = None,
+									links = [convert_bluesky_uri_to_url(parent_post["uri"])],
+									channel_name = parent_post["author_name"],
+									avatar_url = profile_avatar_url,
+									post_type = "parent_post",
+									author_url = parent_post["author_avatar"]
 								)
 							else:
-								external = post.get("external")
-								links = post['links']
-								if external and external.get("uri"):
-									if links is not None:
-										links = list(links)
-										links.append(external["uri"])
-									else:
-										links = [external["uri"]]
-								await bot.notify_bluesky_activity(
-									target_channel = discord_channel,
-									post_uri = post_uri,
-									content = replace_urls(post['text'], post['links']),
-									images = post['post_images'],
-									links = links,
-									channel_name = profile_display_name,
+								parent_notification = bot.render_bluesky_activity(
+									post_uri = parent_post["uri"],
+									content = parent_post["text"],
+									images = parent_post["images"],
+									links = parent_post["links"],
+									channel_name = parent_post["author_name"],
 									avatar_url = profile_avatar_url,
-									post_type = post_type,
-									author_url = None
+									post_type = "parent_post",
+									author_url = parent_post["author_avatar"]
 								)
-				else:
-					main.logger.info(f"Skipping notification for Bluesky posts due to silent start.\n")
-				# First run silent start handling: if this is first time the loop is run since startup, actually notifying about posts is skipped
-				# and this asyncio task signals the StartupSilencer that it has finished the silent loop.
-				if first_run:
-					if hasattr(main, "startup") and main.startup.silent:
-						await main.startup.task_finished_first_run()
-					first_run = False
-					main.logger.info(f"Finished first run of Bluesky post sharing task.\n")
-
-				# Update the database with the most recent post ID (first in the new_posts list)
-				if new_posts:
-					most_recent_post = new_posts[0]  # The first post in new_posts is the most recent
-					sql.update_latest_post(internal_id, most_recent_post['uri'], most_recent_post['text'])
+							deliveries.extend((discord_channel, parent_notification) for discord_channel in notify_list)
+
+			posted_post_uris.add(post_uri)
+
+			repost_profile = await fetch_bluesky_profile(post["repost_author_did"]) if post["repost_author_did"] else None
+
+			# Render the post once, every subscribed channel receives the same notification
+			if contains_video:
+				notification = bot.render_bluesky_activity(
+					post_uri = post_uri,
+					content = strip_link_facets(post['text'], post['link_ranges']),
+					images = post['post_images'],
+					links = [convert_bluesky_uri_to_video_url(post_uri)],
+					channel_name = profile_display_name,
+					avatar_url = profile_avatar_url, # Reposting user's avatar to maintain consistency/context
+					post_type = post_type,
+					author_url = repost_profile.get("avatar_url") if repost_profile else None
+				)
+			elif post_type == "repost":
+				notification = bot.render_bluesky_activity(
+					post_uri = post_uri,
+					content = strip_link_facets(post['text'], post['link_ranges']),
+					images = post['post_images'],
+					links = post['links'],
+					channel_name = repost_profile.get("display_name") if repost_profile else post["repost_author"],
+					avatar_url = profile_avatar_url, # Reposting user's avatar to maintain consistency/context
+					post_type = "repost",
+					author_url = repost_profile.get("avatar_url") if repost_profile else None
+				)
+			else:
+				external = post.get("external")
+				links = post['links']
+				if external and external.get("uri"):
+					if links is not None:
+						links = list(links)
+						links.append(external["uri"])
+					else:
+						links = [external["uri"]]
+				notification = bot.render_bluesky_activity(
+					post_uri = post_uri,
+					content = strip_link_facets(post['text'], post['link_ranges']),
+					images = post['post_images'],
+					links = links,
+					channel_name = profile_display_name,
+					avatar_url = profile_avatar_url,
+					post_type = post_type,
+					author_url = None
+				)
+
+			for discord_channel in notify_list:
+				main.logger.info(f"Queueing Bluesky post {post_uri} for Discord channel {discord_channel}...\n")
+				deliveries.append((discord_channel, notification))
+	else:
+		main.logger.info(f"Skipping notification for Bluesky posts due to silent start.\n")
+
+	# the high-water mark moves in the same transaction that stores the notifications in the outbox
+	outbox_ids = update_bluesky_high_water(internal_id, new_posts, bot.outbox_entries(deliveries))
+	bot.enqueue_outbox_deliveries(deliveries, outbox_ids)
+	return outbox_ids is not None
+
+async def share_bluesky_posts() -> None:
+	"""
+	One Bluesky polling cycle over every subscription, run by the scheduler (see the registrations at the end).
+	"""
+	try:
+		# Fetch all Bluesky subscriptions from the database
+		bluesky_subscriptions = sql.get_all_social_media_subscriptions_for_platform("Bluesky")
+		# Fetch every subscribed feed up front, concurrently or through the list feed
+		if main.BLUESKY_LIST_FEED:
+			bluesky_feeds = await fetch_bluesky_list_feeds(bluesky_subscriptions)
+		else:
+			bluesky_feeds = await fetch_bluesky_feeds(bluesky_subscriptions)
+		# Resolve every profile this cycle may need in batches before sharing anything
+		profile_actors = []
+		for channel_id in bluesky_subscriptions:
+			profile_actors += collect_profile_actors(channel_id, bluesky_feeds.get(channel_id))
+		await prefetch_bluesky_profiles(profile_actors)
+		# Same for the reply parents, unless this is a silent run that won't show them
+		if not main.startup.silent:
+			parent_uris = []
+			for channel_id in bluesky_subscriptions:
+				parent_uris += collect_parent_uris(channel_id, bluesky_feeds.get(channel_id))
+			await prefetch_bluesky_posts(parent_uris)
+		recorded = set()
+		for channel_id in bluesky_subscriptions:
+			if await share_new_bluesky_posts(channel_id, bluesky_feeds.get(channel_id)):
+				recorded.add(channel_id)
+		save_bluesky_list_high_water(recorded)
+
+	except Exception as e:
+		main.logger.error(f"Error while fetching Bluesky subscriptions or fetching posts: {e}\n")
 
+def bluesky_poll_interval() -> int:
+	# While the Jetstream ingester is connected, polling only fills gaps
+	return BLUESKY_STREAM_FALLBACK_TIMER if jetstream_connected else postFetchTimer
+
+#
+#	Bluesky Jetstream ingestion
+#
+
+async def resolve_subscribed_bluesky_dids() -> dict:
+	"""
+	Returns a dict mapping the DID of every Bluesky subscription to the channel id it is stored under.
+	"""
+	subscriptions = sql.get_all_social_media_subscriptions_for_platform("Bluesky")
+	load_bluesky_identities()
+	did_map = {}
+	for channel_id in subscriptions:
+		if channel_id.startswith("did:"):
+			did_map[channel_id] = channel_id
+			continue
+		if channel_id not in bluesky_handle_dids:
+			try:
+				response = await resolve_bluesky_handle(channel_id)
+				remember_bluesky_identity(response.did, channel_id)
+			except Exception as e:
+				main.logger.error(f"Error resolving DID for Bluesky channel {channel_id}: {e}\n")
+				continue
+		did_map[bluesky_handle_dids[channel_id]] = channel_id
+	return did_map
+
+def queue_bluesky_stream_event(channel_id: str) -> None:
+	"""
+	Schedules a fetch for a channel that just committed a post or repost. Bursts of commits share one fetch.
+	"""
+	if channel_id in pending_stream_channels:
+		return
+	pending_stream_channels.add(channel_id)
+	task = asyncio.create_task(share_streamed_bluesky_channel(channel_id))
+	stream_share_tasks.add(task)
+	task.add_done_callback(stream_share_tasks.discard)
+
+def cancel_stream_shares() -> None:
+	for task in stream_share_tasks:
+		task.cancel()
+	pending_stream_channels.clear()
+
+async def share_streamed_bluesky_channel(channel_id: str) -> None:
+	try:
+		await asyncio.sleep(JETSTREAM_DEBOUNCE)
+		pending_stream_channels.discard(channel_id)
+		posts = await fetch_bluesky_posts(channel_id)
+		await prefetch_bluesky_profiles(collect_profile_actors(channel_id, posts))
+		await prefetch_bluesky_posts(collect_parent_uris(channel_id, posts))
+		await share_new_bluesky_posts(channel_id, posts)
+	except Exception as e:
+		pending_stream_channels.discard(channel_id)
+		main.logger.error(f"Error sharing streamed Bluesky posts for {channel_id}: {e}\n")
+
+async def stream_bluesky_posts() -> None:
+	"""
+	Listens to Jetstream for posts and reposts by subscribed accounts and shares them through the regular path.
+	Resumes from the persisted cursor, the polling loop keeps running as a slower gap-filling fallback.
+	"""
+	global jetstream_connected
+
+	main.logger.info(f"Starting the Bluesky Jetstream ingestion task...\n")
+	cursor = sql.get_bot_state(JETSTREAM_CURSOR_KEY)
+	cursor = int(cursor) if cursor else None
+	retry_delay = 1
+
+	while True:
+		try:
+			did_map = await resolve_subscribed_bluesky_dids()
+			if not did_map:
+				# nothing to follow, stay disconnected (polling runs at its normal pace) and check again later
+				jetstream_connected = False
+				await asyncio.sleep(JETSTREAM_FILTER_REFRESH_INTERVAL)
+				continue
+			url = jetstream.build_jetstream_url(main.BLUESKY_JETSTREAM_URL, cursor)
+
+			async with aiohttp.ClientSession() as session:
+				async with session.ws_connect(url, heartbeat=30) as ws:
+					await ws.send_str(jetstream.build_options_update(did_map.keys()))
+					jetstream_connected = True
+					retry_delay = 1
+					main.logger.info(f"Connected to Jetstream, following {len(did_map)} Bluesky accounts.\n")
+
+					last_saved = last_refreshed = time.monotonic()
+					while True:
+						try:
+							msg = await ws.receive(timeout=JETSTREAM_CURSOR_SAVE_INTERVAL)
+						except asyncio.TimeoutError:
+							msg = None
+
+						if msg is not None:
+							if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+								raise Exception(f"Jetstream connection closed ({msg.type.name})")
+							if msg.type == aiohttp.WSMsgType.TEXT:
+								message = json.loads(msg.data)
+								cursor = message.get("time_us", cursor)
+								identity = jetstream.decode_identity_event(message)
+								if identity:
+									remember_bluesky_identity(identity["did"], identity["handle"])
+								event = jetstream.decode_jetstream_event(message)
+								if event and event["did"] in did_map:
+									queue_bluesky_stream_event(did_map[event["did"]])
+
+						now = time.monotonic()
+						if now - last_saved >= JETSTREAM_CURSOR_SAVE_INTERVAL:
+							sql.set_bot_state(JETSTREAM_CURSOR_KEY, cursor)
+							last_saved = now
+						if now - last_refreshed >= JETSTREAM_FILTER_REFRESH_INTERVAL:
+							# follow added/removed subscriptions without reconnecting
+							new_did_map = await resolve_subscribed_bluesky_dids()
+							if not new_did_map:
+								main.logger.info("No Bluesky accounts left to follow, closing the Jetstream connection.\n")
+								break
+							if new_did_map.keys() != did_map.keys():
+								await ws.send_str(jetstream.build_options_update(new_did_map.keys()))
+							did_map = new_did_map
+							last_refreshed = now
+
+		except asyncio.CancelledError:
+			sql.set_bot_state(JETSTREAM_CURSOR_KEY, cursor)
+			jetstream_connected = False
+			cancel_stream_shares()
+			raise
 		except Exception as e:
-			main.logger.error(f"Error while fetching Bluesky subscriptions or fetching posts: {e}\n")
+			main.logger.error(f"Jetstream ingestion error: {e}, reconnecting in {retry_delay} seconds...\n")
+
+		jetstream_connected = False
+		sql.set_bot_state(JETSTREAM_CURSOR_KEY, cursor)
+		await asyncio.sleep(retry_delay)
+		retry_delay = min(retry_delay * 2, 60)
 
-		# Wait before fetching new posts
-		await asyncio.sleep(postFetchTimer)
+poll_scheduler.register("Bluesky posts", share_bluesky_posts, interval=bluesky_poll_interval, group="bluesky", reports_first_run=True)
+# the stream reconnects by itself, the scheduler only restarts it should it ever end
+poll_scheduler.register("Bluesky Jetstream", stream_bluesky_posts, interval=60, group="bluesky", jitter=0, enabled=lambda: bool(main.BLUESKY_JETSTREAM_URL))
@@ -1,26 +1,97 @@
 import discord
 import asyncio
+import aiohttp
+import json
+import math
+import re
+import time
 from discord.ext import commands
 from io import StringIO
+from datetime import datetime
+from dataclasses import dataclass, replace
 
 import main
 import blsky
-import youtube
 import sql
 import twitch
+import metrics
+from cache import TTLCache
+from dispatcher import NotificationDispatcher
+from ratelimit import TokenBucket
+from scheduler import poll_scheduler
 
 # Discord bot setup
-intents = discord.Intents.default()
-intents.messages = True # allow bot to read messages
-intents.message_content = True # allow bot to read message content
-bot = commands.Bot(command_prefix=commands.when_mentioned_or(), intents=intents)
+def gateway_options(profile: str) -> dict:
+	"""
+	Client options of a gateway and cache profile (DISCORD_MEMORY_PROFILE).
+	The bot only uses slash commands, so the "lean" profile receives guild events alone and keeps no message or
+	member caches, which keeps memory flat as the number of guilds grows. "default" keeps the original setup.
+	"""
+	if profile == "lean":
+		intents = discord.Intents.none()
+		intents.guilds = True # channels, roles and the bot's own member, needed for the permission checks
+		return {
+			"intents": intents,
+			"max_messages": None,
+			"member_cache_flags": discord.MemberCacheFlags.none(),
+			"chunk_guilds_at_startup": False
+		}
+	intents = discord.Intents.default()
+	intents.messages = True # allow bot to read messages
+	intents.message_content = True # allow bot to read message content
+	return {"intents": intents}
+
+def create_client(**options) -> commands.Bot:
+	"""
+	A single gateway connection by default. DISCORD_SHARDING=auto shards it within this process, and a shard cluster
+	process (DISCORD_CLUSTERS, see cluster.py) connects only the shards it was given.
+	"""
+	if getattr(main, "SHARD_IDS", None) is not None:
+		return commands.AutoShardedBot(shard_ids=main.SHARD_IDS, shard_count=main.SHARD_COUNT, **options)
+	if getattr(main, "DISCORD_SHARDING", "off") == "auto":
+		return commands.AutoShardedBot(**options)
+	return commands.Bot(**options)
+
+# Launched through main.py, main has read its configuration by the time this module is run
+GATEWAY_PROFILE = getattr(main, "DISCORD_MEMORY_PROFILE", "default")
+bot = create_client(command_prefix=commands.when_mentioned_or(), **gateway_options(GATEWAY_PROFILE))
 bot.remove_command("help") # remove default help command
 
-# track the media platform tasks so we can cancel them on shutdown
-bluesky_task = None
-youtube_task = None
-youtube_members_only_task = None
-twitch_task = None
+def is_cluster() -> bool:
+	return getattr(main, "CLUSTER_ID", None) is not None
+
+def runs_pollers() -> bool:
+	"""
+	Only the first shard cluster polls the platforms, the others deliver what it stores in the outbox for their guilds.
+	"""
+	return getattr(main, "CLUSTER_ID", None) in (None, 0)
+
+def polls_in_event_loop() -> bool:
+	"""
+	Whether the pollers run as tasks of this process, rather than in poller processes of their own (see workers.py).
+	"""
+	return runs_pollers() and not getattr(main, "POLLER_PROCESSES", False)
+
+def scheduled_groups() -> set | None:
+	"""
+	The scheduler job groups this process runs: the outbox always, the platform pollers unless they run elsewhere.
+	None runs every group.
+	"""
+	return None if polls_in_event_loop() else {"outbox"}
+
+# Channels fetched over REST because they weren't in the gateway cache, and whether the bot may post in each channel.
+# Both are invalidated by channel/role events, the permission entries also expire in case a change comes without an event.
+fetched_channels = TTLCache(ttl=60 * 60, maxsize=256)
+channel_send_permissions = TTLCache(ttl=10 * 60, maxsize=4096)
+
+# Discord allows a bot 50 requests per second globally. Notification sends are paced below that, 45/s with bursts of 5
+# never exceed 50 in any one second, leaving room for slash command responses and other requests.
+discord_requests = TokenBucket(rate=45, burst=5)
+
+# Webhook delivery backend (optional, NOTIFICATION_DELIVERY=webhook). One webhook per Discord channel, stored in the database.
+WEBHOOK_NAME = "Dreamcatcher"
+webhook_session = None # pooled HTTP session shared by every webhook
+channel_webhooks = {} # channel id -> discord.Webhook
 
 #
 #	Discord bot helper & debug functions
@@ -48,6 +119,206 @@ async def on_app_command_error(interaction: discord.Interaction, error: Exceptio
 	except Exception as e:
 		main.logger.error(f"[ERROR HANDLER FAILED]: {e}\n")
 
+async def resolve_channel(channel_id: int):
+	"""
+	Returns a Discord channel from the gateway cache, or the cache of fetched channels, fetching it over REST only
+	as the last resort. Returns None if the channel doesn't exist or the bot can't see it.
+	"""
+	channel = bot.get_channel(channel_id) or fetched_channels.get(channel_id)
+	if channel is None:
+		try:
+			await discord_requests.acquire()
+			channel = await bot.fetch_channel(channel_id)
+		except (discord.NotFound, discord.Forbidden) as e:
+			main.logger.info(f"Discord channel {channel_id} is not available: {e}\n")
+			return None
+		fetched_channels.set(channel_id, channel)
+	return channel
+
+def can_send_messages(channel) -> bool:
+	"""
+	Memoized check of the bot's send_messages permission in a channel.
+	"""
+	allowed = channel_send_permissions.get(channel.id)
+	if allowed is None:
+		allowed = channel.permissions_for(channel.guild.me).send_messages
+		channel_send_permissions.set(channel.id, allowed)
+	return allowed
+
+def forget_channel(channel_id: int) -> None:
+	fetched_channels.pop(channel_id)
+	channel_send_permissions.pop(channel_id)
+
+async def get_channel_webhook(channel, recreate: bool = False) -> discord.Webhook | None:
+	"""
+	Returns the delivery webhook of a channel, creating and storing one on first use (or when recreate is set).
+	Returns None if the channel has no webhook and the bot can't manage webhooks there.
+	"""
+	global webhook_session
+	if webhook_session is None or webhook_session.closed:
+		webhook_session = aiohttp.ClientSession()
+
+	if not recreate and channel.id in channel_webhooks:
+		return channel_webhooks[channel.id]
+	url = None if recreate else sql.get_webhook_url(str(channel.id))
+	if url is None:
+		# threads and channel types without webhooks keep using the bot
+		if not hasattr(channel, "create_webhook") or not channel.permissions_for(channel.guild.me).manage_webhooks:
+			return None
+		try:
+			webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="Notification delivery")
+		except discord.HTTPException as e:
+			main.logger.info(f"Could not create a delivery webhook for channel {channel.name}: {e}\n")
+			return None
+		url = webhook.url
+		sql.set_webhook_url(str(channel.id), url)
+		main.logger.info(f"Created a delivery webhook for channel {channel.name}.\n")
+	channel_webhooks[channel.id] = discord.Webhook.from_url(url, session=webhook_session)
+	return channel_webhooks[channel.id]
+
+async def send_via_webhook(channel, notification, ping_role: str, message_sent=None) -> bool:
+	"""
+	Sends a notification through the channel's webhook, styled with the creator's name and avatar.
+	message_sent(outbox ids) is called after each message that went out.
+	A deleted webhook is recreated once. Returns False if the channel can't use a webhook.
+	"""
+	webhook = await get_channel_webhook(channel)
+	if webhook is None:
+		return False
+	message_sent = message_sent or (lambda outbox_ids: None)
+	message_outbox_ids = notification.message_outbox_ids()
+	# webhook names are limited to 80 characters
+	username = (notification.author_name or bot.user.display_name)[:80]
+	avatar_url = notification.author_avatar or bot.user.display_avatar.url
+	try:
+		await webhook.send(content=notification.content_for(ping_role) or discord.utils.MISSING,
+			embeds=list(notification.embeds), username=username, avatar_url=avatar_url)
+	except discord.NotFound:
+		main.logger.info(f"Delivery webhook of channel {channel.name} was deleted, recreating it...\n")
+		sql.set_webhook_url(str(channel.id), None)
+		channel_webhooks.pop(channel.id, None)
+		webhook = await get_channel_webhook(channel, recreate=True)
+		if webhook is None:
+			return False
+		await webhook.send(content=notification.content_for(ping_role) or discord.utils.MISSING,
+			embeds=list(notification.embeds), username=username, avatar_url=avatar_url)
+	message_sent(message_outbox_ids[0])
+	for follow_up, outbox_ids in zip(notification.follow_ups, message_outbox_ids[1:]):
+		await webhook.send(follow_up, username=username, avatar_url=avatar_url)
+		message_sent(outbox_ids)
+	return True
+
+# Gateway measurement mode (--measure_gateway), for comparing the memory profiles
+gateway_events = {} # event type -> count, only counted while measuring
+gateway_event_rate = None # events per second over the last measurement interval
+
+async def count_gateway_event(event_type: str) -> None:
+	gateway_events[event_type] = gateway_events.get(event_type, 0) + 1
+
+def gateway_snapshot() -> dict:
+	"""
+	Memory and cache sizes of the Discord client, and the gateway event rate when measuring.
+	"""
+	rss = metrics.rss_bytes()
+	return {
+		"profile": GATEWAY_PROFILE,
+		"intents": bot.intents.value,
+		"guilds": len(bot.guilds),
+		"cached messages": len(bot.cached_messages),
+		"cached members": sum(len(guild.members) for guild in bot.guilds),
+		"RSS": f"{rss / 2**20:.1f} MiB" if rss else "unavailable",
+		"gateway events/s": f"{gateway_event_rate:.1f}" if gateway_event_rate is not None else "not measured (--measure_gateway)",
+	}
+
+async def measure_gateway(interval: int) -> None:
+	"""
+	Logs RSS, cache sizes and gateway events per second every interval seconds.
+	Run once with each profile to compare them, memory should stay flat with the lean profile as guilds are added.
+	"""
+	global gateway_event_rate
+	bot.add_listener(count_gateway_event, "on_socket_event_type")
+	previous_total = 0
+	previous_at = time.monotonic()
+	while True:
+		await asyncio.sleep(interval)
+		total = sum(gateway_events.values())
+		now = time.monotonic()
+		gateway_event_rate = (total - previous_total) / (now - previous_at)
+		previous_total, previous_at = total, now
+		main.logger.info(f"Gateway measurement: {', '.join(f'{name} {value}' for name, value in gateway_snapshot().items())}\n")
+
+# Shards & clusters
+CLUSTER_STATUS_INTERVAL = 30 # seconds between the shard latency updates a cluster stores for the others
+CLUSTER_STATUS_KEY = "cluster_status:{}"
+
+def record_channel_guilds() -> None:
+	"""
+	Stores the guild of subscribed channels that don't have one yet and are visible to this process.
+	"""
+	channel_guilds = {}
+	for channel_id in sql.get_discord_channels_without_guild():
+		try:
+			channel = bot.get_channel(int(channel_id))
+		except ValueError:
+			continue
+		if channel is not None and getattr(channel, "guild", None):
+			channel_guilds[channel_id] = channel.guild.id
+	sql.set_discord_channel_guilds(channel_guilds)
+
+def shard_latencies() -> list:
+	"""
+	(shard id, heartbeat latency in seconds) of every shard connected by this process.
+	"""
+	if isinstance(bot, commands.AutoShardedBot):
+		return bot.latencies
+	return [(0, bot.latency)]
+
+def format_latency(latency: float) -> str:
+	return f"{latency * 1000:.0f} ms" if math.isfinite(latency) else "not connected"
+
+async def publish_cluster_status() -> None:
+	"""
+	Stores this cluster's shard latencies in the shared database, so the metrics report of any cluster can show all shards.
+	"""
+	while True:
+		try:
+			sql.set_bot_state(CLUSTER_STATUS_KEY.format(main.CLUSTER_ID), json.dumps({
+				"shards": {str(shard_id): latency if math.isfinite(latency) else None for shard_id, latency in shard_latencies()},
+				"guilds": len(bot.guilds),
+				"updated_at": time.time()
+			}))
+		except Exception as e:
+			main.logger.error(f"Error publishing shard cluster status: {e}\n")
+		await asyncio.sleep(CLUSTER_STATUS_INTERVAL)
+
+def shard_snapshot() -> dict:
+	"""
+	Heartbeat latency per shard, for this process and, in a cluster, for the others as they last reported it.
+	"""
+	if not is_cluster():
+		return {f"shard {shard_id}": format_latency(latency) for shard_id, latency in shard_latencies()}
+	values = {}
+	for cluster_id in range(main.DISCORD_CLUSTERS):
+		if cluster_id == main.CLUSTER_ID:
+			for shard_id, latency in shard_latencies():
+				values[f"cluster {cluster_id} shard {shard_id}"] = format_latency(latency)
+			continue
+		status = sql.get_bot_state(CLUSTER_STATUS_KEY.format(cluster_id))
+		if status is None:
+			values[f"cluster {cluster_id}"] = "no status yet"
+			continue
+		status = json.loads(status)
+		age = int(time.time() - status["updated_at"])
+		for shard_id, latency in status["shards"].items():
+			values[f"cluster {cluster_id} shard {shard_id}"] = f"{format_latency(latency if latency is not None else math.inf)}, {age} s ago"
+	return values
+
+async def close_webhook_session() -> None:
+	global webhook_session
+	if webhook_session and not webhook_session.closed:
+		await webhook_session.close()
+	webhook_session = None
+
 async def bot_internal_message(message: str) -> None:
 	"""
 	Sends a message to the home/debug channel only.
@@ -56,7 +327,7 @@ async def bot_internal_message(message: str) -> None:
 		# The channels are fetched during startup, no need to async call them now
 		homeGuild = discord.utils.get(bot.guilds, id=main.HOME_SERVER_ID)
 		if homeGuild:
-			homeChannel = await bot.fetch_channel(main.HOME_CHANNEL_ID)
+			homeChannel = await resolve_channel(main.HOME_CHANNEL_ID)
 
 			if len(message) > 2000:
 				# message longer than Discord's limit, send as a file
@@ -92,22 +363,17 @@ async def load_cogs() -> None:
 
 @bot.event
 async def on_ready() -> None:
-	global bluesky_task
-	global youtube_task
-	global youtube_members_only_task
-	global twitch_task
-
 	# Connect to home (debug) server and channel
 	try:
 		homeGuild = discord.utils.get(bot.guilds, id=main.HOME_SERVER_ID)
 		if not homeGuild:
 			main.logger.info(f"Home server not found! Please check the server ID in the .env file.\n")
-		homeChannel = await bot.fetch_channel(main.HOME_CHANNEL_ID)
+		homeChannel = await resolve_channel(main.HOME_CHANNEL_ID)
 		if not homeChannel:
 			main.logger.info(f"Home channel not found! Please check the channel ID in the .env file.\n")
 		else:
 			main.logger.info(f"Connected to home channel: {homeChannel.name}\n")
-			await homeChannel.send(f"Dreamcatcher is now online! 💭")
+			await homeChannel.send(f"Dreamcatcher is now online! 💭" + (f" (shard cluster {main.CLUSTER_ID})" if is_cluster() else ""))
 			main.logger.info(f"Bot is ready! Logged in as {bot.user.name}#{bot.user.discriminator}\n")
 
 		# Loads the slash commands
@@ -116,136 +382,66 @@ async def on_ready() -> None:
 		# register error handler
 		bot.tree.on_error = on_app_command_error
 
-		# Start the Bluesky post sharing task
-		if bluesky_task is None or bluesky_task.done():
-			bluesky_task = asyncio.create_task(blsky.share_bluesky_posts())
-
-		if youtube_task is None or youtube_task.done():
-			youtube_task = asyncio.create_task(youtube.check_for_youtube_activities())
+		# Remember the guilds of channels subscribed before guilds were stored, for routing between shard clusters
+		record_channel_guilds()
 
-		if youtube_members_only_task is None or youtube_members_only_task.done():
-			youtube_members_only_task = asyncio.create_task(youtube.check_for_members_only_youtube_activity())
+		# Start the notification delivery workers before the pollers that feed them
+		dispatcher.start(main.NOTIFICATION_WORKERS, main.NOTIFICATION_QUEUE_SIZE, main.NOTIFICATION_COALESCE_WINDOW)
 
-		if twitch_task is None or twitch_task.done():
-			twitch_task = asyncio.create_task(twitch.check_for_twitch_activities())
+		# Start the platform pollers and the outbox, which first replays what was left when the bot last stopped
+		poll_scheduler.start(scheduled_groups())
 
 	except Exception as e:
 		main.logger.error(f"Error connecting to home server: {e}\n")
 
 @bot.event
 async def on_resumed():
-	global bluesky_task
-	global youtube_task
-	global youtube_members_only_task
-	global twitch_task
-
-	if bluesky_task is None or bluesky_task.done():
-		try:
-			bluesky_task = asyncio.create_task(blsky.share_bluesky_posts())
-			#await bot_internal_message(f"Bot resumed, spinning bluesky task back up again...\n")
-		except Exception as e:
-			main.logger.error(f"Error resuming Bluesky task by Discord bot: {e}\n")
-
-	if youtube_task is None or youtube_task.done():
-		try:
-			youtube_task = asyncio.create_task(youtube.check_for_youtube_activities())
-			#await bot_internal_message(f"Bot resumed, spinning youtube task back up again...\n")
-		except Exception as e:
-			main.logger.error(f"Error resuming Youtube task by Discord bot: {e}\n")
-	
-	if youtube_members_only_task is None or youtube_members_only_task.done():
-		try:
-			youtube_members_only_task = asyncio.create_task(youtube.check_for_members_only_youtube_activity())
-			#await bot_internal_message(f"Bot resumed, spinning youtube members only task back up again...\n")
-		except Exception as e:
-			main.logger.error(f"Error resuming Youtube members only task by Discord bot: {e}\n")
-
-	if twitch_task is None or twitch_task.done():
-		try:
-			twitch_task = asyncio.create_task(twitch.check_for_twitch_activities())
-			#await bot_internal_message(f"Bot resumed, spinning twitch task back up again...\n")
-		except Exception as e:
-			main.logger.error(f"Error resuming Twitch task by Discord bot: {e}\n")
+	dispatcher.start(main.NOTIFICATION_WORKERS, main.NOTIFICATION_QUEUE_SIZE, main.NOTIFICATION_COALESCE_WINDOW)
+	poll_scheduler.start(scheduled_groups())
 
 @bot.event
 async def on_disconnect():
-	global bluesky_task
-	global youtube_task
-	global youtube_members_only_task
-	global twitch_task
-
 	main.logger.info(f"Bot is disconnecting... cleaning up tasks.\n")
-
-	# cancel Bluesky task if its running
-	if bluesky_task and not bluesky_task.done():
-		bluesky_task.cancel()
-		try:
-			await bluesky_task
-		except asyncio.CancelledError:
-			main.logger.error("Bluesky task cancelled.\n")
-
-	if youtube_task and not youtube_task.done():
-		youtube_task.cancel()
-		try:
-			await youtube_task
-		except asyncio.CancelledError:
-			main.logger.error("Youtube task cancelled.\n")
-
-	if youtube_members_only_task and not youtube_members_only_task.done():
-		youtube_members_only_task.cancel()
-		try:
-			await youtube_members_only_task
-		except asyncio.CancelledError:
-			main.logger.error("Youtube members only task cancelled.\n")
-
-	if twitch_task and not twitch_task.done():
-		twitch_task.cancel()
-		try:
-			await twitch_task
-		except asyncio.CancelledError:
-			main.logger.error("Twitch task cancelled.\n")
+	await poll_scheduler.stop()
 
 @bot.event
 async def on_shutdown():
-	global bluesky_task
-	global youtube_task
-	global youtube_members_only_task
-	global twitch_task
-
 	main.logger.info(f"Bot shutdown requested, cleaning up resources...\n")
-
-	# cancel Bluesky task if its running
-	if bluesky_task and not bluesky_task.done():
-		bluesky_task.cancel()
-		try:
-			await bluesky_task
-		except asyncio.CancelledError:
-			main.logger.error("Bluesky task cancelled.\n")
+	await poll_scheduler.stop()
+	# close the Twitch HTTP session
+	await twitch.close_twitch_session()
+
+	# deliver what the pollers already queued, including digests that weren't due yet.
+	# Anything that doesn't make it stays in the outbox and is replayed on the next start.
+	flush_all_digests()
+	await dispatcher.drain()
+	await close_webhook_session()
 	
-	if youtube_task and not youtube_task.done():
-		youtube_task.cancel()
-		try:
-			await youtube_task
-		except asyncio.CancelledError:
-			main.logger.error("Youtube task cancelled.\n")
+	await bot.close()
 
-	if youtube_members_only_task and not youtube_members_only_task.done():
-		youtube_members_only_task.cancel()
-		try:
-			await youtube_members_only_task
-		except asyncio.CancelledError:
-			main.logger.error("Youtube members only task cancelled.\n")
+@bot.event
+async def on_guild_channel_update(before, after):
+	# permission overwrites may have changed
+	forget_channel(after.id)
 
-	if twitch_task and not twitch_task.done():
-		twitch_task.cancel()
-		try:
-			await twitch_task
-		except asyncio.CancelledError:
-			main.logger.error("Twitch task cancelled.\n")
-		# close the Twitch HTTP session
-		await twitch.close_twitch_session()
-	
-	await bot.close()
+@bot.event
+async def on_guild_channel_delete(channel):
+	forget_channel(channel.id)
+	channel_webhooks.pop(channel.id, None)
+
+@bot.event
+async def on_guild_role_update(before, after):
+	# a role change can affect any channel of the guild
+	channel_send_permissions.clear()
+
+@bot.event
+async def on_guild_role_delete(role):
+	channel_send_permissions.clear()
+
+@bot.event
+async def on_guild_remove(guild):
+	for channel in guild.channels:
+		forget_channel(channel.id)
 
 #
 #	Startup task controller
@@ -273,146 +469,516 @@ class StartupSilencer:
 #	Discord bot notification functions
 #
 
-async def notify_youtube_activity(target_channel: str, activity_type: str, channel_name: str, video_id: str, members_only: bool=False) -> None:
-	channel = await bot.fetch_channel(int(target_channel))
-	if channel and channel.permissions_for(channel.guild.me).send_messages:
-		# Use channel.id instead of channel.guild.id
-		notify_role = sql.get_notification_role(channel.id)
-		ping_role = ""
-		if notify_role:
-			main.logger.info(f"Notification role found: {notify_role}\n")
-			ping_role = f"<@&{notify_role}> "
-		try:
-			video_url = f"https://www.youtube.com/watch?v={video_id}"
-
-			if activity_type == "upload":
-				await channel.send(
-					f"{ping_role}**{channel_name} just uploaded a new video!** 💭\n"
-					f"{video_url}"
-				)
-			elif activity_type == "upcoming_livestream":
-				await channel.send(
-					f"{ping_role}**{channel_name} just scheduled a new stream!** 🔔\n"
-					f"{video_url}"
-				)
-			elif activity_type == "upcoming_premiere":
-				await channel.send(
-					f"{ping_role}**{channel_name} just scheduled a new premiere!** 🎬\n"
-					f"{video_url}"
-				)
-			elif activity_type == "live":
-				await channel.send(
-					f"{ping_role}**{channel_name} is now live!** 🔴\n"
-					f"{video_url}"
-				)
-		except Exception as e:
-			main.logger.error(f"Error sending message to channel {channel.name}: {e}\n")
-	else:
-		main.logger.info(f"Bot does not have permission to send messages in channel: {channel.name}\n")
-
-async def notify_bluesky_activity(target_channel: str, post_uri: str, content: str, images: list, links: list, channel_name: str, avatar_url: str, post_type: str, author_url: str) -> None:
-	channel = await bot.fetch_channel(int(target_channel))
-	# check if the bot has permission to send messages in the channel
-	if channel and channel.permissions_for(channel.guild.me).send_messages:
-		notify_role = sql.get_notification_role(channel.id)
-		ping_role = ""
-		# only ping role for root posts or replies to third party posts.
-		# self-replies and context posts do not cumulate pings.
-		if notify_role and (post_type == "root" or post_type == "reply"):
-			ping_role = f"<@&{notify_role}> "
-
-		TITLE_MAP = {
-			"root": "🦋 Bluesky Post",
-			"self_reply": "🦋🧵",
-			"reply": "🦋💬 Bluesky Reply",
-			"repost": "🦋🔁 Bluesky Repost",
-			"context": "🦋🧵 Original Post",
-		}
-		try:
-			# Create embed for better formatting
-			# If this is a video post, use the direct video embed URL
-			is_video_post = False
-			video_url = None
-			if links and any("d.bksye.app" in link for link in links):
-				is_video_post = True
-				video_url = next((link for link in links if "d.bksye.app" in link), blsky.convert_bluesky_uri_to_url(post_uri))
-				post_url = video_url
-			else:
-				post_url = blsky.convert_bluesky_uri_to_url(post_uri)
+@dataclass(frozen=True)
+class RenderedNotification:
+	"""
+	A notification rendered once and shared by every subscribed Discord channel.
+	Only the channel's ping role is added when it is sent.
+	"""
+	embeds: tuple = ()
+	content: str = ""
+	follow_ups: tuple = ()	# extra messages sent after the main one, e.g. links that need their own preview
+	ping: bool = True
+	author_name: str | None = None	# creator shown as the sender when delivered through a webhook
+	author_avatar: str | None = None
+	summary: str = ""	# one-line entry used when the channel receives digests
+	urgent: bool = False	# may skip a channel's digest and be delivered right away
+	outbox_ids: tuple = ()	# outbox entries settled by delivering this notification
+	follow_up_outbox_ids: tuple = ()	# per follow-up, the outbox entries whose links it carries (merged notifications only)
+
+	def content_for(self, ping_role: str) -> str:
+		return f"{ping_role if self.ping else ''}{self.content}"
+
+	def message_outbox_ids(self) -> list:
+		"""
+		The outbox entries carried by each message of the notification, the main message first and then the follow-ups.
+		An entry is delivered once every message carrying it has been sent.
+		"""
+		return [self.outbox_ids] + list(self.follow_up_outbox_ids or [self.outbox_ids] * len(self.follow_ups))
+
+	def to_payload(self) -> str:
+		"""
+		Serializes the notification for the outbox.
+		"""
+		return json.dumps({
+			"embeds": [embed.to_dict() for embed in self.embeds],
+			"content": self.content,
+			"follow_ups": list(self.follow_ups),
+			"ping": self.ping,
+			"author_name": self.author_name,
+			"author_avatar": self.author_avatar,
+			"summary": self.summary,
+			"urgent": self.urgent
+		})
+
+	@classmethod
+	def from_payload(cls, payload: str, outbox_id: int | None = None) -> "RenderedNotification":
+		data = json.loads(payload)
+		data["embeds"] = tuple(discord.Embed.from_dict(embed) for embed in data["embeds"])
+		data["follow_ups"] = tuple(data["follow_ups"])
+		return cls(**data, outbox_ids=(outbox_id,) if outbox_id is not None else ())
+
+# Discord message limits used when coalescing
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_LENGTH = 2000
+MAX_PREVIEWS_PER_MESSAGE = 5 # Discord unfurls at most this many links of one message
+PING_ROLE_RESERVE = 32 # room left for the "<@&role id> " prefix
+PREVIEWED_LINK = re.compile(r"(?<!<)https?://") # links wrapped in <...> get no preview
+
+def count_previews(content: str) -> int:
+	return len(PREVIEWED_LINK.findall(content))
+
+def group_lines(lines, max_lines: int, max_length: int = MAX_MESSAGE_LENGTH) -> list:
+	"""
+	Splits lines, in order, into as few groups as fit the length limit as one message, at most max_lines per group.
+	"""
+	groups = []
+	current = []
+	for line in lines:
+		if current and (len(current) >= max_lines or len("\n".join(current + [line])) > max_length):
+			groups.append(current)
+			current = []
+		current.append(line)
+	if current:
+		groups.append(current)
+	return groups
+
+def pack_lines(lines, max_lines: int, max_length: int = MAX_MESSAGE_LENGTH) -> list:
+	"""
+	Packs lines into as few messages as fit the length limit, at most max_lines per message.
+	"""
+	return ["\n".join(group) for group in group_lines(lines, max_lines, max_length)]
+
+def coalesce_notifications(notifications: list, by_author: bool = False) -> list:
+	"""
+	Merges consecutive notifications for one channel into the fewest messages Discord allows:
+	up to 10 embeds and 2000 characters per message, pinging once if any of the merged ones pings.
+	Link follow-ups are packed into shared messages after their group, a few per message so every link keeps its preview.
+	With by_author, only notifications from the same creator are merged (webhook messages carry the creator's name).
+	"""
+	merged = []
+	group = []
+
+	def flush():
+		if not group:
+			return
+		# remember whose links end up in each follow-up, so a failed follow-up only fails those notifications
+		lines = [line for notification in group for line in notification.follow_ups]
+		line_outbox_ids = [notification.outbox_ids for notification in group for _ in notification.follow_ups]
+		follow_ups = []
+		follow_up_outbox_ids = []
+		position = 0
+		for lines_group in group_lines(lines, MAX_PREVIEWS_PER_MESSAGE):
+			follow_ups.append("\n".join(lines_group))
+			owners = line_outbox_ids[position:position + len(lines_group)]
+			follow_up_outbox_ids.append(tuple(dict.fromkeys(outbox_id for outbox_ids in owners for outbox_id in outbox_ids)))
+			position += len(lines_group)
+		merged.append(RenderedNotification(
+			embeds=tuple(embed for notification in group for embed in notification.embeds),
+			content="\n".join(notification.content for notification in group if notification.content),
+			follow_ups=tuple(follow_ups),
+			follow_up_outbox_ids=tuple(follow_up_outbox_ids),
+			ping=any(notification.ping for notification in group),
+			author_name=group[0].author_name,
+			author_avatar=group[0].author_avatar,
+			outbox_ids=tuple(outbox_id for notification in group for outbox_id in notification.outbox_ids)
+		))
+		group.clear()
+
+	for notification in notifications:
+		if group:
+			# links in the content (e.g. YouTube videos) rely on their preview, which Discord only shows for a few of them
+			link_count = sum(count_previews(n.content) for n in group) + count_previews(notification.content)
+			embed_count = sum(len(n.embeds) for n in group) + len(notification.embeds)
+			content_length = sum(len(n.content) + 1 for n in group) + len(notification.content) + PING_ROLE_RESERVE
+			other_author = by_author and (notification.author_name, notification.author_avatar) != (group[0].author_name, group[0].author_avatar)
+			if embed_count > MAX_EMBEDS_PER_MESSAGE or link_count > MAX_PREVIEWS_PER_MESSAGE or content_length > MAX_MESSAGE_LENGTH or other_author:
+				flush()
+		group.append(notification)
+	flush()
+	return merged
+
+def count_messages(notifications: list) -> int:
+	return sum(1 + len(notification.follow_ups) for notification in notifications)
+
+async def send_notifications(target_channel: str, notifications: list) -> None:
+	"""
+	Sends a batch of rendered notifications to a Discord channel in as few messages as possible,
+	pinging the channel's notification role if it has one.
+	The outbox entries of the batch are settled afterwards: delivered ones are removed, the rest are retried later.
+	"""
+	delivered = []
+	error = "delivery interrupted"
+	try:
+		channel = await resolve_channel(int(target_channel))
+		if channel is None:
+			error = "channel not found"
+		# check if the bot has permission to send messages in the channel
+		elif can_send_messages(channel):
+			notify_role = sql.get_notification_role(channel.id)
+			ping_role = f"<@&{notify_role}> " if notify_role else ""
+			webhook_delivery = main.NOTIFICATION_DELIVERY == "webhook"
+			merged = coalesce_notifications(notifications, by_author=webhook_delivery)
+			metrics.increment("discord.messages_sent", count_messages(merged))
+			metrics.increment("discord.calls_saved_by_coalescing", count_messages(notifications) - count_messages(merged))
+			# an outbox entry is delivered once every message carrying part of it has been sent
+			remaining = {}
+			for notification in merged:
+				for outbox_ids in notification.message_outbox_ids():
+					for outbox_id in outbox_ids:
+						remaining[outbox_id] = remaining.get(outbox_id, 0) + 1
+
+			def message_sent(outbox_ids: tuple) -> None:
+				for outbox_id in outbox_ids:
+					remaining[outbox_id] -= 1
+					if remaining[outbox_id] == 0:
+						delivered.append(outbox_id)
+
+			try:
+				for notification in merged:
+					await discord_requests.acquire()
+					if not (webhook_delivery and await send_via_webhook(channel, notification, ping_role, message_sent)):
+						message_outbox_ids = notification.message_outbox_ids()
+						await channel.send(
+							content=notification.content_for(ping_role),
+							embeds=list(notification.embeds)
+						)
+						message_sent(message_outbox_ids[0])
+						for follow_up, outbox_ids in zip(notification.follow_ups, message_outbox_ids[1:]):
+							await discord_requests.acquire()
+							await channel.send(follow_up)
+							message_sent(outbox_ids)
+				error = None
+			except discord.Forbidden as e:
+				# permissions changed without an event reaching us, check again next time
+				forget_channel(channel.id)
+				error = str(e)
+				main.logger.info(f"Error sending notification to channel {channel.name}: {e}\n")
+			except Exception as e:
+				error = str(e)
+				main.logger.info(f"Error sending notification to channel {channel.name}: {e}\n")
+		else:
+			error = "missing permission to send messages"
+			main.logger.info(f"Bot does not have permission to send messages in channel: {channel.name}\n")
+	finally:
+		settle_outbox_entries([outbox_id for notification in notifications for outbox_id in notification.outbox_ids], delivered, error)
+
+def channel_guild(target_channel: str):
+	"""
+	The guild a channel's notifications are scheduled under. Channels missing from the caches count as their own guild.
+	"""
+	channel = bot.get_channel(int(target_channel)) or fetched_channels.get(int(target_channel))
+	guild = getattr(channel, "guild", None)
+	return guild.id if guild else target_channel
+
+# Notifications are queued by the pollers and delivered in the background, fairly across guilds, see dispatcher.py
+dispatcher = NotificationDispatcher(send_notifications, group=channel_guild)
+metrics.register_source("Notification dispatcher", dispatcher.snapshot)
+metrics.register_source("Discord global rate limit", discord_requests.snapshot)
+metrics.register_source("Gateway & caches", gateway_snapshot)
+metrics.register_source("Discord shards", shard_snapshot)
+
+# Channels in digest mode collect their notifications here until the digest is due
+DEFAULT_DIGEST_INTERVAL = 60 # minutes
+delivery_settings = TTLCache(ttl=5 * 60) # channel id -> settings from sql.get_delivery_settings()
+digest_buffers = {} # channel id -> list of notifications waiting for the next digest
+digest_timers = {} # channel id -> asyncio.TimerHandle of the channel's next digest
+
+def enqueue_notification(target_channel: str, notification: RenderedNotification) -> None:
+	"""
+	Queues a rendered notification for a Discord channel. Returns immediately, notifications to the same channel keep their order.
+	Channels in digest mode buffer it for their next digest instead, unless it's urgent and they let urgent ones through.
+	If the channel's queue is full, the notification's outbox entries are left for the outbox task to retry.
+	"""
+	target_channel = str(target_channel)
+	settings = delivery_settings.get(target_channel)
+	if settings is None:
+		settings = sql.get_delivery_settings(target_channel)
+		delivery_settings.set(target_channel, settings)
+
+	if settings["mode"] != "digest" or (notification.urgent and settings["urgent_bypass"]):
+		if not dispatcher.enqueue(target_channel, notification):
+			outbox_in_flight.difference_update(notification.outbox_ids)
+		return
+	buffer = digest_buffers.setdefault(target_channel, [])
+	if not buffer:
+		# the digest is due one interval after its first entry
+		interval = settings["interval"] or DEFAULT_DIGEST_INTERVAL
+		digest_timers[target_channel] = asyncio.get_running_loop().call_later(interval * 60, flush_digest, target_channel)
+	buffer.append(notification)
+
+def forget_delivery_settings(target_channel) -> None:
+	"""
+	Applies a changed delivery mode. Anything buffered for a digest is sent out right away.
+	"""
+	delivery_settings.pop(str(target_channel))
+	flush_digest(str(target_channel))
+
+def render_digest(notifications: list) -> list:
+	"""
+	Builds the digest messages of the buffered notifications, one line each, split to fit Discord's length limit.
+	"""
+	lines = [notification.summary or notification.content.split("\n")[0] for notification in notifications]
+	ping = any(notification.ping for notification in notifications)
+	header = f"📰 **Digest: {len(notifications)} new notification{'s' if len(notifications) != 1 else ''}**"
+	messages = pack_lines([header] + lines, len(lines) + 1, MAX_MESSAGE_LENGTH - PING_ROLE_RESERVE)
+	# the buffered outbox entries are settled by the last message of the digest
+	outbox_ids = tuple(outbox_id for notification in notifications for outbox_id in notification.outbox_ids)
+	return [
+		RenderedNotification(content=message, ping=ping and i == 0, outbox_ids=outbox_ids if i == len(messages) - 1 else ())
+		for i, message in enumerate(messages)
+	]
+
+def flush_digest(target_channel: str) -> None:
+	# a digest sent early (e.g. on a mode change) must not leave its timer to cut the next buffer short
+	timer = digest_timers.pop(target_channel, None)
+	if timer is not None:
+		timer.cancel()
+	notifications = digest_buffers.pop(target_channel, None)
+	if not notifications:
+		return
+	metrics.increment("digest.notifications_digested", len(notifications))
+	for notification in render_digest(notifications):
+		if not dispatcher.enqueue(target_channel, notification):
+			outbox_in_flight.difference_update(notification.outbox_ids)
+
+def flush_all_digests() -> None:
+	for target_channel in list(digest_buffers):
+		flush_digest(target_channel)
+
+# Notification outbox, see sql.add_outbox_entries. The pollers save the rendered notifications in the same transaction
+# as the record that marks the activity seen, so a crash or a failed send can't lose them.
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE = 30 # seconds before the first retry, doubled after every failed attempt
+OUTBOX_POLL_INTERVAL = 30 # seconds between checks for due retries
+OUTBOX_CLUSTER_POLL_INTERVAL = 2 # shard clusters receive their notifications through the outbox, so it's checked often
+OUTBOX_CLAIM_LEASE = 10 * 60 # seconds a claimed entry is reserved for this process, renewed while it's still on its way
+outbox_in_flight = set() # outbox ids queued in the dispatcher or buffered for a digest
+outbox_settled = TTLCache(ttl=10 * 60, maxsize=10000) # recently delivered outbox ids, so a late forward can't repeat them
+outbox_forwarder = None # in a poller process, passes saved entries on to the gateway process (see workers.py)
+outbox_claims_renewed_at = 0.0
+
+def outbox_claimant() -> str:
+	return f"cluster {main.CLUSTER_ID}" if is_cluster() else "bot"
+
+def outbox_entries(deliveries: list) -> list:
+	"""
+	Turns (discord channel, notification) deliveries into outbox entries for the sql save functions.
+	"""
+	payloads = {}
+	entries = []
+	for target_channel, notification in deliveries:
+		if id(notification) not in payloads:
+			payloads[id(notification)] = notification.to_payload()
+		entries.append((str(target_channel), payloads[id(notification)]))
+	return entries
+
+def enqueue_outbox_deliveries(deliveries: list, outbox_ids: list | None) -> None:
+	"""
+	Queues the deliveries whose outbox entries were just saved, each carrying its entry id.
+	If saving failed, nothing was marked as seen either and the activity is picked up again on the next poll.
+	"""
+	if outbox_ids is None:
+		main.logger.warning(f"Saving {len(deliveries)} notifications to the outbox failed, they'll be retried on the next poll.\n")
+		return
+	if is_cluster():
+		# the cluster that owns each channel's guild picks its entries up from the outbox
+		return
+	if outbox_forwarder is not None:
+		outbox_forwarder([(outbox_id, target_channel, payload) for outbox_id, (target_channel, payload) in zip(outbox_ids, outbox_entries(deliveries))])
+		return
+	for (target_channel, notification), outbox_id in zip(deliveries, outbox_ids):
+		outbox_in_flight.add(outbox_id)
+		enqueue_notification(target_channel, replace(notification, outbox_ids=(outbox_id,)))
+
+def settle_outbox_entries(outbox_ids: list, delivered: list, error: str | None) -> None:
+	"""
+	Removes delivered outbox entries and schedules the retry of the others, dead-lettering those out of attempts.
+	"""
+	if not outbox_ids:
+		return
+	outbox_in_flight.difference_update(outbox_ids)
+	sql.remove_outbox_entries(delivered)
+	for outbox_id in delivered:
+		outbox_settled.set(outbox_id, True)
+	delivered = set(delivered)
+	failed = [outbox_id for outbox_id in outbox_ids if outbox_id not in delivered]
+	if not failed:
+		return
+	metrics.increment("outbox.failed_attempts", len(failed))
+	dead = sql.mark_outbox_entries_failed(failed, error or "unknown error", OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE)
+	if dead:
+		metrics.increment("outbox.dead_lettered", dead)
+		main.logger.warning(f"Gave up on {dead} notifications after {OUTBOX_MAX_ATTEMPTS} attempts: {error}\n")
+
+def enqueue_forwarded_notifications(entries: list) -> None:
+	"""
+	Queues (outbox id, discord channel, payload) entries forwarded by a poller process.
+	Entries the outbox task already picked up, or delivered, are skipped.
+	"""
+	for outbox_id, target_channel, payload in entries:
+		if outbox_id in outbox_in_flight or outbox_id in outbox_settled:
+			continue
+		outbox_in_flight.add(outbox_id)
+		enqueue_notification(target_channel, RenderedNotification.from_payload(payload, outbox_id))
+
+async def deliver_outbox() -> None:
+	"""
+	Queues the outbox entries that are due for a delivery attempt and not already on their way.
+	The first run replays whatever was still pending when the bot last stopped.
+	A shard cluster only takes the entries of guilds on its own shards, the first one also takes channels of unknown guilds.
+	Entries are claimed while they are on their way, so a channel whose guild becomes known meanwhile isn't
+	also picked up by the cluster owning that guild.
+	"""
+	global outbox_claims_renewed_at
+	try:
+		claimant = outbox_claimant()
+		if time.monotonic() - outbox_claims_renewed_at >= OUTBOX_CLAIM_LEASE / 3:
+			sql.renew_outbox_claims(outbox_in_flight, claimant, OUTBOX_CLAIM_LEASE)
+			outbox_claims_renewed_at = time.monotonic()
+		if is_cluster():
+			due = sql.get_due_outbox_entries(shard_ids=main.SHARD_IDS, shard_count=main.SHARD_COUNT, include_unknown_guilds=runs_pollers(),
+				claimant=claimant, lease=OUTBOX_CLAIM_LEASE)
+		else:
+			due = sql.get_due_outbox_entries(claimant=claimant, lease=OUTBOX_CLAIM_LEASE)
+		entries = [entry for entry in due if entry["id"] not in outbox_in_flight]
+		if entries:
+			main.logger.info(f"Delivering {len(entries)} notifications from the outbox...\n")
+		for entry in entries:
+			try:
+				notification = RenderedNotification.from_payload(entry["payload"], entry["id"])
+			except (ValueError, KeyError, TypeError) as e:
+				# an unreadable entry would fail the same way every time
+				sql.mark_outbox_entries_failed([entry["id"]], f"unreadable payload: {e}", 1, OUTBOX_RETRY_BASE)
+				continue
+			outbox_in_flight.add(entry["id"])
+			enqueue_notification(entry["discord_channel_id"], notification)
+	except Exception as e:
+		main.logger.error(f"Error inside notification outbox loop: {e}\n")
+
+poll_scheduler.register("Notification outbox", deliver_outbox, group="outbox", jitter=0,
+	interval=lambda: OUTBOX_CLUSTER_POLL_INTERVAL if is_cluster() else OUTBOX_POLL_INTERVAL)
+metrics.register_source("Notification outbox", sql.get_outbox_summary)
+
+YOUTUBE_HEADLINES = {
+	"upload": "just uploaded a new video!** 💭",
+	"upcoming_livestream": "just scheduled a new stream!** 🔔",
+	"upcoming_premiere": "just scheduled a new premiere!** 🎬",
+	"live": "is now live!** 🔴",
+}
 
-			embed = discord.Embed(
-				title = TITLE_MAP.get(post_type, "🦋 Bluesky Post"),
-				description=content,
-				color=discord.Color.blue(),
+def render_youtube_activity(activity_type: str, channel_name: str, video_id: str, members_only: bool=False) -> RenderedNotification | None:
+	"""
+	Builds the message of a YouTube activity. Returns None for activity types that aren't notified.
+	"""
+	headline = YOUTUBE_HEADLINES.get(activity_type)
+	if headline is None:
+		return None
+	video_url = f"https://www.youtube.com/watch?v={video_id}"
+	return RenderedNotification(
+		content=f"**{channel_name} {headline}\n{video_url}",
+		author_name=channel_name,
+		summary=f"▶️ **{channel_name}** {headline.split('**')[0]} <{video_url}>",
+		urgent=activity_type == "live"
+	)
+
+def render_bluesky_activity(post_uri: str, content: str, images: list, links: list, channel_name: str, avatar_url: str, post_type: str, author_url: str) -> RenderedNotification:
+	"""
+	Builds the embeds and follow-up link messages of a Bluesky post.
+	"""
+	TITLE_MAP = {
+		"root": "🦋 Bluesky Post",
+		"self_reply": "🦋🧵",
+		"reply": "🦋💬 Bluesky Reply",
+		"repost": "🦋🔁 Bluesky Repost",
+		"context": "🦋🧵 Original Post",
+	}
+	# If this is a video post, use the direct video embed URL
+	is_video_post = False
+	video_url = None
+	if links and any("d.bksye.app" in link for link in links):
+		is_video_post = True
+		video_url = next((link for link in links if "d.bksye.app" in link), blsky.convert_bluesky_uri_to_url(post_uri))
+		post_url = video_url
+	else:
+		post_url = blsky.convert_bluesky_uri_to_url(post_uri)
+
+	embed = discord.Embed(
+		title = TITLE_MAP.get(post_type, "🦋 Bluesky Post"),
+		description=content,
+		color=discord.Color.blue(),
+		url=post_url,
+		timestamp = discord.utils.utcnow()
+	)
+	# If video, add as embed field
+	if is_video_post and video_url:
+		embed.add_field(name="Video", value=video_url, inline=False)
+
+	embed.set_author(name=f"{channel_name}",
+		icon_url=author_url if author_url else avatar_url) # If repost, original author's avatar.
+	embed.set_thumbnail(
+		url=avatar_url) # Thumbnail is always who is subscribed
+
+	embeds = [embed]
+	if images:
+		embed.set_image(url=images[0])
+		# multiple embeds hack. https://github.com/Rapptz/discord.py/discussions/9045
+		# embeds sharing the post URL are merged into a single image gallery
+		for image in images[1:]:
+			image_embed = discord.Embed(
 				url=post_url,
-				timestamp = discord.utils.utcnow()
 			)
-			# If video, add as embed field
-			if is_video_post and video_url:
-				embed.add_field(name="Video", value=video_url, inline=False)
-
-			embed.set_author(name=f"{channel_name}",
-				icon_url=author_url if author_url else avatar_url) # If repost, original author's avatar.
-			embed.set_thumbnail(
-				url=avatar_url) # Thumbnail is always who is subscribed
-			if images:
-				if (len(images) > 1):
-					# multiple embeds hack. https://github.com/Rapptz/discord.py/discussions/9045
-					embeds = []
-					for image in images:
-						# store the previously generated embed for the first embed in the embeds[] list
-						if len(embeds) == 0:
-							embed.set_image(url=image)
-							embeds.append(embed)
-						else:
-							# create a new embed for each image
-							image_embed = discord.Embed(
-								url=post_url,
-							)
-							image_embed.set_image(url=image)
-							embeds.append(image_embed)
-					# Send the embeds in a single message
-					await channel.send(
-						content=f"{ping_role}",
-						embeds=embeds
-					)
-				else:
-					embed.set_image(url=images[0])
-					# Send the actual embed image
-					await channel.send(
-						content=f"{ping_role}",
-						embed=embed
-					)
-			else:
-				# No image, send just the embed
-				await channel.send(
-					content=f"{ping_role}",
-					embed=embed
-				)
-			# Post extracted links after embed message to generate previews correctly
-			if links:
-				for link in links:
-					await channel.send(f"🔗{link}")
+			image_embed.set_image(url=image)
+			embeds.append(image_embed)
 
-		except Exception as e:
-			main.logger.info(f"Error sending Bluesky post to channel {channel.name}: {e}\n")
-	else:
-		main.logger.info(f"Bot does not have permission to send messages in channel: {channel.name}\n")
-
-async def notify_twitch_activity(target_channel: str, activity_type: str, channel_name: str, title: str, start_time: str) -> None:
-	channel = await bot.fetch_channel(int(target_channel))
-	if channel and channel.permissions_for(channel.guild.me).send_messages:
-		notify_role = sql.get_notification_role(channel.id)
-		ping_role = ""
-		if notify_role:
-			ping_role = f"<@&{notify_role}> "
-		try:
-			if activity_type == "live":
-				await channel.send(
-					f"{ping_role}**{channel_name} is now live!** 🔴\n"
-					f"https://www.twitch.tv/{channel_name}"
-				)
-		except Exception as e:
-			main.logger.error(f"Error sending message to channel {channel.name}: {e}\n")
-	else:
-		main.logger.info(f"Bot does not have permission to send messages in channel: {channel.name}\n")
+	# first line of the post for digests
+	excerpt = (content or "").strip().split("\n")[0][:100]
+
+	return RenderedNotification(
+		embeds=tuple(embeds),
+		# Post extracted links after embed message to generate previews correctly
+		follow_ups=tuple(f"🔗{link}" for link in links or []),
+		# only ping role for root posts or replies to third party posts.
+		# self-replies and context posts do not cumulate pings.
+		ping=post_type in ("root", "reply"),
+		author_name=channel_name,
+		author_avatar=author_url if author_url else avatar_url,
+		summary=f"{TITLE_MAP.get(post_type, '🦋 Bluesky Post')} · **{channel_name}**: {excerpt} <{post_url}>"
+	)
+
+def render_twitch_activity(activity_type: str, channel_name: str, title: str, start_time: str,
+	profile: dict = None, game: dict = None, game_name: str = None, thumbnail_url: str = None) -> RenderedNotification | None:
+	"""
+	Builds the embed of a Twitch activity. Returns None for activity types that aren't notified.
+	"""
+	if activity_type != "live":
+		return None
+	stream_url = f"https://www.twitch.tv/{channel_name}"
+	display_name = profile.get("display_name") if profile else channel_name
+
+	embed = discord.Embed(
+		title=title or stream_url,
+		color=discord.Color.purple(),
+		url=stream_url,
+		timestamp=datetime.fromisoformat(start_time.replace("Z", "+00:00")) if start_time else discord.utils.utcnow()
+	)
+	embed.set_author(name=display_name, url=stream_url,
+		icon_url=profile.get("profile_image_url") if profile else None)
+	if profile and profile.get("profile_image_url"):
+		embed.set_thumbnail(url=profile["profile_image_url"])
+	# prefer the canonical category name from /games, fall back to the one on the stream
+	category = game.get("name") if game else game_name
+	if category:
+		embed.add_field(name="Playing", value=category, inline=True)
+	if thumbnail_url:
+		embed.set_image(url=thumbnail_url)
+
+	return RenderedNotification(
+		embeds=(embed,),
+		# the embed already links the stream, <> keeps Discord from adding a second preview of the URL
+		content=f"**{display_name} is now live!** 🔴\n<{stream_url}>",
+		author_name=display_name,
+		author_avatar=profile.get("profile_image_url") if profile else None,
+		summary=f"🔴 **{display_name} is live**: {title or ''} <{stream_url}>",
+		urgent=True
+	)
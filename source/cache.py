@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+
+class TTLCache:
+	"""
+	Small in-memory cache where every entry expires after a time-to-live.
+	If maxsize is given, the least recently used entries are evicted first.
+	Storing None records a negative result, kept for negative_ttl seconds (defaults to ttl).
+	"""
+	def __init__(self, ttl: float, maxsize: int | None = None, negative_ttl: float | None = None):
+		self.ttl = ttl
+		self.maxsize = maxsize
+		self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+		self._entries = OrderedDict()	# key -> (expires_at, value)
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def __contains__(self, key) -> bool:
+		entry = self._entries.get(key)
+		if entry is None:
+			return False
+		if entry[0] <= time.monotonic():
+			del self._entries[key]
+			return False
+		return True
+
+	def get(self, key, default=None):
+		"""
+		Returns the cached value, or default if the key is missing or expired.
+		"""
+		if key not in self:
+			return default
+		self._entries.move_to_end(key)
+		return self._entries[key][1]
+
+	def set(self, key, value, ttl: float | None = None) -> None:
+		if ttl is None:
+			ttl = self.negative_ttl if value is None else self.ttl
+		self._entries[key] = (time.monotonic() + ttl, value)
+		self._entries.move_to_end(key)
+		if self.maxsize is not None:
+			while len(self._entries) > self.maxsize:
+				self._entries.popitem(last=False)
+
+	def pop(self, key, default=None):
+		entry = self._entries.pop(key, None)
+		return entry[1] if entry is not None else default
+
+	def missing(self, keys) -> list:
+		"""
+		Returns the given keys that have no fresh entry, without duplicates and in their original order.
+		"""
+		return [key for key in dict.fromkeys(keys) if key not in self]
+
+	def clear(self) -> None:
+		self._entries.clear()
@@ -0,0 +1,88 @@
+import asyncio
+import signal
+import sys
+
+import aiohttp
+
+import main
+
+# Shard clusters (DISCORD_CLUSTERS > 1): this process only launches and supervises one bot process per group of
+# shards. The processes share the SQLite database. The first one runs the platform pollers, which store every
+# notification in the outbox, and each process delivers the entries of the guilds on its own shards.
+
+DISCORD_API = "https://discord.com/api/v10"
+RESTART_DELAY = 5 # seconds before a cluster that exited is started again
+
+async def fetch_recommended_shard_count(token: str) -> int:
+	"""
+	The number of shards Discord recommends for the bot.
+	"""
+	async with aiohttp.ClientSession() as session:
+		async with session.get(f"{DISCORD_API}/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+			response.raise_for_status()
+			return (await response.json())["shards"]
+
+def split_shards(shard_count: int, cluster_count: int) -> list:
+	"""
+	Splits the shard ids into contiguous groups of (nearly) equal size, one per cluster.
+	"""
+	size, extra = divmod(shard_count, cluster_count)
+	groups = []
+	start = 0
+	for cluster_id in range(cluster_count):
+		end = start + size + (1 if cluster_id < extra else 0)
+		groups.append(list(range(start, end)))
+		start = end
+	return groups
+
+async def supervise_cluster(cluster_id: int, shard_ids: list, shard_count: int, processes: dict, stopping: asyncio.Event) -> None:
+	"""
+	Runs one cluster process and starts it again whenever it exits, until the launcher is stopped.
+	"""
+	while not stopping.is_set():
+		process = await asyncio.create_subprocess_exec(
+			sys.executable, sys.argv[0], *sys.argv[1:],
+			"--cluster_id", str(cluster_id),
+			"--shard_ids", ",".join(str(shard_id) for shard_id in shard_ids),
+			"--shard_count", str(shard_count)
+		)
+		processes[cluster_id] = process
+		main.logger.info(f"Started shard cluster {cluster_id} (shards {shard_ids[0]}-{shard_ids[-1]}), pid {process.pid}\n")
+		return_code = await process.wait()
+		if stopping.is_set():
+			break
+		main.logger.warning(f"Shard cluster {cluster_id} exited with code {return_code}, restarting in {RESTART_DELAY} s...\n")
+		try:
+			await asyncio.wait_for(stopping.wait(), RESTART_DELAY)
+		except asyncio.TimeoutError:
+			pass
+
+async def run_clusters(cluster_count: int, shard_count: int) -> None:
+	"""
+	Launches the shard clusters and waits for a shutdown signal, which is passed on to every cluster.
+	"""
+	if shard_count <= 0:
+		shard_count = await fetch_recommended_shard_count(main.DISCORD_BOT_TOKEN)
+	cluster_count = min(cluster_count, shard_count)
+	main.logger.info(f"Running {shard_count} shards in {cluster_count} cluster processes...\n")
+
+	stopping = asyncio.Event()
+	processes = {}
+
+	def handle_signal():
+		main.logger.info("Received shutdown signal, stopping the shard clusters...")
+		stopping.set()
+
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		signal.signal(sig, lambda s, f: handle_signal())
+
+	supervisors = [
+		asyncio.create_task(supervise_cluster(cluster_id, shard_ids, shard_count, processes, stopping))
+		for cluster_id, shard_ids in enumerate(split_shards(shard_count, cluster_count))
+	]
+	await stopping.wait()
+
+	for process in processes.values():
+		if process.returncode is None:
+			process.terminate()
+	await asyncio.gather(*supervisors, return_exceptions=True)
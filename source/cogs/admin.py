@@ -5,6 +5,7 @@ from discord import app_commands
 import main
 import sql
 import bot
+import metrics
 
 class Admin(commands.Cog):
 	def __init__(self, _bot):
@@ -49,6 +50,47 @@ class Admin(commands.Cog):
 			await interaction.response.send_message(f"❌ Printing SQL contents failed: {e}",
 				ephemeral=True)
 
+	@app_commands.command(name="print_metrics", description="[dev only]")
+	@app_commands.default_permissions(administrator=True)		# Hides command from users without this permission
+	@app_commands.checks.has_permissions(administrator=True)	# Checks if the user has the manage_guild permission
+	async def print_metrics(self, interaction: discord.Interaction):
+		"""
+		Allowed to be called only by the server owner in the home/dev server. That means you!
+		"""
+		if interaction.user.id != interaction.guild.owner_id or interaction.guild.id != main.HOME_SERVER_ID:
+			await interaction.response.send_message("You do not have permission to perform this action.",
+				ephemeral=True)
+			return
+		try:
+			await interaction.response.send_message("✅ Printing metrics to home channel...\n",
+				ephemeral=True)
+			await bot.bot_internal_message(f"{metrics.report()}")
+
+		except Exception as e:
+			await interaction.response.send_message(f"❌ Printing metrics failed: {e}",
+				ephemeral=True)
+
+	@app_commands.command(name="retry_dead_notifications", description="[dev only]")
+	@app_commands.default_permissions(administrator=True)		# Hides command from users without this permission
+	@app_commands.checks.has_permissions(administrator=True)	# Checks if the user has the manage_guild permission
+	async def retry_dead_notifications(self, interaction: discord.Interaction):
+		"""
+		Gives dead-lettered outbox notifications a fresh set of delivery attempts.
+		Allowed to be called only by the server owner in the home/dev server. That means you!
+		"""
+		if interaction.user.id != interaction.guild.owner_id or interaction.guild.id != main.HOME_SERVER_ID:
+			await interaction.response.send_message("You do not have permission to perform this action.",
+				ephemeral=True)
+			return
+		try:
+			count = sql.retry_dead_outbox_entries()
+			await interaction.response.send_message(f"✅ Requeued {count} dead notifications, they'll be delivered on the next outbox pass.\n",
+				ephemeral=True)
+
+		except Exception as e:
+			await interaction.response.send_message(f"❌ Requeueing dead notifications failed: {e}",
+				ephemeral=True)
+
 	@app_commands.command(name="manage_subscriptions", description="List and remove Discord channel to social media channel subscriptions. (dev only)")
 	@app_commands.default_permissions(administrator=True)
 	@app_commands.checks.has_permissions(administrator=True)
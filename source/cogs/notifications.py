@@ -3,11 +3,12 @@ from discord.ext import commands
 from discord import app_commands
 from typing import Optional
 
-from atproto import Client
 from atproto import exceptions
 
 import main
 import sql
+import bot
+import blsky
 import youtube
 import twitch
 
@@ -15,8 +16,6 @@ class Notifications(commands.Cog):
 	def __init__(self, _bot):
 		self._bot = _bot
 
-	client = Client()
-
 	def text_channel_only():
 		def predicate(interaction: discord.Interaction) -> bool:
 			if not isinstance(interaction.channel, discord.TextChannel):
@@ -51,10 +50,9 @@ class Notifications(commands.Cog):
 				main.logger.info(f"[BOT.COMMAND] Bot does not have permission to send messages in {targetChannel.name}\n")
 			else:
 				try:
-					# Use the Atproto client to check if the Bluesky channel ID is valid
-					# basic resolve_handle() call shouldn't need login/auth
+					# Use the shared async Atproto client to check if the Bluesky channel ID is valid
 					try:
-						is_valid_channel = self.client.resolve_handle(bluesky_channel_id)
+						is_valid_channel = await blsky.resolve_bluesky_handle(bluesky_channel_id)
 						if is_valid_channel is None:
 							await interaction.response.send_message(f"Invalid Bluesky channel ID. Please try again.",
 								ephemeral=True)
@@ -65,7 +63,7 @@ class Notifications(commands.Cog):
 						return
 
 					# Check if this Discord channel is already in the SQL database.
-					sql.add_discord_channel(targetChannel.id, targetChannel.name)
+					sql.add_discord_channel(targetChannel.id, targetChannel.name, targetChannel.guild.id)
 
 					# Check if the given Bluesky channel already has stored ID in database and if its already linked.
 					internal_social_media_channel = sql.get_id_for_channel_url(bluesky_channel_id)
@@ -140,7 +138,7 @@ class Notifications(commands.Cog):
 						return
 
 					# Check if this Discord channel is already in the SQL database.
-					sql.add_discord_channel(targetChannel.id, targetChannel.name)
+					sql.add_discord_channel(targetChannel.id, targetChannel.name, targetChannel.guild.id)
 
 					# Check if the given Twitch channel already has stored ID in database and if its already linked.
 					internal_social_media_channel = sql.get_id_for_channel_url(twitch_channel_id)
@@ -214,7 +212,7 @@ class Notifications(commands.Cog):
 						return
 
 					# Check if this Discord channel is already in the SQL database.
-					sql.add_discord_channel(targetChannel.id, targetChannel.name)
+					sql.add_discord_channel(targetChannel.id, targetChannel.name, targetChannel.guild.id)
 
 					# Check if the given YT channel already has stored ID in database and if its already linked.
 					internal_social_media_channel = sql.get_id_for_channel_url(youtube_channel_id)
@@ -289,7 +287,7 @@ class Notifications(commands.Cog):
 						return
 
 					# Check if this Discord channel is already in the SQL database.
-					sql.add_discord_channel(targetChannel.id, targetChannel.name)
+					sql.add_discord_channel(targetChannel.id, targetChannel.name, targetChannel.guild.id)
 
 					# Check if the given YT channel already has stored ID in database and if its already linked.
 					internal_social_media_channel = sql.get_id_for_channel_url(youtube_channel_id, "YouTube_members")
@@ -504,6 +502,45 @@ class Notifications(commands.Cog):
 		except Exception as e:
 			main.logger.error(f"[BOT.COMMAND.ERROR] Error removing notification role: {e}\n")
 
+	@app_commands.command(name="set_delivery_mode", description="Choose whether notifications are sent right away or collected into a periodic digest.")
+	@app_commands.describe(mode="Instant: one message per notification. Digest: a summary every few minutes.",
+		interval_minutes="Digest only: minutes between digests. Defaults to 60.",
+		urgent_bypass="Digest only: send urgent notifications such as going live right away. Defaults to true.",
+		channel="Optional: The Discord text channel to configure. Defaults to current.")
+	@app_commands.choices(mode=[
+		app_commands.Choice(name="Instant", value="instant"),
+		app_commands.Choice(name="Digest", value="digest"),
+	])
+	@app_commands.default_permissions(manage_guild=True)	# Hides command from users without this permission
+	@app_commands.checks.has_permissions(manage_guild=True)	# Checks if the user has the manage_guild permission
+	@text_channel_only()
+	async def set_delivery_mode(self, interaction: discord.Interaction, mode: app_commands.Choice[str],
+		interval_minutes: app_commands.Range[int, 5, 1440]=None, urgent_bypass: bool=True, channel: discord.TextChannel=None):
+		try:
+			# if no given channel, defaults to the context
+			if channel is None:
+				targetChannel = interaction.channel
+			else:
+				targetChannel = channel
+
+			sql.add_discord_channel(targetChannel.id, targetChannel.name, targetChannel.guild.id)
+			if mode.value == "digest":
+				interval = interval_minutes or bot.DEFAULT_DIGEST_INTERVAL
+				sql.set_delivery_settings(targetChannel.id, "digest", interval, urgent_bypass)
+				message = f"Channel {targetChannel.name} now receives a digest every {interval} minutes"
+				message += ", urgent notifications are still sent right away." if urgent_bypass else "."
+			else:
+				sql.set_delivery_settings(targetChannel.id, "instant")
+				message = f"Channel {targetChannel.name} now receives every notification right away."
+			# pending digest entries are delivered now so nothing waits on the old schedule
+			bot.forget_delivery_settings(targetChannel.id)
+
+			await interaction.response.send_message(message, ephemeral=True)
+			main.logger.info(f"[BOT.COMMAND] Delivery mode of {targetChannel.name} set to {mode.value}...\n")
+
+		except Exception as e:
+			main.logger.error(f"[BOT.COMMAND.ERROR] Error setting delivery mode: {e}\n")
+
 #
 #	SETUP
 #
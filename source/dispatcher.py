@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+
+import main
+
+LATENCY_SAMPLES = 1000 # recent deliveries kept per guild for the latency percentiles
+REPORTED_GUILDS = 10 # guilds listed individually in the metrics report
+
+def percentile(samples: list, fraction: float) -> float:
+	"""
+	Nearest-rank percentile of a sorted list.
+	"""
+	return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+class NotificationDispatcher:
+	"""
+	Delivers notifications in the background so the pollers never wait on Discord.
+	Every Discord channel has its own bounded FIFO queue, a pool of workers drains the queues concurrently.
+	A channel is held by one worker at a time, so its notifications are always sent in order.
+	A channel becomes ready coalesce_window seconds after its first queued notification, and the worker takes
+	everything queued by then as one batch, so bursts can be merged into fewer messages.
+
+	Ready channels are scheduled with weighted fair queuing across their guilds: each guild carries a virtual finish
+	time that grows by the number of notifications it had sent, and the guild furthest behind goes next. Within a guild
+	the ready channels take turns. A guild with hundreds of subscribed channels therefore gets the same share of
+	the send path as a guild with one, instead of making everyone else wait behind its burst.
+	"""
+	def __init__(self, send, workers: int = 8, max_queue: int = 100, coalesce_window: float = 0, max_batch: int = 50, group=None):
+		self.send = send # async callable(channel_id, notifications)
+		self.group = group or (lambda channel_id: channel_id) # callable(channel_id) -> guild the channel belongs to
+		self.worker_count = workers
+		self.max_queue = max_queue
+		self.coalesce_window = coalesce_window
+		self.max_batch = max_batch
+		self.queues = {} # channel id -> deque of (enqueued_at, notification)
+		self.ready_channels = {} # guild -> deque of its ready channels that no worker holds
+		self.schedule = [] # heap of (virtual start time, sequence, guild) for guilds with ready channels
+		self.finish_times = {} # guild -> virtual time at which its last batch finished
+		self.virtual_time = 0.0
+		self.sequence = 0
+		self.wakeup = asyncio.Event()
+		self.workers = []
+		self.pending = 0
+		self.idle = asyncio.Event()
+		self.idle.set()
+		# backpressure statistics
+		self.sent = 0
+		self.dropped = 0
+		self.peak_depth = 0
+		self.total_wait = 0.0
+		self.max_wait = 0.0
+		self.latencies = {} # guild -> deque of recent enqueue-to-delivered seconds
+
+	def start(self, workers: int | None = None, max_queue: int | None = None, coalesce_window: float | None = None) -> None:
+		"""
+		Starts the worker pool, replacing workers that have died. Sizes can be (re)configured here.
+		"""
+		if workers is not None:
+			self.worker_count = workers
+		if max_queue is not None:
+			self.max_queue = max_queue
+		if coalesce_window is not None:
+			self.coalesce_window = coalesce_window
+		self.workers = [worker for worker in self.workers if not worker.done()]
+		while len(self.workers) < self.worker_count:
+			self.workers.append(asyncio.create_task(self._worker()))
+
+	def enqueue(self, channel_id, notification) -> bool:
+		"""
+		Queues a notification for a Discord channel and returns immediately.
+		Returns False if the channel's queue is full and the notification was dropped.
+		"""
+		queue = self.queues.get(channel_id)
+		if queue is None:
+			queue = self.queues[channel_id] = deque()
+			if self.coalesce_window > 0:
+				asyncio.get_running_loop().call_later(self.coalesce_window, self._make_ready, channel_id)
+			else:
+				self._make_ready(channel_id)
+		if len(queue) >= self.max_queue:
+			self.dropped += 1
+			main.logger.warning(f"Notification queue of Discord channel {channel_id} is full, dropping a notification.\n")
+			return False
+		queue.append((time.monotonic(), notification))
+		self.pending += 1
+		self.peak_depth = max(self.peak_depth, len(queue))
+		self.idle.clear()
+		return True
+
+	def _make_ready(self, channel_id) -> None:
+		guild = self.group(channel_id)
+		channels = self.ready_channels.get(guild)
+		if channels is None:
+			channels = self.ready_channels[guild] = deque()
+			self._schedule_guild(guild)
+		channels.append(channel_id)
+
+	def _schedule_guild(self, guild) -> None:
+		# a guild that was idle starts at the current virtual time, it can't save up a share for later
+		start = max(self.finish_times.get(guild, 0.0), self.virtual_time)
+		self.sequence += 1
+		heapq.heappush(self.schedule, (start, self.sequence, guild))
+		self.wakeup.set()
+
+	async def _next_channel(self) -> tuple:
+		while not self.schedule:
+			self.wakeup.clear()
+			await self.wakeup.wait()
+		start, _, guild = heapq.heappop(self.schedule)
+		self.virtual_time = max(self.virtual_time, start)
+		channels = self.ready_channels[guild]
+		channel_id = channels.popleft()
+		return guild, start, channel_id
+
+	async def _worker(self) -> None:
+		while True:
+			guild, start, channel_id = await self._next_channel()
+			queue = self.queues[channel_id]
+			batch = []
+			enqueue_times = []
+			now = time.monotonic()
+			while queue and len(batch) < self.max_batch:
+				enqueued_at, notification = queue.popleft()
+				batch.append(notification)
+				enqueue_times.append(enqueued_at)
+				wait = now - enqueued_at
+				self.total_wait += wait
+				self.max_wait = max(self.max_wait, wait)
+
+			# the guild is charged for this batch before its other channels get their turn
+			self.finish_times[guild] = start + len(batch)
+			channels = self.ready_channels[guild]
+			if channels:
+				self._schedule_guild(guild)
+			else:
+				del self.ready_channels[guild]
+			try:
+				await self.send(channel_id, batch)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				main.logger.error(f"Error delivering notifications to Discord channel {channel_id}: {e}\n")
+			finally:
+				done = time.monotonic()
+				latencies = self.latencies.setdefault(guild, deque(maxlen=LATENCY_SAMPLES))
+				latencies.extend(done - enqueued_at for enqueued_at in enqueue_times)
+				self.sent += len(batch)
+				self.pending -= len(batch)
+				if queue:
+					self._make_ready(channel_id)
+				else:
+					del self.queues[channel_id]
+				self._forget_idle_guilds()
+				if self.pending == 0:
+					self.idle.set()
+
+	def _forget_idle_guilds(self) -> None:
+		# finish times at or behind the virtual time no longer affect the schedule
+		if len(self.finish_times) > 4 * max(len(self.ready_channels), 256):
+			self.finish_times = {guild: finish for guild, finish in self.finish_times.items() if finish > self.virtual_time}
+
+	async def drain(self, timeout: float = 30) -> None:
+		"""
+		Waits until every queued notification has been sent (or the timeout passes) and stops the workers.
+		"""
+		if self.pending and self.workers:
+			main.logger.info(f"Delivering {self.pending} queued notifications before shutting down...\n")
+			try:
+				await asyncio.wait_for(self.idle.wait(), timeout)
+			except asyncio.TimeoutError:
+				main.logger.warning(f"Gave up on {self.pending} queued notifications at shutdown.\n")
+		for worker in self.workers:
+			worker.cancel()
+		await asyncio.gather(*self.workers, return_exceptions=True)
+		self.workers = []
+
+	def latency_report(self, samples: list) -> str:
+		samples = sorted(samples)
+		return (
+			f"p50 {percentile(samples, 0.5):.2f} s, p95 {percentile(samples, 0.95):.2f} s, "
+			f"p99 {percentile(samples, 0.99):.2f} s ({len(samples)} samples)"
+		)
+
+	def snapshot(self) -> dict:
+		"""
+		Returns the queue and backpressure statistics for the metrics report,
+		with delivery latency percentiles overall and for the busiest guilds.
+		"""
+		values = {
+			"queued": self.pending,
+			"channels with queued notifications": len(self.queues),
+			"guilds waiting for a worker": len(self.ready_channels),
+			"deepest channel queue": max((len(queue) for queue in self.queues.values()), default=0),
+			"peak channel queue": f"{self.peak_depth}/{self.max_queue}",
+			"sent": self.sent,
+			"dropped (queue full)": self.dropped,
+			"average queue wait": f"{self.total_wait / self.sent:.2f} s" if self.sent else "-",
+			"max queue wait": f"{self.max_wait:.2f} s",
+			"workers": f"{sum(not worker.done() for worker in self.workers)}/{self.worker_count}",
+		}
+		all_samples = [latency for latencies in self.latencies.values() for latency in latencies]
+		if all_samples:
+			values["delivery latency, all guilds"] = self.latency_report(all_samples)
+		busiest = sorted(self.latencies.items(), key=lambda item: len(item[1]), reverse=True)[:REPORTED_GUILDS]
+		for guild, latencies in busiest:
+			values[f"delivery latency, guild {guild}"] = self.latency_report(list(latencies))
+		return values
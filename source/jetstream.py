@@ -0,0 +1,72 @@
+import json
+from urllib.parse import urlencode
+
+# Helpers for Bluesky Jetstream, a JSON websocket feed of repository commits.
+# https://github.com/bluesky-social/jetstream
+# Kept free of bot imports so the local stand-in server can reuse them.
+
+WANTED_COLLECTIONS = ("app.bsky.feed.post", "app.bsky.feed.repost")
+
+CURSOR_REWIND_US = 5 * 1000 * 1000	# replay a few seconds on resume so nothing falls between the last cursor save and a disconnect
+
+def build_jetstream_url(base_url: str, cursor: int | None = None) -> str:
+	"""
+	Builds the subscribe URL. The DID filter is sent separately with build_options_update(),
+	so the URL doesn't grow with the number of subscriptions.
+	"""
+	params = [("wantedCollections", collection) for collection in WANTED_COLLECTIONS]
+	params.append(("requireHello", "true"))
+	if cursor:
+		params.append(("cursor", str(max(int(cursor) - CURSOR_REWIND_US, 0))))
+	return f"{base_url}?{urlencode(params)}"
+
+def build_options_update(dids) -> str:
+	"""
+	Returns the subscriber message that (re)sets the DID filter of an open connection.
+	Jetstream reads an empty DID list as "every repository", so an empty filter is refused rather than sent.
+	"""
+	if not dids:
+		raise ValueError("no DIDs to follow, an empty filter would subscribe to the whole network")
+	return json.dumps({
+		"type": "options_update",
+		"payload": {
+			"wantedCollections": list(WANTED_COLLECTIONS),
+			"wantedDids": sorted(dids),
+		}
+	})
+
+def decode_jetstream_event(message: dict) -> dict | None:
+	"""
+	Decodes a parsed Jetstream message into a post/repost event.
+	Returns None for anything that isn't a newly created post or repost.
+	"""
+	if message.get("kind") != "commit":
+		return None
+	commit = message.get("commit") or {}
+	collection = commit.get("collection")
+	if commit.get("operation") != "create" or collection not in WANTED_COLLECTIONS:
+		return None
+
+	did = message.get("did")
+	record = commit.get("record") or {}
+	event = {
+		"did": did,
+		"collection": collection,
+		"uri": f"at://{did}/{collection}/{commit.get('rkey')}",
+		"time_us": message.get("time_us"),
+		"subject_uri": None,
+	}
+	if collection == "app.bsky.feed.repost":
+		event["subject_uri"] = (record.get("subject") or {}).get("uri")
+	return event
+
+def decode_identity_event(message: dict) -> dict | None:
+	"""
+	Decodes an identity message, sent when an account changes its handle.
+	"""
+	if message.get("kind") != "identity":
+		return None
+	identity = message.get("identity") or {}
+	if not identity.get("did") or not identity.get("handle"):
+		return None
+	return {"did": identity["did"], "handle": identity["handle"]}
@@ -10,6 +10,9 @@ import blsky
 import sql
 import youtube
 import twitch
+import cluster
+import workers
+from scheduler import poll_scheduler
 
 load_dotenv()
 
@@ -20,18 +23,40 @@ DISCORD_BOT_TOKEN		= os.getenv("DISCORD_BOT_TOKEN")
 YOUTUBE_API_KEY			= os.getenv("YOUTUBE_API_KEY")
 BLUESKY_USERNAME		= os.getenv("BLUESKY_USERNAME")
 BLUESKY_PASSWORD		= os.getenv("BLUESKY_PASSWORD")
+BLUESKY_JETSTREAM_URL	= os.getenv("BLUESKY_JETSTREAM_URL")	# optional, enables push ingestion of Bluesky posts
 TWITCH_CLIENT_ID		= os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET	= os.getenv("TWITCH_CLIENT_SECRET")
 
 HOME_SERVER_ID			= int(os.getenv("HOME_SERVER_ID"))
 HOME_CHANNEL_ID			= int(os.getenv("HOME_CHANNEL_ID"))
 
+# Tuning
+BLUESKY_FETCH_CONCURRENCY	= int(os.getenv("BLUESKY_FETCH_CONCURRENCY", "8"))	# max concurrent Bluesky feed requests
+NOTIFICATION_DELIVERY		= os.getenv("NOTIFICATION_DELIVERY", "bot").lower()	# "bot" or "webhook", how notifications are posted
+NOTIFICATION_WORKERS		= int(os.getenv("NOTIFICATION_WORKERS", "8"))		# concurrent Discord deliveries
+NOTIFICATION_QUEUE_SIZE		= int(os.getenv("NOTIFICATION_QUEUE_SIZE", "100"))	# max queued notifications per Discord channel
+NOTIFICATION_COALESCE_WINDOW	= float(os.getenv("NOTIFICATION_COALESCE_WINDOW", "2"))	# seconds to gather notifications for one channel into fewer messages
+BLUESKY_LIST_FEED			= os.getenv("BLUESKY_LIST_FEED", "false").lower() in ("1", "true", "yes")	# poll all Bluesky subscriptions through one list feed
+DISCORD_MEMORY_PROFILE		= os.getenv("DISCORD_MEMORY_PROFILE", "default").lower()	# "default" or "lean", gateway intents and client caches
+DISCORD_SHARDING			= os.getenv("DISCORD_SHARDING", "off").lower()		# "off" or "auto", shard the gateway connection in this process
+DISCORD_CLUSTERS			= int(os.getenv("DISCORD_CLUSTERS", "1"))		# run the shards in this many processes
+DISCORD_SHARD_COUNT			= int(os.getenv("DISCORD_SHARD_COUNT", "0"))		# total shards for the clusters, 0 asks Discord
+POLLER_PROCESSES			= os.getenv("POLLER_PROCESSES", "false").lower() in ("1", "true", "yes")	# poll each platform in a process of its own
+
 # Command-line argument parsing
 parser = argparse.ArgumentParser(description="Social media subscription Bot")
 parser.add_argument("--silent_start", action="store_true", help="Start the bot without notifying about unlogged content with timestamps older than the current time.")
+parser.add_argument("--measure_gateway", type=int, default=0, metavar="SECONDS", help="Log memory use, cache sizes and gateway events per second every SECONDS seconds.")
+# set by the cluster launcher for each shard cluster process, see cluster.py
+parser.add_argument("--cluster_id", type=int, default=None, help=argparse.SUPPRESS)
+parser.add_argument("--shard_ids", type=str, default=None, help=argparse.SUPPRESS)
+parser.add_argument("--shard_count", type=int, default=None, help=argparse.SUPPRESS)
 args = parser.parse_args()
 
 SILENT_START = args.silent_start # defaults to False
+CLUSTER_ID = args.cluster_id # None unless this process is a shard cluster
+SHARD_IDS = [int(shard_id) for shard_id in args.shard_ids.split(",")] if args.shard_ids else None
+SHARD_COUNT = args.shard_count
 
 # Setup logging for the main process
 logging.basicConfig(level=logging.INFO)  # Change this to WARNING for production!
@@ -54,16 +79,36 @@ async def main():
 		logger.error(f"Error initializing content subscription database: {e}")
 		return
 
+	# In cluster mode this process only supervises the shard cluster processes
+	if DISCORD_CLUSTERS > 1 and CLUSTER_ID is None:
+		await cluster.run_clusters(DISCORD_CLUSTERS, DISCORD_SHARD_COUNT)
+		return
+
 	# Silent start startup task
 	global startup
-	startup = bot.StartupSilencer(task_count=4, silent=SILENT_START)
+	startup = bot.StartupSilencer(task_count=poll_scheduler.first_run_count(bot.scheduled_groups()), silent=SILENT_START)
 	# Make startup available to all modules
 	setattr(__import__("main"), "startup", startup)
 
-	# initialize APIs
-	await blsky.initialize_bluesky_client()
+	# initialize APIs. Only the process that polls Bluesky logs in, a second login would rotate the session it shares
+	# with the others (shard clusters, or the gateway next to the poller processes), their slash commands use the
+	# public AppView instead. Likewise only the Twitch poller keeps the app token fresh.
+	if bot.polls_in_event_loop():
+		await blsky.initialize_bluesky_client()
 	await youtube.initialize_youtube_client()
-	await twitch.initialize_twitch_session()
+	await twitch.initialize_twitch_session(maintain_token=bot.polls_in_event_loop())
+
+	if args.measure_gateway > 0:
+		asyncio.create_task(bot.measure_gateway(args.measure_gateway))
+
+	if CLUSTER_ID is not None:
+		asyncio.create_task(bot.publish_cluster_status())
+
+	# The platform pollers run as tasks of the bot, or in poller processes of their own
+	poller_supervisor = None
+	if POLLER_PROCESSES and bot.runs_pollers():
+		poller_supervisor = workers.PollerSupervisor()
+		poller_supervisor.start()
 
 	asyncio.create_task(bot.bot.start(DISCORD_BOT_TOKEN))
 
@@ -83,6 +128,8 @@ async def main():
 	await shutdown_event.wait()
 
 	# Shutdown tasks
+	if poller_supervisor is not None:
+		await poller_supervisor.stop()
 	await bot.on_shutdown()
 
 def main_entry():
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+# Lightweight in-process metrics, printed to the home channel with the /print_metrics admin command.
+# Counters are bumped where things happen, sources are callbacks polled when the report is built.
+
+started_at = time.time()
+counters = {} # name -> count
+sources = {} # section title -> callable returning a dict of name -> value
+
+def increment(name: str, amount: int = 1) -> None:
+	counters[name] = counters.get(name, 0) + amount
+
+def register_source(title: str, callback) -> None:
+	"""
+	Adds a report section whose values are read from callback() every time a report is built.
+	"""
+	sources[title] = callback
+
+def rss_bytes() -> int | None:
+	"""
+	Current resident set size of the process, read from /proc on Linux. Elsewhere the peak RSS is the best available.
+	"""
+	try:
+		with open("/proc/self/statm") as statm:
+			return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		pass
+	try:
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == "darwin" else peak * 1024
+
+def report() -> str:
+	lines = [f"Uptime: {int(time.time() - started_at)} s"]
+	if counters:
+		lines.append("\nCounters:")
+		for name in sorted(counters):
+			lines.append(f"  {name}: {counters[name]}")
+	for title, callback in sources.items():
+		lines.append(f"\n{title}:")
+		try:
+			values = callback()
+		except Exception as e:
+			lines.append(f"  unavailable: {e}")
+			continue
+		if not values:
+			lines.append("  (none)")
+		for name, value in values.items():
+			lines.append(f"  {name}: {value}")
+	return "\n".join(lines)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+class RateLimitBudget:
+	"""
+	Tracks per-endpoint API budgets from the "ratelimit-limit/remaining/reset" response headers and paces requests to fit them.
+	Requests run freely while more than pace_below of a budget is left. Below that they are spread evenly over the time
+	left until the reset, and an exhausted budget or a 429 response holds the endpoint until the reset.
+	"""
+	def __init__(self, pace_below: float = 0.5, default_retry_after: float = 60):
+		self.pace_below = pace_below
+		self.default_retry_after = default_retry_after
+		self.budgets = {} # endpoint -> {"limit", "remaining", "reset" (unix time), "next_at"}
+		self.throttled = {} # endpoint -> number of 429 responses
+		self.paced_seconds = 0.0
+
+	async def acquire(self, endpoint: str) -> None:
+		"""
+		Waits until the endpoint's budget allows another request and reserves it.
+		Endpoints without a known budget, or whose window has already reset, are not held back.
+		"""
+		budget = self.budgets.get(endpoint)
+		while budget is not None:
+			now = time.time()
+			if now >= budget["reset"]:
+				# new window, the next response brings the fresh numbers
+				return
+			if budget["remaining"] <= 0:
+				delay = budget["reset"] - now
+			elif budget["remaining"] < budget["limit"] * self.pace_below:
+				delay = budget["next_at"] - now
+				if delay <= 0:
+					budget["next_at"] = now + (budget["reset"] - now) / budget["remaining"]
+					budget["remaining"] -= 1
+					return
+			else:
+				budget["remaining"] -= 1
+				return
+			self.paced_seconds += delay
+			await asyncio.sleep(delay)
+
+	def update(self, endpoint: str, status_code: int, headers: dict) -> bool:
+		"""
+		Updates the endpoint's budget from a response. Returns True if the response was a 429 (throttled).
+		"""
+		headers = {key.lower(): value for key, value in (headers or {}).items()}
+		throttled = status_code == 429
+		if throttled:
+			self.throttled[endpoint] = self.throttled.get(endpoint, 0) + 1
+
+		budget = self.budgets.get(endpoint)
+		try:
+			limit = int(headers["ratelimit-limit"])
+			remaining = int(headers["ratelimit-remaining"])
+			reset = float(headers["ratelimit-reset"])
+		except (KeyError, ValueError):
+			if not throttled:
+				return False
+			# throttled without budget headers, back off for Retry-After or a default period
+			try:
+				retry_after = float(headers.get("retry-after", self.default_retry_after))
+			except ValueError:
+				retry_after = self.default_retry_after
+			limit = budget["limit"] if budget else 1
+			remaining = 0
+			reset = time.time() + retry_after
+
+		if budget is None:
+			budget = self.budgets[endpoint] = {"next_at": 0.0}
+		budget["limit"] = max(limit, 1)
+		budget["remaining"] = 0 if throttled else remaining
+		budget["reset"] = reset
+		return throttled
+
+	def snapshot(self) -> dict:
+		"""
+		Returns the current budgets as readable strings, for the metrics report.
+		"""
+		now = time.time()
+		values = {}
+		for endpoint, budget in sorted(self.budgets.items()):
+			if now >= budget["reset"]:
+				values[endpoint] = f"window reset, {self.throttled.get(endpoint, 0)} throttled"
+			else:
+				values[endpoint] = (
+					f"{max(budget['remaining'], 0)}/{budget['limit']} left, resets in {int(budget['reset'] - now)} s, "
+					f"{self.throttled.get(endpoint, 0)} throttled"
+				)
+		values["time spent pacing"] = f"{self.paced_seconds:.1f} s"
+		return values
+
+class TokenBucket:
+	"""
+	Paces requests to an average of rate per second, letting short bursts of up to burst requests through at once.
+	"""
+	def __init__(self, rate: float, burst: int):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = float(burst)
+		self.updated_at = time.monotonic()
+		self.requests = 0
+		self.paced_seconds = 0.0
+
+	async def acquire(self) -> None:
+		"""
+		Waits until a request fits the rate and takes its token.
+		"""
+		while True:
+			now = time.monotonic()
+			self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+			self.updated_at = now
+			if self.tokens >= 1:
+				self.tokens -= 1
+				self.requests += 1
+				return
+			delay = (1 - self.tokens) / self.rate
+			self.paced_seconds += delay
+			await asyncio.sleep(delay)
+
+	def snapshot(self) -> dict:
+		return {
+			"limit": f"{self.rate:g} requests/s, bursts of {self.burst}",
+			"requests": self.requests,
+			"time spent pacing": f"{self.paced_seconds:.1f} s",
+		}
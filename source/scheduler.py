@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import main
+import metrics
+
+# Every periodic job of the bot (platform polls, outbox delivery) is registered here once, with its own interval,
+# jitter, concurrency limit and optional API budget. A single task pops the jobs off a timer heap when they are due
+# and runs them, so starting and stopping all of them on connect, disconnect and shutdown happens in one place.
+
+RETRY_DELAY = 60 # seconds before a job whose interval or cost couldn't be worked out is tried again
+
+class PollBudget:
+	"""
+	A number of API cost units that may be spent per rolling window, shared by the jobs that draw from it
+	(e.g. the daily YouTube quota). A run that doesn't fit is postponed until enough of the window has passed.
+	"""
+	def __init__(self, name: str, capacity: float, window: float):
+		self.name = name
+		self.capacity = capacity
+		self.window = window
+		self.spent = deque() # (monotonic time, cost) of the runs in the current window
+
+	def used(self, now: float) -> float:
+		while self.spent and self.spent[0][0] <= now - self.window:
+			self.spent.popleft()
+		return sum(cost for _, cost in self.spent)
+
+	def available_at(self, cost: float, now: float) -> float:
+		"""
+		The earliest time a run costing cost fits the budget.
+		"""
+		used = self.used(now)
+		if used + cost <= self.capacity or not self.spent:
+			return now
+		for spent_at, spent_cost in self.spent:
+			used -= spent_cost
+			if used + cost <= self.capacity:
+				return spent_at + self.window
+		return self.spent[-1][0] + self.window
+
+	def spend(self, cost: float, now: float) -> None:
+		self.spent.append((now, cost))
+
+@dataclass(eq=False)
+class PollJob:
+	name: str
+	poll: object # async callable doing one poll cycle
+	interval: object # seconds between the starts of two runs, or a callable returning them (asked before every run)
+	group: str = "default" # jobs are started by group, e.g. only one platform in a poller process
+	jitter: float = 0.1 # the interval varies randomly by up to this fraction, so jobs don't stay in lockstep
+	max_concurrency: int = 1 # runs that may be in progress at once, a due run waits for one to finish
+	budget: PollBudget | None = None
+	cost: object = 1 # budget units a run spends, or a callable returning them
+	reports_first_run: bool = False # tells the startup silencer when the first run has finished
+	enabled: object = None # callable deciding on start whether the job runs at all
+	# state
+	next_run_at: float | None = None
+	overdue: bool = False
+	first_run_done: bool = False
+	runs_in_progress: set = field(default_factory=set)
+	runs: int = 0
+	failures: int = 0
+	deferred: int = 0
+	last_duration: float | None = None
+	last_interval: float | None = None
+
+class PollScheduler:
+	"""
+	Runs the registered jobs off a timer heap of (due time, sequence, job).
+	A job first runs as soon as its group is started and is then due interval seconds after each run started.
+	A job still running when it's due again runs as soon as it finishes, unless max_concurrency lets runs overlap.
+	"""
+	def __init__(self):
+		self.jobs = {} # name -> PollJob
+		self.timers = []
+		self.sequence = 0
+		self.active_groups = set()
+		self.task = None
+		self.wakeup = None
+
+	def register(self, name: str, poll, interval, **options) -> PollJob:
+		"""
+		Adds a job, see PollJob for the options. A job of an already started group starts right away.
+		"""
+		job = PollJob(name, poll, interval, **options)
+		self.jobs[name] = job
+		if job.group in self.active_groups and self._enabled(job):
+			self._schedule(job, time.monotonic())
+		return job
+
+	def first_run_count(self, groups=None) -> int:
+		"""
+		The number of jobs in the given groups (all by default) that report their first run to the startup silencer.
+		"""
+		return sum(job.reports_first_run for job in self.jobs.values() if groups is None or job.group in groups)
+
+	def start(self, groups=None) -> None:
+		"""
+		Starts the jobs of the given groups (all by default) that aren't running yet.
+		"""
+		if self.task is None or self.task.done():
+			self.wakeup = asyncio.Event()
+			self.task = asyncio.create_task(self._run())
+		groups = set(groups) if groups is not None else {job.group for job in self.jobs.values()}
+		new_groups = groups - self.active_groups
+		self.active_groups |= new_groups
+		now = time.monotonic()
+		for job in self.jobs.values():
+			if job.group in new_groups and self._enabled(job):
+				self._schedule(job, now)
+
+	async def stop(self) -> None:
+		"""
+		Cancels every job, including the runs in progress. The jobs start from scratch on the next start().
+		"""
+		self.active_groups = set()
+		self.timers = []
+		tasks = [run for job in self.jobs.values() for run in job.runs_in_progress]
+		if self.task is not None:
+			tasks.append(self.task)
+		for task in tasks:
+			task.cancel()
+		await asyncio.gather(*tasks, return_exceptions=True)
+		self.task = None
+		for job in self.jobs.values():
+			job.next_run_at = None
+			job.overdue = False
+		main.logger.info("Stopped the scheduled jobs.\n")
+
+	def _enabled(self, job: PollJob) -> bool:
+		return job.enabled is None or job.enabled()
+
+	def _schedule(self, job: PollJob, due: float) -> None:
+		# an earlier timer of the job is left in the heap and skipped when popped
+		job.next_run_at = due
+		self.sequence += 1
+		heapq.heappush(self.timers, (due, self.sequence, job))
+		if self.wakeup is not None:
+			self.wakeup.set()
+
+	def _interval(self, job: PollJob) -> float:
+		interval = job.interval() if callable(job.interval) else job.interval
+		job.last_interval = interval
+		return interval * (1 + random.uniform(-job.jitter, job.jitter))
+
+	async def _run(self) -> None:
+		while True:
+			self.wakeup.clear()
+			if not self.timers:
+				await self.wakeup.wait()
+				continue
+			due, _, job = self.timers[0]
+			delay = due - time.monotonic()
+			if delay > 0:
+				try:
+					await asyncio.wait_for(self.wakeup.wait(), delay)
+				except asyncio.TimeoutError:
+					pass
+				continue
+			heapq.heappop(self.timers)
+			if job.next_run_at != due or job.group not in self.active_groups:
+				continue
+			try:
+				self._dispatch(job)
+			except Exception as e:
+				main.logger.error(f"Error scheduling {job.name}: {e}\n")
+				self._schedule(job, time.monotonic() + RETRY_DELAY)
+
+	def _dispatch(self, job: PollJob) -> None:
+		now = time.monotonic()
+		if len(job.runs_in_progress) >= job.max_concurrency:
+			job.overdue = True
+			job.deferred += 1
+			return
+		if job.budget is not None:
+			cost = job.cost() if callable(job.cost) else job.cost
+			available_at = job.budget.available_at(cost, now)
+			if available_at > now:
+				job.deferred += 1
+				main.logger.warning(f"{job.budget.name} is used up, postponing {job.name} by {available_at - now:.0f} s.\n")
+				self._schedule(job, available_at)
+				return
+			job.budget.spend(cost, now)
+		run = asyncio.create_task(self._run_job(job))
+		job.runs_in_progress.add(run)
+		self._schedule(job, now + self._interval(job))
+
+	async def _run_job(self, job: PollJob) -> None:
+		started = time.monotonic()
+		try:
+			await job.poll()
+			job.runs += 1
+			# First run silent start handling: the job has skipped notifying about what it found, let the silencer know
+			if job.reports_first_run and not job.first_run_done:
+				job.first_run_done = True
+				if hasattr(main, "startup") and main.startup.silent:
+					await main.startup.task_finished_first_run()
+				main.logger.info(f"Finished first run of {job.name}.\n")
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			job.runs += 1
+			job.failures += 1
+			main.logger.error(f"Error inside {job.name} job: {e}\n")
+		finally:
+			job.last_duration = time.monotonic() - started
+			job.runs_in_progress.discard(asyncio.current_task())
+			if job.overdue and job.group in self.active_groups:
+				job.overdue = False
+				self._schedule(job, time.monotonic())
+
+	def snapshot(self) -> dict:
+		"""
+		Returns the state of every job and budget for the metrics report.
+		"""
+		now = time.monotonic()
+		values = {}
+		budgets = {}
+		for job in self.jobs.values():
+			if job.next_run_at is None and not job.runs_in_progress:
+				state = "stopped"
+			elif job.runs_in_progress:
+				state = f"running ({len(job.runs_in_progress)}/{job.max_concurrency})"
+			else:
+				state = f"next run in {max(int(job.next_run_at - now), 0)} s"
+			interval = f"every {job.last_interval:g} s, " if job.last_interval is not None else ""
+			last = f", last took {job.last_duration:.1f} s" if job.last_duration is not None else ""
+			values[job.name] = f"{state}, {interval}{job.runs} runs, {job.failures} failed, {job.deferred} deferred{last}"
+			if job.budget is not None:
+				budgets[job.budget.name] = job.budget
+		for name, budget in budgets.items():
+			values[name] = f"{budget.used(now):g}/{budget.capacity:g} used in the last {int(budget.window)} s"
+		return values
+
+poll_scheduler = PollScheduler()
+metrics.register_source("Scheduled jobs", poll_scheduler.snapshot)
@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import time
 import pandas as pd
 from datetime import datetime, timezone
 
@@ -32,13 +33,22 @@ def read_table_contents():
 	pd.set_option('display.max_colwidth', 25)
 
 	result_str = "Active Discord Channels:\n"
-	result_str += (f"{pd.read_sql_query('SELECT * FROM DiscordChannels', conn)}\n")
+	# webhook URLs contain their token, only show whether one exists
+	result_str += (f"{pd.read_sql_query('SELECT channel_id, channel_name, guild_id, notification_role, webhook_url IS NOT NULL AS webhook, delivery_mode, digest_interval, digest_urgent_bypass FROM DiscordChannels', conn)}\n")
 	result_str += "\nFollowed Social Media Channels:\n"
 	result_str += (f"{pd.read_sql_query('SELECT * FROM SocialMediaChannels', conn)}\n")
 	result_str += "\nSubscriptions:\n"
 	result_str += (f"{pd.read_sql_query('SELECT * FROM Subscriptions', conn)}\n")
 	result_str += "\nPosts:\n"
 	result_str += (f"{pd.read_sql_query('SELECT * FROM Posts', conn)}\n")
+	result_str += "\nBluesky High-Water Marks:\n"
+	result_str += (f"{pd.read_sql_query('SELECT * FROM BlueskyHighWaterMarks', conn)}\n")
+	result_str += "\nBluesky List Items:\n"
+	result_str += (f"{pd.read_sql_query('SELECT * FROM BlueskyListItems', conn)}\n")
+	result_str += "\nTwitch Stream States:\n"
+	result_str += (f"{pd.read_sql_query('SELECT * FROM TwitchStreamStates', conn)}\n")
+	result_str += "\nNotification Outbox:\n"
+	result_str += (f"{pd.read_sql_query('SELECT id, discord_channel_id, status, attempts, next_attempt_at, last_error, created_at, claimed_by FROM NotificationOutbox', conn)}\n")
 
 
 	conn.commit()
@@ -83,6 +93,9 @@ def init_db():
 		return
 	cursor = conn.cursor()
 
+	# WAL lets the shard cluster processes read while another one writes. The setting is stored in the database file.
+	cursor.execute("PRAGMA journal_mode=WAL")
+
 	# Table for Schema Versioning
 	cursor.execute('''
 		CREATE TABLE IF NOT EXISTS SchemaVersion (
@@ -95,7 +108,12 @@ def init_db():
 		CREATE TABLE IF NOT EXISTS DiscordChannels (
 			channel_id TEXT PRIMARY KEY,
 			channel_name TEXT,
-			notification_role TEXT
+			notification_role TEXT,
+			webhook_url TEXT,
+			delivery_mode TEXT NOT NULL DEFAULT 'instant',
+			digest_interval INTEGER,
+			digest_urgent_bypass INTEGER NOT NULL DEFAULT 1,
+			guild_id INTEGER
 		)
 	''')
 
@@ -153,6 +171,80 @@ def init_db():
 			ON Posts (social_media_channel_id, timestamp DESC);
 	''')
 
+	# Key-value table for small pieces of bot state that need to survive restarts (stream cursors etc.)
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS BotState (
+			key TEXT PRIMARY KEY,
+			value TEXT,
+			updated_at TEXT NOT NULL
+		)
+	''')
+
+	# Table for caching Bluesky DID <-> handle resolutions across restarts.
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS BlueskyIdentities (
+			did TEXT PRIMARY KEY,
+			handle TEXT NOT NULL,
+			updated_at TEXT NOT NULL
+		)
+	''')
+
+	# Table for the newest shared post and posting rate of each Bluesky channel.
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS BlueskyHighWaterMarks (
+			social_media_channel_id INTEGER PRIMARY KEY,
+			post_uri TEXT NOT NULL,
+			indexed_at TEXT,
+			post_rate REAL,
+			updated_at TEXT NOT NULL,
+			FOREIGN KEY (social_media_channel_id)
+				REFERENCES SocialMediaChannels(id)
+				ON DELETE CASCADE
+		)
+	''')
+
+	# Table for the members of the bot-owned Bluesky list used by the list feed mode, and their list item records.
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS BlueskyListItems (
+			did TEXT PRIMARY KEY,
+			listitem_uri TEXT NOT NULL,
+			updated_at TEXT NOT NULL
+		)
+	''')
+
+	# Table for checkpointing the live state of Twitch channels. Only written on offline/live transitions.
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS TwitchStreamStates (
+			social_media_channel_id INTEGER PRIMARY KEY,
+			state TEXT NOT NULL,
+			stream_id TEXT,
+			started_at TEXT,
+			updated_at TEXT NOT NULL,
+			FOREIGN KEY (social_media_channel_id)
+				REFERENCES SocialMediaChannels(id)
+				ON DELETE CASCADE
+		)
+	''')
+
+	# Transactional outbox of rendered notifications. Rows are written in the same transaction as the record that
+	# marks their activity as seen, and deleted once Discord accepted them. Failed sends are retried with backoff
+	# until they run out of attempts and stay behind as 'dead'.
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS NotificationOutbox (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			discord_channel_id TEXT NOT NULL,
+			payload TEXT NOT NULL,
+			status TEXT NOT NULL DEFAULT 'pending',
+			attempts INTEGER NOT NULL DEFAULT 0,
+			next_attempt_at REAL NOT NULL,
+			last_error TEXT,
+			created_at TEXT NOT NULL,
+			claimed_by TEXT,
+			claimed_until REAL
+		)
+	''')
+	cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON NotificationOutbox (status, next_attempt_at)')
+
 	conn.commit()
 	# Close the connection after setup
 	conn.close()
@@ -214,6 +306,24 @@ def apply_schema_migrations():
 		set_schema_version(1)
 		main.logger.info("Successfully applied schema migration to version 1 (LatestPosts → Posts)")
 
+	# Migration 1 -> 2: Add webhook_url column to DiscordChannels
+	if current_version < 2:
+		migrate_add_discord_webhooks()
+		set_schema_version(2)
+		main.logger.info("Successfully applied schema migration to version 2 (DiscordChannels.webhook_url)")
+
+	# Migration 2 -> 3: Add digest delivery settings to DiscordChannels
+	if current_version < 3:
+		migrate_add_digest_settings()
+		set_schema_version(3)
+		main.logger.info("Successfully applied schema migration to version 3 (DiscordChannels digest delivery)")
+
+	# Migration 3 -> 4: Add guild_id to DiscordChannels for routing notifications between shard clusters
+	if current_version < 4:
+		migrate_add_discord_channel_guilds()
+		set_schema_version(4)
+		main.logger.info("Successfully applied schema migration to version 4 (DiscordChannels.guild_id)")
+
 def migrate_latest_posts_to_posts():
 	"""
 	Migrate existing data from LatestPosts table to Posts table.
@@ -263,13 +373,73 @@ def migrate_latest_posts_to_posts():
 	finally:
 		conn.close()
 
+def migrate_add_discord_webhooks():
+	"""
+	Add the webhook_url column used by the webhook delivery backend to DiscordChannels.
+	Databases created after the column was added to the schema already have it.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute("PRAGMA table_info(DiscordChannels)")
+		if "webhook_url" not in [row['name'] for row in cursor.fetchall()]:
+			cursor.execute("ALTER TABLE DiscordChannels ADD COLUMN webhook_url TEXT")
+			conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error during schema migration: {e}")
+	finally:
+		conn.close()
+
+def migrate_add_digest_settings():
+	"""
+	Add the per-channel delivery mode columns (instant or periodic digest) to DiscordChannels.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute("PRAGMA table_info(DiscordChannels)")
+		columns = [row['name'] for row in cursor.fetchall()]
+		if "delivery_mode" not in columns:
+			cursor.execute("ALTER TABLE DiscordChannels ADD COLUMN delivery_mode TEXT NOT NULL DEFAULT 'instant'")
+		if "digest_interval" not in columns:
+			cursor.execute("ALTER TABLE DiscordChannels ADD COLUMN digest_interval INTEGER")
+		if "digest_urgent_bypass" not in columns:
+			cursor.execute("ALTER TABLE DiscordChannels ADD COLUMN digest_urgent_bypass INTEGER NOT NULL DEFAULT 1")
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error during schema migration: {e}")
+	finally:
+		conn.close()
+
+def migrate_add_discord_channel_guilds():
+	"""
+	Add the guild_id column to DiscordChannels. Existing channels get theirs filled in by the cluster that owns them.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute("PRAGMA table_info(DiscordChannels)")
+		if "guild_id" not in [row['name'] for row in cursor.fetchall()]:
+			cursor.execute("ALTER TABLE DiscordChannels ADD COLUMN guild_id INTEGER")
+			conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error during schema migration: {e}")
+	finally:
+		conn.close()
+
 #	------------------- TABLES HANDLING -----------------------------
 
 #
 #	Discord Channels management
 #
 
-def add_discord_channel(discord_channel_id, discord_channel_name):
+def add_discord_channel(discord_channel_id, discord_channel_name, guild_id=None):
 	"""
 	Add a new discord channel, returns an unique id.
 	"""
@@ -279,9 +449,11 @@ def add_discord_channel(discord_channel_id, discord_channel_name):
 	try:
 		cursor = conn.cursor()
 		cursor.execute('''
-			INSERT OR IGNORE INTO DiscordChannels (channel_id, channel_name)
-			VALUES (?, ?)
-		''', (discord_channel_id, discord_channel_name))
+			INSERT OR IGNORE INTO DiscordChannels (channel_id, channel_name, guild_id)
+			VALUES (?, ?, ?)
+		''', (discord_channel_id, discord_channel_name, guild_id))
+		if guild_id is not None:
+			cursor.execute('UPDATE DiscordChannels SET guild_id = ? WHERE channel_id = ? AND guild_id IS NULL', (guild_id, discord_channel_id))
 		conn.commit()
 	except sqlite3.Error as e:
 		main.logger.error(f"Error adding discord channel: {e}")
@@ -298,6 +470,7 @@ def remove_discord_channel(discord_channel_Id):
 	try:
 		cursor = conn.cursor()
 		cursor.execute('DELETE FROM DiscordChannels WHERE channel_id = ?', (discord_channel_Id,))
+		cursor.execute('DELETE FROM NotificationOutbox WHERE discord_channel_id = ?', (str(discord_channel_Id),))
 		conn.commit()
 	except sqlite3.Error as e:
 		main.logger.error(f"Error removing discord channel: {e}")
@@ -365,6 +538,125 @@ def get_notification_role(discord_channel_id):
 	finally:
 		conn.close()
 
+def get_discord_channels_without_guild():
+	"""
+	Returns the ids of the discord channels whose guild isn't known yet.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return []
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT channel_id FROM DiscordChannels WHERE guild_id IS NULL')
+		return [row['channel_id'] for row in cursor.fetchall()]
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting discord channels without guild: {e}")
+		return []
+	finally:
+		conn.close()
+
+def set_discord_channel_guilds(channel_guilds: dict):
+	"""
+	Stores the guild of each given discord channel, {channel id: guild id}.
+	"""
+	if not channel_guilds:
+		return
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.executemany('UPDATE DiscordChannels SET guild_id = ? WHERE channel_id = ?',
+			[(guild_id, str(channel_id)) for channel_id, guild_id in channel_guilds.items()])
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error setting discord channel guilds: {e}")
+	finally:
+		conn.close()
+
+def get_webhook_url(discord_channel_id):
+	"""
+	Get the stored delivery webhook URL of a discord channel.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return None
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			SELECT webhook_url FROM DiscordChannels
+			WHERE channel_id = ? AND webhook_url IS NOT NULL
+		''', (discord_channel_id,))
+		row = cursor.fetchone()
+		return row['webhook_url'] if row else None
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting webhook URL: {e}")
+		return None
+	finally:
+		conn.close()
+
+def set_webhook_url(discord_channel_id, webhook_url):
+	"""
+	Store (or clear with None) the delivery webhook URL of a discord channel.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			UPDATE DiscordChannels SET webhook_url = ?
+			WHERE channel_id = ?
+		''', (webhook_url, discord_channel_id))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error setting webhook URL: {e}")
+	finally:
+		conn.close()
+
+def get_delivery_settings(discord_channel_id):
+	"""
+	Get the delivery mode of a discord channel: {"mode": "instant"|"digest", "interval": minutes, "urgent_bypass": bool}.
+	"""
+	settings = {"mode": "instant", "interval": None, "urgent_bypass": True}
+	conn = get_connection()
+	if conn is None:
+		return settings
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			SELECT delivery_mode, digest_interval, digest_urgent_bypass FROM DiscordChannels
+			WHERE channel_id = ?
+		''', (discord_channel_id,))
+		row = cursor.fetchone()
+		if row:
+			settings = {"mode": row['delivery_mode'], "interval": row['digest_interval'], "urgent_bypass": bool(row['digest_urgent_bypass'])}
+		return settings
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting delivery settings: {e}")
+		return settings
+	finally:
+		conn.close()
+
+def set_delivery_settings(discord_channel_id, mode: str, interval: int = None, urgent_bypass: bool = True):
+	"""
+	Set the delivery mode of a discord channel. The digest interval is in minutes.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			UPDATE DiscordChannels SET delivery_mode = ?, digest_interval = ?, digest_urgent_bypass = ?
+			WHERE channel_id = ?
+		''', (mode, interval, int(urgent_bypass), discord_channel_id))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error setting delivery settings: {e}")
+	finally:
+		conn.close()
+
 #
 #	Social media channel management
 #
@@ -401,6 +693,8 @@ def remove_social_media_channel(social_media_channel_id):
 	try:
 		cursor = conn.cursor()
 		cursor.execute('DELETE FROM SocialMediaChannels WHERE id = ?', (social_media_channel_id,))
+		cursor.execute('DELETE FROM TwitchStreamStates WHERE social_media_channel_id = ?', (social_media_channel_id,))
+		cursor.execute('DELETE FROM BlueskyHighWaterMarks WHERE social_media_channel_id = ?', (social_media_channel_id,))
 		conn.commit()
 	except sqlite3.Error as e:
 		main.logger.error(f"Error removing social media channel: {e}")
@@ -427,6 +721,438 @@ def remove_latest_post(social_media_channel_id):
 	finally:
 		conn.close()
 
+#
+# Bot state management
+#
+
+def get_bot_state(key: str):
+	"""
+	Returns the stored value for the given bot state key, or None if it isn't set.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return None
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT value FROM BotState WHERE key = ?', (key,))
+		row = cursor.fetchone()
+		return row['value'] if row else None
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting bot state '{key}': {e}")
+		return None
+	finally:
+		conn.close()
+
+def set_bot_state(key: str, value):
+	"""
+	Stores a value for the given bot state key, replacing any previous value.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		updated_at = datetime.now(timezone.utc).isoformat()
+		cursor.execute('''
+			INSERT OR REPLACE INTO BotState (key, value, updated_at)
+			VALUES (?, ?, ?)
+		''', (key, None if value is None else str(value), updated_at))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error setting bot state '{key}': {e}")
+	finally:
+		conn.close()
+
+#
+# Bluesky identity management
+#
+
+def get_bluesky_identities():
+	"""
+	Returns the stored Bluesky identities as a dict mapping DID to handle.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return {}
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT did, handle FROM BlueskyIdentities')
+		return {row['did']: row['handle'] for row in cursor.fetchall()}
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting Bluesky identities: {e}")
+		return {}
+	finally:
+		conn.close()
+
+def save_bluesky_identity(did: str, handle: str):
+	"""
+	Stores the current handle of a Bluesky DID. Any other DID previously holding the handle is dropped.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		updated_at = datetime.now(timezone.utc).isoformat()
+		cursor.execute('DELETE FROM BlueskyIdentities WHERE handle = ? AND did != ?', (handle, did))
+		cursor.execute('''
+			INSERT OR REPLACE INTO BlueskyIdentities (did, handle, updated_at)
+			VALUES (?, ?, ?)
+		''', (did, handle, updated_at))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error saving Bluesky identity: {e}")
+	finally:
+		conn.close()
+
+#
+# Bluesky list feed management
+#
+
+def get_bluesky_list_items():
+	"""
+	Returns the members of the bot's Bluesky list as a dict mapping DID to the AT URI of its list item record.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return {}
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT did, listitem_uri FROM BlueskyListItems')
+		return {row['did']: row['listitem_uri'] for row in cursor.fetchall()}
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting Bluesky list items: {e}")
+		return {}
+	finally:
+		conn.close()
+
+def save_bluesky_list_item(did: str, listitem_uri: str):
+	"""
+	Stores a DID added to the bot's Bluesky list.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		updated_at = datetime.now(timezone.utc).isoformat()
+		cursor.execute('''
+			INSERT OR REPLACE INTO BlueskyListItems (did, listitem_uri, updated_at)
+			VALUES (?, ?, ?)
+		''', (did, listitem_uri, updated_at))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error saving Bluesky list item: {e}")
+	finally:
+		conn.close()
+
+def remove_bluesky_list_item(did: str):
+	"""
+	Forgets a DID removed from the bot's Bluesky list.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.execute('DELETE FROM BlueskyListItems WHERE did = ?', (did,))
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error removing Bluesky list item: {e}")
+	finally:
+		conn.close()
+
+#
+# Bluesky high-water mark management
+#
+
+def get_bluesky_high_water_marks():
+	"""
+	Returns the stored Bluesky high-water marks as a dict keyed by social media channel id.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return {}
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT social_media_channel_id, post_uri, indexed_at, post_rate FROM BlueskyHighWaterMarks')
+		return {
+			row['social_media_channel_id']: {
+				"post_uri": row['post_uri'],
+				"indexed_at": row['indexed_at'],
+				"post_rate": row['post_rate']
+			} for row in cursor.fetchall()
+		}
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting Bluesky high-water marks: {e}")
+		return {}
+	finally:
+		conn.close()
+
+def save_bluesky_high_water(social_media_channel_id: int, post_uri: str, indexed_at: str, post_rate: float, outbox: list = None):
+	"""
+	Store the newest shared post and the posting rate of a Bluesky channel,
+	together with the outbox entries of the posts' notifications (see add_outbox_entries).
+	Returns the ids of the outbox entries, or None if nothing was saved.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return None
+	try:
+		cursor = conn.cursor()
+		updated_at = datetime.now(timezone.utc).isoformat()
+		cursor.execute('''
+			INSERT OR REPLACE INTO BlueskyHighWaterMarks (social_media_channel_id, post_uri, indexed_at, post_rate, updated_at)
+			VALUES (?, ?, ?, ?, ?)
+		''', (social_media_channel_id, post_uri, indexed_at, post_rate, updated_at))
+		outbox_ids = add_outbox_entries(cursor, outbox)
+		conn.commit()
+		return outbox_ids
+	except sqlite3.Error as e:
+		main.logger.error(f"Error saving Bluesky high-water mark: {e}")
+		return None
+	finally:
+		conn.close()
+
+#
+# Twitch stream state management
+#
+
+def get_twitch_stream_states():
+	"""
+	Returns the checkpointed Twitch stream states as a dict keyed by social media channel id.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return {}
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			SELECT social_media_channel_id, state, stream_id, started_at FROM TwitchStreamStates
+		''')
+		rows = cursor.fetchall()
+		return {
+			row['social_media_channel_id']: {
+				"state": row['state'],
+				"stream_id": row['stream_id'],
+				"started_at": row['started_at']
+			} for row in rows
+		}
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting Twitch stream states: {e}")
+		return {}
+	finally:
+		conn.close()
+
+def save_twitch_stream_state(social_media_channel_id: int, state: str, stream_id: str = None, started_at: str = None, outbox: list = None):
+	"""
+	Checkpoint the live state of a Twitch channel after an offline/live transition,
+	together with the outbox entries of the transition's notification (see add_outbox_entries).
+	Returns the ids of the outbox entries, or None if nothing was saved.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return None
+	try:
+		cursor = conn.cursor()
+		updated_at = datetime.now(timezone.utc).isoformat()
+		cursor.execute('''
+			INSERT OR REPLACE INTO TwitchStreamStates (social_media_channel_id, state, stream_id, started_at, updated_at)
+			VALUES (?, ?, ?, ?, ?)
+		''', (social_media_channel_id, state, stream_id, started_at, updated_at))
+		outbox_ids = add_outbox_entries(cursor, outbox)
+		conn.commit()
+		return outbox_ids
+	except sqlite3.Error as e:
+		main.logger.error(f"Error saving Twitch stream state: {e}")
+		return None
+	finally:
+		conn.close()
+
+#
+# Notification outbox management
+#
+
+def add_outbox_entries(cursor, entries: list | None) -> list:
+	"""
+	Inserts (discord channel id, payload) outbox entries using the caller's cursor, so they are committed
+	in the same transaction as the caller's own writes. The entries are due for delivery right away.
+	Returns the ids of the new entries in the order given.
+	"""
+	outbox_ids = []
+	created_at = datetime.now(timezone.utc).isoformat()
+	for discord_channel_id, payload in entries or []:
+		cursor.execute('''
+			INSERT INTO NotificationOutbox (discord_channel_id, payload, status, attempts, next_attempt_at, created_at)
+			VALUES (?, ?, 'pending', 0, ?, ?)
+		''', (str(discord_channel_id), payload, time.time(), created_at))
+		outbox_ids.append(cursor.lastrowid)
+	return outbox_ids
+
+def get_due_outbox_entries(limit: int = 500, shard_ids: list = None, shard_count: int = None, include_unknown_guilds: bool = True,
+	claimant: str = None, lease: float = 0) -> list:
+	"""
+	Returns the pending outbox entries whose next delivery attempt is due, oldest first.
+	With shard_ids, only the entries for guilds on those shards (guild_id >> 22 % shard_count) are returned,
+	plus the entries for channels whose guild isn't known if include_unknown_guilds is set.
+	Entries claimed by another claimant are skipped until their claim expires. With a claimant, the returned entries
+	are claimed for lease seconds in the same transaction, so no other process picks them up meanwhile.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return []
+	try:
+		cursor = conn.cursor()
+		now = time.time()
+		if claimant is not None:
+			# take the write lock before reading, so the selection and the claim can't interleave with another process
+			cursor.execute("BEGIN IMMEDIATE")
+		unclaimed = "(o.claimed_until IS NULL OR o.claimed_until <= ? OR o.claimed_by IS ?)"
+		if shard_ids is None:
+			cursor.execute(f'''
+				SELECT o.id, o.discord_channel_id, o.payload FROM NotificationOutbox o
+				WHERE o.status = 'pending' AND o.next_attempt_at <= ? AND {unclaimed}
+				ORDER BY o.id
+				LIMIT ?
+			''', (now, now, claimant, limit))
+		else:
+			cursor.execute(f'''
+				SELECT o.id, o.discord_channel_id, o.payload FROM NotificationOutbox o
+				LEFT JOIN DiscordChannels d ON d.channel_id = o.discord_channel_id
+				WHERE o.status = 'pending' AND o.next_attempt_at <= ? AND {unclaimed} AND (
+					(d.guild_id IS NULL AND ?)
+					OR ((d.guild_id >> 22) % ?) IN ({", ".join("?" for _ in shard_ids)})
+				)
+				ORDER BY o.id
+				LIMIT ?
+			''', (now, now, claimant, include_unknown_guilds, shard_count, *shard_ids, limit))
+		entries = [dict(row) for row in cursor.fetchall()]
+		if claimant is not None:
+			cursor.executemany(
+				'UPDATE NotificationOutbox SET claimed_by = ?, claimed_until = ? WHERE id = ?',
+				[(claimant, now + lease, entry["id"]) for entry in entries]
+			)
+			conn.commit()
+		return entries
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting due outbox entries: {e}")
+		conn.rollback()
+		return []
+	finally:
+		conn.close()
+
+def renew_outbox_claims(outbox_ids, claimant: str, lease: float) -> None:
+	"""
+	Extends the claims of entries still on their way, e.g. waiting in a digest.
+	"""
+	if not outbox_ids:
+		return
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.executemany(
+			'UPDATE NotificationOutbox SET claimed_until = ? WHERE id = ? AND claimed_by = ?',
+			[(time.time() + lease, outbox_id, claimant) for outbox_id in outbox_ids]
+		)
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error renewing outbox claims: {e}")
+	finally:
+		conn.close()
+
+def remove_outbox_entries(outbox_ids: list) -> None:
+	"""
+	Removes delivered outbox entries.
+	"""
+	if not outbox_ids:
+		return
+	conn = get_connection()
+	if conn is None:
+		return
+	try:
+		cursor = conn.cursor()
+		cursor.executemany('DELETE FROM NotificationOutbox WHERE id = ?', [(outbox_id,) for outbox_id in outbox_ids])
+		conn.commit()
+	except sqlite3.Error as e:
+		main.logger.error(f"Error removing outbox entries: {e}")
+	finally:
+		conn.close()
+
+def mark_outbox_entries_failed(outbox_ids: list, error: str, max_attempts: int, retry_base: float) -> int:
+	"""
+	Records a failed delivery attempt. The next attempt is due after retry_base * 2^(attempts - 1) seconds,
+	entries that have used up max_attempts are marked 'dead' and no longer retried.
+	Returns the number of entries that were marked dead.
+	"""
+	if not outbox_ids:
+		return 0
+	conn = get_connection()
+	if conn is None:
+		return 0
+	try:
+		cursor = conn.cursor()
+		now = time.time()
+		dead = 0
+		for outbox_id in outbox_ids:
+			cursor.execute('SELECT attempts FROM NotificationOutbox WHERE id = ?', (outbox_id,))
+			row = cursor.fetchone()
+			if row is None:
+				continue
+			attempts = row['attempts'] + 1
+			status = 'dead' if attempts >= max_attempts else 'pending'
+			dead += status == 'dead'
+			cursor.execute('''
+				UPDATE NotificationOutbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, claimed_by = NULL, claimed_until = NULL
+				WHERE id = ?
+			''', (status, attempts, now + retry_base * 2 ** (attempts - 1), error, outbox_id))
+		conn.commit()
+		return dead
+	except sqlite3.Error as e:
+		main.logger.error(f"Error marking outbox entries failed: {e}")
+		return 0
+	finally:
+		conn.close()
+
+def retry_dead_outbox_entries() -> int:
+	"""
+	Moves every dead outbox entry back to pending with a fresh set of attempts. Returns the number of entries moved.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return 0
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+			UPDATE NotificationOutbox SET status = 'pending', attempts = 0, next_attempt_at = ?, claimed_by = NULL, claimed_until = NULL
+			WHERE status = 'dead'
+		''', (time.time(),))
+		conn.commit()
+		return cursor.rowcount
+	except sqlite3.Error as e:
+		main.logger.error(f"Error retrying dead outbox entries: {e}")
+		return 0
+	finally:
+		conn.close()
+
+def get_outbox_summary() -> dict:
+	"""
+	Returns the number of outbox entries in each state.
+	"""
+	conn = get_connection()
+	if conn is None:
+		return {}
+	try:
+		cursor = conn.cursor()
+		cursor.execute('SELECT status, COUNT(*) AS count FROM NotificationOutbox GROUP BY status')
+		return {row['status']: row['count'] for row in cursor.fetchall()}
+	except sqlite3.Error as e:
+		main.logger.error(f"Error getting outbox summary: {e}")
+		return {}
+	finally:
+		conn.close()
+
 #
 # Social Media Subscription Management
 #
@@ -676,14 +1402,16 @@ def get_all_social_media_subscriptions_for_platform(platform):
 # Latest Post Management Functions
 #
 
-def update_latest_post(social_media_channel_id: int, post_id: str, content: str, timestamp=None):
+def update_latest_post(social_media_channel_id: int, post_id: str, content: str, timestamp=None, outbox: list = None):
 	"""
 	Add a new post to the Posts table for a given social media channel.
 	If there are more than 5 posts for this channel, delete the oldest one.
+	The outbox entries of the post's notification are saved in the same transaction (see add_outbox_entries).
+	Returns the ids of the outbox entries, or None if nothing was saved.
 	"""
 	conn = get_connection()
 	if conn is None:
-		return
+		return None
 	try:
 		cursor = conn.cursor()
 		if timestamp is None:
@@ -703,9 +1431,12 @@ def update_latest_post(social_media_channel_id: int, post_id: str, content: str,
 				LIMIT 5
 			)
 		''', (social_media_channel_id, social_media_channel_id))
+		outbox_ids = add_outbox_entries(cursor, outbox)
 		conn.commit()
+		return outbox_ids
 	except sqlite3.Error as e:
 		main.logger.error(f"Error updating latest post: {e}")
+		return None
 	finally:
 		conn.close()
 
@@ -0,0 +1,94 @@
+"""
+Benchmark: link stripping throughput on a synthetic corpus of Bluesky posts.
+
+Compares the facet byte-range stripping in blsky.strip_link_facets with the earlier
+urlextract-based approach (scan the text for URLs, then remove them). The old side only
+runs if urlextract happens to be installed, it is no longer a dependency.
+
+	python source/tools/bench_bluesky_links.py --posts 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Bluesky link stripping benchmark")
+parser.add_argument("--posts", type=int, default=20000, help="number of posts in the corpus")
+parser.add_argument("--seed", type=int, default=1)
+args = parser.parse_args()
+
+# the bot modules read their configuration from the environment and command line on import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HOME_SERVER_ID", "0")
+os.environ.setdefault("HOME_CHANNEL_ID", "0")
+sys.argv = sys.argv[:1]
+
+import blsky
+
+WORDS = ["stream", "tonight", "new", "video", "is", "up", "check", "out", "the", "schedule", "thanks", "everyone", "🎉", "ääkköset", "💜", "live"]
+DOMAINS = ["www.youtube.com/watch?v=", "twitch.tv/", "example.com/blog/2025/01/a-rather-long-article-title-", "bsky.app/profile/"]
+
+def display_link(uri: str) -> str:
+	# how the Bluesky app shows a link: no scheme, long ones cut short with an ellipsis
+	shown = uri.split("://", 1)[-1]
+	return shown if len(shown) <= 30 else shown[:27] + "..."
+
+def make_post(rng: random.Random) -> tuple[str, list, list]:
+	text = ""
+	ranges = []
+	links = []
+	for _ in range(rng.randint(5, 40)):
+		if rng.random() < 0.06:
+			uri = "https://" + rng.choice(DOMAINS) + str(rng.randint(1000, 99999999))
+			shown = display_link(uri)
+			start = len(text.encode("utf-8"))
+			text += shown
+			ranges.append((start, start + len(shown.encode("utf-8")), uri))
+			links.append(uri)
+		else:
+			text += rng.choice(WORDS)
+		text += " "
+	return text, ranges, links
+
+def old_replace_urls(extractor, text: str, links: list) -> str:
+	# the removed implementation, kept here for comparison
+	if not text:
+		return ""
+	truncated_links = extractor.find_urls(text)
+	if truncated_links and links:
+		for short_link, full_link in zip(truncated_links, links):
+			text = text.replace(short_link, "")
+	return text
+
+def measure(label: str, strip, corpus: list) -> float:
+	started = time.perf_counter()
+	for post in corpus:
+		strip(post)
+	elapsed = time.perf_counter() - started
+	print(f"{label:<22} {len(corpus) / elapsed:>12,.0f} posts/s {elapsed / len(corpus) * 1e6:>9.2f} µs/post")
+	return elapsed
+
+if __name__ == "__main__":
+	rng = random.Random(args.seed)
+	corpus = [make_post(rng) for _ in range(args.posts)]
+	print(f"{len(corpus)} posts, {sum(len(post[1]) for post in corpus)} links")
+
+	new = measure("facet byte ranges", lambda post: blsky.strip_link_facets(post[0], post[1]), corpus)
+
+	try:
+		import urlextract
+	except ImportError:
+		print("urlextract is not installed, skipping the comparison")
+		sys.exit(0)
+	started = time.perf_counter()
+	extractor = urlextract.URLExtract()
+	print(f"{'urlextract init':<22} {time.perf_counter() - started:>12.3f} s")
+	old = measure("urlextract", lambda post: old_replace_urls(extractor, post[0], post[2]), corpus)
+	print(f"speedup: {old / new:.1f}x")
+
+	mismatches = sum(
+		1 for post in corpus
+		if blsky.strip_link_facets(post[0], post[1]) != old_replace_urls(extractor, post[0], post[2])
+	)
+	print(f"posts stripped differently: {mismatches}")
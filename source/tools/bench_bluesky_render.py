@@ -0,0 +1,79 @@
+"""
+Benchmark: CPU time per Bluesky post against fan-out width.
+
+Compares rendering the post for every subscribed Discord channel (the old path)
+with rendering it once and only attaching the ping role per channel.
+Both sides include the per-send embed serialization discord.py does.
+
+	python source/tools/bench_bluesky_render.py --posts 200 --widths 1 5 20 50 100
+"""
+import argparse
+import os
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Bluesky render fan-out benchmark")
+parser.add_argument("--posts", type=int, default=200, help="posts rendered per fan-out width")
+parser.add_argument("--widths", type=int, nargs="+", default=[1, 5, 20, 50, 100], help="numbers of subscribed Discord channels")
+args = parser.parse_args()
+
+# the bot modules read their configuration from the environment and command line on import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HOME_SERVER_ID", "0")
+os.environ.setdefault("HOME_CHANNEL_ID", "0")
+sys.argv = sys.argv[:1]
+
+import bot
+import blsky
+
+SAMPLE_POST = {
+	"post_uri": "at://did:plc:abcd1234/app.bsky.feed.post/3kxyz987",
+	"content": "Stream starts in an hour! Come hang out, we're trying the new update " * 3,
+	"images": [f"https://cdn.bsky.app/img/feed_thumbnail/plain/did:plc:abcd1234/bafy{i}@jpeg" for i in range(4)],
+	"links": ["https://www.twitch.tv/someone", "https://example.com/schedule"],
+	"link_ranges": [],
+	"channel_name": "Someone",
+	"avatar_url": "https://cdn.bsky.app/img/avatar/plain/did:plc:abcd1234/bafyavatar@jpeg",
+	"post_type": "root",
+	"author_url": None,
+}
+
+def send_payload(notification: bot.RenderedNotification, ping_role: str) -> None:
+	# what a send costs locally: message content and embed serialization
+	notification.content_for(ping_role)
+	[embed.to_dict() for embed in notification.embeds]
+	list(notification.follow_ups)
+
+def render() -> bot.RenderedNotification:
+	return bot.render_bluesky_activity(
+		SAMPLE_POST["post_uri"],
+		blsky.strip_link_facets(SAMPLE_POST["content"], SAMPLE_POST["link_ranges"]),
+		SAMPLE_POST["images"],
+		SAMPLE_POST["links"],
+		SAMPLE_POST["channel_name"],
+		SAMPLE_POST["avatar_url"],
+		SAMPLE_POST["post_type"],
+		SAMPLE_POST["author_url"],
+	)
+
+def per_channel(width: int) -> None:
+	for i in range(width):
+		send_payload(render(), f"<@&{i}> ")
+
+def render_once(width: int) -> None:
+	notification = render()
+	for i in range(width):
+		send_payload(notification, f"<@&{i}> ")
+
+def measure(fan_out, width: int) -> float:
+	started = time.process_time()
+	for _ in range(args.posts):
+		fan_out(width)
+	return (time.process_time() - started) / args.posts * 1000
+
+if __name__ == "__main__":
+	print(f"{'width':>6} {'per-channel ms/post':>20} {'render-once ms/post':>20} {'speedup':>8}")
+	for width in args.widths:
+		old = measure(per_channel, width)
+		new = measure(render_once, width)
+		print(f"{width:>6} {old:>20.3f} {new:>20.3f} {old / new:>7.1f}x")
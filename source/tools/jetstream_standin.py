@@ -0,0 +1,143 @@
+"""
+Local stand-in for a Bluesky Jetstream server, for testing the ingester offline.
+
+Serves synthetic post/repost commits for a set of fake DIDs over a websocket at /subscribe,
+honouring the cursor, requireHello and options_update (wantedDids) like the real service.
+
+	python source/tools/jetstream_standin.py serve --port 6008 --dids 500 --rate 2000
+		then set BLUESKY_JETSTREAM_URL=ws://localhost:6008/subscribe
+
+	python source/tools/jetstream_standin.py bench --dids 500 --followed 50 --events 200000
+		runs the server and a decoding client in one process and reports the throughput
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from aiohttp import web, ClientSession, WSMsgType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jetstream
+
+def fake_dids(count: int) -> list[str]:
+	return [f"did:plc:standin{i:06d}" for i in range(count)]
+
+def make_commit(did: str, time_us: int, sequence: int) -> dict:
+	if sequence % 5 == 0:
+		collection = "app.bsky.feed.repost"
+		record = {
+			"$type": collection,
+			"subject": {"uri": f"at://did:plc:other/app.bsky.feed.post/{sequence:013d}", "cid": "bafystandin"},
+			"createdAt": "2025-01-01T00:00:00.000Z",
+		}
+	else:
+		collection = "app.bsky.feed.post"
+		record = {
+			"$type": collection,
+			"text": f"stand-in post number {sequence} " + "lorem ipsum " * random.randint(0, 20),
+			"langs": ["en"],
+			"createdAt": "2025-01-01T00:00:00.000Z",
+		}
+	return {
+		"did": did,
+		"time_us": time_us,
+		"kind": "commit",
+		"commit": {
+			"rev": f"rev{sequence}",
+			"operation": "create",
+			"collection": collection,
+			"rkey": f"{sequence:013d}",
+			"record": record,
+			"cid": "bafystandin",
+		},
+	}
+
+def create_app(dids: list[str], rate: int, max_events: int | None) -> web.Application:
+	async def subscribe(request: web.Request) -> web.WebSocketResponse:
+		ws = web.WebSocketResponse()
+		await ws.prepare(request)
+
+		wanted = None
+		if request.query.get("requireHello") == "true":
+			hello = await ws.receive()
+			if hello.type != WSMsgType.TEXT:
+				return ws
+			wanted = set(json.loads(hello.data)["payload"].get("wantedDids") or []) or None
+
+		time_us = int(request.query.get("cursor") or time.time() * 1_000_000)
+		sequence = 0
+		interval = 1.0 / rate if rate else 0
+		started = time.monotonic()
+		try:
+			while not ws.closed and (max_events is None or sequence < max_events):
+				sequence += 1
+				time_us += 1000
+				did = random.choice(dids)
+				# the real service filters server-side, so only the wanted DIDs go over the wire
+				if wanted is not None and did not in wanted:
+					continue
+				await ws.send_str(json.dumps(make_commit(did, time_us, sequence)))
+				if interval:
+					# pace against the wall clock instead of sleeping per message
+					ahead = started + sequence * interval - time.monotonic()
+					if ahead > 0:
+						await asyncio.sleep(ahead)
+		except ConnectionResetError:
+			# client went away mid-send
+			return ws
+		await ws.close()
+		return ws
+
+	app = web.Application()
+	app.router.add_get("/subscribe", subscribe)
+	return app
+
+async def serve(args) -> None:
+	runner = web.AppRunner(create_app(fake_dids(args.dids), args.rate, None))
+	await runner.setup()
+	await web.TCPSite(runner, "localhost", args.port).start()
+	print(f"Stand-in Jetstream serving {args.dids} DIDs at ws://localhost:{args.port}/subscribe")
+	await asyncio.Event().wait()
+
+async def bench(args) -> None:
+	dids = fake_dids(args.dids)
+	followed = set(random.sample(dids, min(args.followed, len(dids))))
+
+	runner = web.AppRunner(create_app(dids, 0, args.events))
+	await runner.setup()
+	await web.TCPSite(runner, "localhost", args.port).start()
+
+	url = jetstream.build_jetstream_url(f"ws://localhost:{args.port}/subscribe")
+	received = decoded = 0
+	async with ClientSession() as session:
+		async with session.ws_connect(url) as ws:
+			await ws.send_str(jetstream.build_options_update(followed))
+			started = time.perf_counter()
+			async for msg in ws:
+				if msg.type != WSMsgType.TEXT:
+					break
+				received += 1
+				event = jetstream.decode_jetstream_event(json.loads(msg.data))
+				if event and event["did"] in followed:
+					decoded += 1
+			elapsed = time.perf_counter() - started
+
+	await runner.cleanup()
+	print(f"received {received} events, decoded {decoded} for {len(followed)} followed DIDs in {elapsed:.2f}s")
+	print(f"throughput: {received / elapsed:,.0f} events/s")
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Local stand-in Jetstream server")
+	parser.add_argument("mode", choices=["serve", "bench"])
+	parser.add_argument("--port", type=int, default=6008)
+	parser.add_argument("--dids", type=int, default=500, help="number of fake accounts producing commits")
+	parser.add_argument("--followed", type=int, default=50, help="bench: number of DIDs the client filters on")
+	parser.add_argument("--rate", type=int, default=100, help="serve: commits per second, 0 for unthrottled")
+	parser.add_argument("--events", type=int, default=100000, help="bench: commits generated before the server closes")
+	args = parser.parse_args()
+
+	asyncio.run(serve(args) if args.mode == "serve" else bench(args))
@@ -5,19 +5,34 @@ import time
 
 import main
 import sql
+from cache import TTLCache
 from reconnect_decorator import reconnect_api_with_backoff
 import bot
+from scheduler import poll_scheduler
 
 WAIT_TIME = 60  # seconds between checks
 
 twitch_session = None
-twitch_auth_token = None
-twitch_auth_token_expires = 0
+
+TWITCH_BATCH_SIZE = 100	# max number of ids/logins per Helix call
+
+# Profiles and games rarely change, cache them between cycles
+twitch_user_cache = TTLCache(ttl=6 * 60 * 60, negative_ttl=10 * 60)
+twitch_game_cache = TTLCache(ttl=24 * 60 * 60, negative_ttl=60 * 60)
+
+# Live state per internal Twitch channel id: {"state": "offline"|"live", "stream_id", "started_at"}
+# Held in memory and checkpointed to the database only when a channel goes live or offline.
+twitch_stream_states = None
+
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+TOKEN_VALIDATE_URL = "https://id.twitch.tv/oauth2/validate"
+TOKEN_REFRESH_MARGIN = 600		# seconds before expiry when the app token is refreshed in the background
+TOKEN_VALIDATE_INTERVAL = 3600	# Twitch requires apps to validate their tokens hourly
 
 #
 #	# Twitch API helper functions
 
-async def initialize_twitch_session():
+async def initialize_twitch_session(maintain_token: bool = False):
 	global twitch_session
 	if twitch_session is None or twitch_session.closed:
 		twitch_session = aiohttp.ClientSession()
@@ -26,67 +41,159 @@ async def initialize_twitch_session():
 			main.logger.info("Twitch session initialized successfully.\n")
 		else:
 			main.logger.error("Failed to initialize Twitch session.\n")
+	# keep the app token fresh for as long as the session is open, in the process that polls Twitch. The others only
+	# make the odd slash command lookup, they fetch a token on demand instead of running their own refresh loop.
+	if maintain_token:
+		token_manager.start()
 
 async def close_twitch_session():
 	global twitch_session
+	await token_manager.stop()
 	if twitch_session and not twitch_session.closed:
 		await twitch_session.close()
 		twitch_session = None
 
-async def initialize_twitch_auth_token(force_refresh: bool = False) -> str:
+class TwitchTokenManager:
 	"""
-	Fetches and sets the Twitch auth token using the client ID and secret.
-	Fresh token is generated each time bot starts, then reused until it expires.
-	Force refresh can be used to get a new token if needed.
+	Owns the Twitch app access token.
+	Concurrent refreshes are coalesced into a single request over the shared Twitch session,
+	the token is refreshed ahead of its expiry and validated periodically in the background.
 	"""
-	global twitch_auth_token, twitch_auth_token_expires
-	
-	# if no token is set, fetch a new one
-	if not twitch_auth_token or time.time() > twitch_auth_token_expires or force_refresh:
+	def __init__(self):
+		self.token = None
+		self.expires_at = 0
+		self.last_validated = 0
+		self._refresh_task = None		# in-flight token request shared by all concurrent callers
+		self._maintenance_task = None
+
+	def start(self):
+		if self._maintenance_task is None or self._maintenance_task.done():
+			self._maintenance_task = asyncio.create_task(self._maintain_token())
+
+	async def stop(self):
+		if self._maintenance_task and not self._maintenance_task.done():
+			self._maintenance_task.cancel()
+			try:
+				await self._maintenance_task
+			except asyncio.CancelledError:
+				pass
+		self._maintenance_task = None
+
+	async def get_token(self, force_refresh: bool = False) -> str:
+		"""
+		Returns a valid app token, fetching a new one if there is none or it has expired.
+		"""
+		if force_refresh or not self.token or time.time() >= self.expires_at:
+			return await self.refresh()
+		return self.token
+
+	async def refresh(self) -> str:
+		"""
+		Fetches a new app token. Callers arriving while a refresh is already running wait for that one instead.
+		"""
+		if self._refresh_task is None or self._refresh_task.done():
+			self._refresh_task = asyncio.create_task(self._fetch_token())
+		# shield so a cancelled caller does not cancel the refresh for everyone else
+		return await asyncio.shield(self._refresh_task)
+
+	async def handle_unauthorized(self, rejected_token: str) -> str:
+		"""
+		Called when Twitch answers 401 for the given token.
+		Only refreshes if nobody else has replaced the rejected token yet.
+		"""
+		if rejected_token == self.token:
+			main.logger.warning("Twitch rejected the app token, refreshing it...\n")
+			return await self.refresh()
+		return await self.get_token()
+
+	async def _fetch_token(self) -> str:
 		main.logger.info("Fetching new Twitch auth token...")
+		await initialize_twitch_session()
 
-		token_url = "https://id.twitch.tv/oauth2/token"
 		payload = {
 			"client_id": main.TWITCH_CLIENT_ID,
 			"client_secret": main.TWITCH_CLIENT_SECRET,
 			"grant_type": "client_credentials"
 		}
-
-		async with aiohttp.ClientSession() as session:
-			async with session.post(token_url, data=payload) as response:
-				if response.status != 200:
-					body = await response.text()
-					raise Exception(f"Twitch API error while fetching token: {response.status} - {body}")
-				token_data = await response.json()
-
-				twitch_auth_token = token_data["access_token"]
-				twitch_auth_token_expires = time.time() + token_data["expires_in"] - 60 # 1 minute buffer
-
-				main.logger.info(f"New Twitch auth token fetched successfully.\n")
-
-	return twitch_auth_token
+		async with twitch_session.post(TOKEN_URL, data=payload) as response:
+			if response.status != 200:
+				body = await response.text()
+				raise Exception(f"Twitch API error while fetching token: {response.status} - {body}")
+			token_data = await response.json()
+
+		self.token = token_data["access_token"]
+		self.expires_at = time.time() + token_data["expires_in"] - 60 # 1 minute buffer
+		self.last_validated = time.time()
+		main.logger.info(f"New Twitch auth token fetched successfully.\n")
+		return self.token
+
+	async def _validate_token(self) -> None:
+		"""
+		Validates the current token, refreshing it if Twitch no longer accepts it.
+		"""
+		headers = {"Authorization": f"OAuth {self.token}"}
+		async with twitch_session.get(TOKEN_VALIDATE_URL, headers=headers) as response:
+			if response.status == 401:
+				await self.handle_unauthorized(self.token)
+				return
+			if response.status != 200:
+				body = await response.text()
+				raise Exception(f"Twitch API error while validating token: {response.status} - {body}")
+			token_data = await response.json()
+
+		self.expires_at = time.time() + token_data["expires_in"] - 60
+		self.last_validated = time.time()
+
+	async def _maintain_token(self) -> None:
+		"""
+		Background task refreshing the token before it expires and validating it hourly.
+		"""
+		while True:
+			try:
+				if not self.token:
+					await self.refresh()
+				now = time.time()
+				refresh_at = self.expires_at - TOKEN_REFRESH_MARGIN
+				validate_at = self.last_validated + TOKEN_VALIDATE_INTERVAL
+				await asyncio.sleep(max(min(refresh_at, validate_at) - now, 1))
+
+				if time.time() >= self.expires_at - TOKEN_REFRESH_MARGIN:
+					await self.refresh()
+				else:
+					await self._validate_token()
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				main.logger.error(f"Error maintaining Twitch auth token: {e}\n")
+				await asyncio.sleep(60)
+
+token_manager = TwitchTokenManager()
 
 @reconnect_api_with_backoff(initialize_twitch_session, "Twitch")
-async def twitch_get(endpoint: str, params: dict = None) -> dict:
+async def twitch_get(endpoint: str, params: dict | list = None) -> dict:
 	"""
 	Makes a GET request to Twitch API with proper authorization.
 	endpoint: Twitch API endpoint to call (e.g., "users", "streams")
-	params: dictionary of query params
+	params: dictionary of query params, or a list of (key, value) tuples for repeated keys
+	A request rejected with 401 is replayed once with a refreshed token.
 	"""
-	global twitch_auth_token
-
 	url = f"https://api.twitch.tv/helix/{endpoint}"
-	headers = {
-		"Client-ID": main.TWITCH_CLIENT_ID,
-		"Authorization": f"Bearer {twitch_auth_token}"
-	}
-
-	async with twitch_session.get(url, headers=headers, params=params) as response:
-		if response.status != 200:
-			error_text = await response.text()
-			raise Exception(f"Twitch API GET {url} failed: {response.status} - {error_text}")
-		
-		return await response.json()
+	token = await token_manager.get_token()
+
+	for attempt in range(2):
+		headers = {
+			"Client-ID": main.TWITCH_CLIENT_ID,
+			"Authorization": f"Bearer {token}"
+		}
+		async with twitch_session.get(url, headers=headers, params=params) as response:
+			if response.status == 401 and attempt == 0:
+				token = await token_manager.handle_unauthorized(token)
+				continue
+			if response.status != 200:
+				error_text = await response.text()
+				raise Exception(f"Twitch API GET {url} failed: {response.status} - {error_text}")
+
+			return await response.json()
 
 #
 #	# Twitch API calls
@@ -98,98 +205,215 @@ async def verify_twitch_channel(user_input: str) -> str | None:
 	Given a Twitch username, validate existence and return the user ID if valid.
 	Returns None if the user does not exist.
 	"""
-	data = await twitch_get("users", params={"login": user_input})
-	if data.get("data"):
-		user_info = data["data"][0]
-		return user_info["id"]  # Return the internal user ID
+	verified = await verify_twitch_channels([user_input])
+	return verified.get(user_input.lower())
 
-	return None
+async def verify_twitch_channels(logins: list[str]) -> dict:
+	"""
+	Validates many Twitch usernames at once.
+	Returns a dict mapping each existing (lowercased) login to its user ID, unknown logins are left out.
+	"""
+	users = await fetch_twitch_users(logins=logins)
+	return {login: user["id"] for login, user in users.items()}
 
-async def fetch_twitch_stream_info(user_login: str) -> dict | None:
+async def fetch_twitch_users(user_ids: list[str] = None, logins: list[str] = None) -> dict:
+	"""
+	Resolves Twitch user profiles by ID or login, up to 100 per /users call.
+	Profiles are cached by both ID and lowercased login. Returns a dict keyed by the requested IDs/logins.
+	"""
+	requested = [("id", user_id) for user_id in (user_ids or [])]
+	requested += [("login", login.lower()) for login in (logins or [])]
+
+	to_fetch = [(kind, value) for kind, value in requested if f"{kind}:{value}" not in twitch_user_cache]
+	for i in range(0, len(to_fetch), TWITCH_BATCH_SIZE):
+		batch = to_fetch[i:i + TWITCH_BATCH_SIZE]
+		data = await twitch_get("users", params=batch)
+		if data is None:
+			raise Exception("Twitch user lookup failed.")
+		for user in data.get("data", []):
+			twitch_user_cache.set(f"id:{user['id']}", user)
+			twitch_user_cache.set(f"login:{user['login'].lower()}", user)
+		# remember users that don't exist so they aren't looked up again every cycle
+		for kind, value in batch:
+			if f"{kind}:{value}" not in twitch_user_cache:
+				twitch_user_cache.set(f"{kind}:{value}", None)
+
+	users = {}
+	for kind, value in requested:
+		user = twitch_user_cache.get(f"{kind}:{value}")
+		if user:
+			users[value] = user
+	return users
+
+async def fetch_twitch_games(game_ids: list[str]) -> dict:
+	"""
+	Resolves Twitch game/category info, up to 100 per /games call. Returns a dict keyed by game ID.
+	"""
+	game_ids = [game_id for game_id in game_ids if game_id]
+
+	to_fetch = twitch_game_cache.missing(game_ids)
+	for i in range(0, len(to_fetch), TWITCH_BATCH_SIZE):
+		batch = to_fetch[i:i + TWITCH_BATCH_SIZE]
+		data = await twitch_get("games", params=[("id", game_id) for game_id in batch])
+		if data is None:
+			raise Exception("Twitch game lookup failed.")
+		for game in data.get("data", []):
+			twitch_game_cache.set(game["id"], game)
+		for game_id in batch:
+			if game_id not in twitch_game_cache:
+				twitch_game_cache.set(game_id, None)
+
+	return {game_id: twitch_game_cache.get(game_id) for game_id in game_ids if twitch_game_cache.get(game_id)}
+
+async def fetch_twitch_streams(user_ids: list[str]) -> dict:
+	"""
+	Fetches the live streams of the given Twitch users, up to 100 users per /streams call.
+	Returns a dict mapping user ID to stream info for the users that are currently live.
+	"""
+	streams = {}
+	for i in range(0, len(user_ids), TWITCH_BATCH_SIZE):
+		batch = user_ids[i:i + TWITCH_BATCH_SIZE]
+		params = [("user_id", user_id) for user_id in batch]
+		params.append(("first", str(TWITCH_BATCH_SIZE)))
+		data = await twitch_get("streams", params=params)
+		if data is None:
+			# don't let a failed lookup look like everyone went offline
+			raise Exception("Twitch stream lookup failed.")
+		for stream in data.get("data", []):
+			streams[stream["user_id"]] = stream
+	return streams
+
+async def enrich_twitch_notifications(pending_notifications: list[dict]) -> None:
 	"""
-	Fetches the stream information for a given Twitch user.
+	Attaches user profiles and game info to everything going live this cycle, using batched lookups.
 	"""
-	data = await twitch_get("streams", params={"user_login": user_login})
-	# Check if the stream is live
-	if data.get("data"):
-		return data["data"][0]
-	return None
+	if not pending_notifications:
+		return
+	try:
+		users = await fetch_twitch_users(user_ids=[item["user_id"] for item in pending_notifications])
+		games = await fetch_twitch_games([item["game_id"] for item in pending_notifications])
+	except Exception as e:
+		# enrichment is cosmetic, notifications still go out with the plain stream info
+		main.logger.error(f"Error enriching Twitch notifications: {e}\n")
+		return
+
+	for item in pending_notifications:
+		item["profile"] = users.get(item["user_id"])
+		item["game"] = games.get(item["game_id"])
+
+def get_stream_thumbnail_url(stream: dict) -> str | None:
+	"""
+	Fills in the stream thumbnail template. The start time is appended so Discord doesn't show a cached image of an older stream.
+	"""
+	thumbnail_url = stream.get("thumbnail_url")
+	if not thumbnail_url:
+		return None
+	thumbnail_url = thumbnail_url.replace("{width}", "1280").replace("{height}", "720")
+	return f"{thumbnail_url}?t={re.sub(r'[^0-9]', '', stream.get('started_at') or '')}"
+
+#
+#	# Twitch live state tracking
+#
+
+def update_twitch_stream_state(internal_id: int, live_info: dict | None) -> bool:
+	"""
+	Advances the offline/live state machine of a Twitch channel with the latest stream info.
+	Checkpoints the state only on transitions. Returns True if the channel just went live,
+	that transition is checkpointed (and only then remembered) by process_twitch_notifications together with its notification.
+	"""
+	global twitch_stream_states
+	if twitch_stream_states is None:
+		twitch_stream_states = sql.get_twitch_stream_states()
+
+	current = twitch_stream_states.get(internal_id, {"state": "offline", "stream_id": None, "started_at": None})
+
+	if live_info:
+		# a different stream id means a new broadcast, even if we never saw the previous one end
+		if current["state"] == "live" and current["stream_id"] == live_info["id"]:
+			return False
+		new_state = {"state": "live", "stream_id": live_info["id"], "started_at": live_info.get("started_at")}
+	else:
+		if current["state"] == "offline":
+			return False
+		new_state = {"state": "offline", "stream_id": None, "started_at": None}
+
+	if new_state["state"] == "live":
+		return True
+	# a failed checkpoint is retried on the next poll
+	if sql.save_twitch_stream_state(internal_id, new_state["state"], new_state["stream_id"], new_state["started_at"]) is not None:
+		twitch_stream_states[internal_id] = new_state
+	return False
 
 #
 #	# Twitch activity sharing task
 #
 
-async def check_for_twitch_activities():
-	global twitch_session, twitch_auth_token
-
-	main.logger.info("Starting the Twitch activity sharing task...\n")
-	first_run_twitch = True
-	while True:
-		try:
-			twitch_subscriptions = sql.get_all_social_media_subscriptions_for_platform("Twitch")
-			pending_notifications = []
-
-			twitch_auth_token = await initialize_twitch_auth_token()
-
-			for twitch_id in twitch_subscriptions:
-				internal_id = sql.get_id_for_channel_url(twitch_id)
-				twitch_login_name = sql.get_channel_name(internal_id)
-
-				try:
-					match = re.search(r"(?:twitch\.tv/)?([a-zA-Z0-9_]+)$", twitch_login_name.strip())
-					if not match:
-						main.logger.error(f"Invalid Twitch login format: {twitch_login_name}\n")
-						continue
-					twitch_login_name = match.group(1)
-					# Check if live
-					live_info = await fetch_twitch_stream_info(twitch_login_name)
-					if live_info:
-						pending_notifications.append({
-							"type": "live",
-							"internal_id": internal_id,
-							"channel_name": twitch_login_name,
-							"title": live_info["title"]
-						})
-				except Exception as e:
-					main.logger.error(f"Error processing Twitch user {twitch_login_name}: {e}\n")
-
-			await process_twitch_notifications(pending_notifications)
-
-			if first_run_twitch:
-				if hasattr(main, "startup") and main.startup.silent:
-					await main.startup.task_finished_first_run()
-				first_run_twitch = False
-				main.logger.info("Finished first run of Twitch activity sharing task.\n")
-
-		except Exception as e:
-			main.logger.error(f"Error inside Twitch activity loop: {e}\n")
-
-		await asyncio.sleep(WAIT_TIME)
+async def check_for_twitch_activities() -> None:
+	"""
+	One Twitch polling cycle, run by the scheduler (see the registration at the end).
+	"""
+	try:
+		twitch_subscriptions = sql.get_all_social_media_subscriptions_for_platform("Twitch")
+		pending_notifications = []
+
+		# Subscriptions are stored by Twitch user ID, check all of them with batched /streams calls
+		live_streams = await fetch_twitch_streams(twitch_subscriptions)
+
+		for twitch_id in twitch_subscriptions:
+			internal_id = sql.get_id_for_channel_url(twitch_id, "Twitch")
+			live_info = live_streams.get(twitch_id)
+
+			# Only the offline -> live transition is notified
+			if update_twitch_stream_state(internal_id, live_info):
+				pending_notifications.append({
+					"type": "live",
+					"internal_id": internal_id,
+					"user_id": twitch_id,
+					"stream_id": live_info["id"],
+					"channel_name": live_info["user_login"],
+					"title": live_info["title"],
+					"start_time": live_info.get("started_at"),
+					"game_id": live_info.get("game_id"),
+					"game_name": live_info.get("game_name"),
+					"thumbnail_url": get_stream_thumbnail_url(live_info)
+				})
+
+		await enrich_twitch_notifications(pending_notifications)
+		await process_twitch_notifications(pending_notifications)
+
+	except Exception as e:
+		main.logger.error(f"Error inside Twitch activity loop: {e}\n")
 
 async def process_twitch_notifications(pending_notifications: list[dict]) -> None:
 	"""
-	Process the batch of Twitch activities, updating database and notifying Discord channels.
+	Process the batch of Twitch live transitions, notifying Discord channels.
 	"""
-	global first_run
-
 	for item in pending_notifications:
-		virtual_id = str(item["internal_id"]) + item["title"] + item["type"]
-
-		if sql.check_post_match(item["internal_id"], virtual_id):
-			continue
-
-		sql.update_latest_post(item["internal_id"], virtual_id, item["title"])
-
 		discord_channels = sql.get_discord_channels_for_social_channel(item["internal_id"])
+		deliveries = []
 
 		if not main.startup.silent:
-			for discord_channel in discord_channels:
-				await bot.notify_twitch_activity(
-					discord_channel,
-					item["type"],
-					item["channel_name"],
-					item.get("title"),
-					item.get("start_time")
-				)
+			notification = bot.render_twitch_activity(
+				item["type"],
+				item["channel_name"],
+				item.get("title"),
+				item.get("start_time"),
+				profile=item.get("profile"),
+				game=item.get("game"),
+				game_name=item.get("game_name"),
+				thumbnail_url=item.get("thumbnail_url")
+			)
+			if notification:
+				deliveries = [(discord_channel, notification) for discord_channel in discord_channels]
 		else:
 			main.logger.info(f"Skipping notification for Twitch channel {item['channel_name']} due to silent start.\n")
+
+		# the live state is checkpointed in the same transaction that stores the notifications in the outbox, and
+		# remembered only once that succeeded. Until then the next poll detects the transition again.
+		state = {"state": "live", "stream_id": item["stream_id"], "started_at": item.get("start_time")}
+		outbox_ids = sql.save_twitch_stream_state(item["internal_id"], state["state"], state["stream_id"], state["started_at"], outbox=bot.outbox_entries(deliveries))
+		if outbox_ids is not None:
+			twitch_stream_states[item["internal_id"]] = state
+		bot.enqueue_outbox_deliveries(deliveries, outbox_ids)
+
+poll_scheduler.register("Twitch streams", check_for_twitch_activities, interval=WAIT_TIME, group="twitch", reports_first_run=True)
@@ -0,0 +1,173 @@
+import asyncio
+import functools
+import multiprocessing
+import queue
+import signal
+import time
+
+import main
+import bot
+import blsky
+import youtube
+import twitch
+import metrics
+from scheduler import poll_scheduler
+
+# Poller processes (POLLER_PROCESSES=true): every platform is polled in a process of its own, so the blocking API
+# clients spread over cores and a stalled platform can't hold up the others or the Discord gateway.
+# The pollers save their notifications in the outbox as usual and forward them to the gateway process over a
+# multiprocessing queue for immediate delivery. Anything lost on the way is replayed from the outbox.
+
+PLATFORMS = ("bluesky", "youtube", "twitch")
+HEARTBEAT_INTERVAL = 15 # seconds between the signs of life of a poller process
+STALL_TIMEOUT = 600 # a poller process that hasn't been heard from for this long is restarted
+RESTART_DELAY = 5 # seconds before restarting a poller process, doubled while it keeps dying soon after starting
+MAX_RESTART_DELAY = 300
+STABLE_UPTIME = 120 # a process that ran this long before dying is restarted without the longer delay
+
+INITIALIZERS = {
+	"bluesky": blsky.initialize_bluesky_client,
+	"youtube": youtube.initialize_youtube_client,
+	"twitch": functools.partial(twitch.initialize_twitch_session, maintain_token=True),
+}
+
+#
+#	Poller process side
+#
+
+def run_poller_process(platform: str, messages) -> None:
+	"""
+	Entry point of a poller process.
+	"""
+	# the gateway process stops its pollers itself, with SIGTERM
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	asyncio.run(poll_platform(platform, messages))
+
+async def send_heartbeat(platform: str, messages) -> None:
+	messages.put(("heartbeat", platform, None))
+
+async def poll_platform(platform: str, messages) -> None:
+	main.startup = bot.StartupSilencer(task_count=poll_scheduler.first_run_count({platform}), silent=main.SILENT_START)
+	bot.outbox_forwarder = lambda entries: messages.put(("notifications", platform, entries))
+
+	loop = asyncio.get_running_loop()
+	stop = asyncio.Event()
+	signal.signal(signal.SIGTERM, lambda s, f: loop.call_soon_threadsafe(stop.set))
+
+	await INITIALIZERS[platform]()
+	main.logger.info(f"Poller process for {platform} started.\n")
+	poll_scheduler.register("Heartbeat", lambda: send_heartbeat(platform, messages), interval=HEARTBEAT_INTERVAL, group=platform, jitter=0)
+	poll_scheduler.start({platform})
+
+	await stop.wait()
+	await poll_scheduler.stop()
+	if platform == "twitch":
+		await twitch.close_twitch_session()
+
+#
+#	Gateway process side
+#
+
+class PollerSupervisor:
+	"""
+	Runs one poller process per platform, passes their notifications to the dispatcher
+	and restarts processes that die or stop sending heartbeats.
+	"""
+	def __init__(self, platforms: tuple = PLATFORMS):
+		self.platforms = platforms
+		self.context = multiprocessing.get_context("spawn")
+		self.messages = self.context.Queue()
+		self.processes = {} # platform -> multiprocessing.Process
+		self.started_at = {} # platform -> monotonic start time
+		self.last_heard = {} # platform -> monotonic time of the last message
+		self.restart_delay = {} # platform -> current restart delay
+		self.restart_at = {} # platform -> monotonic time a dead process may be restarted
+		self.restarts = {platform: 0 for platform in platforms}
+		self.forwarded = {platform: 0 for platform in platforms}
+		self.tasks = []
+
+	def start(self) -> None:
+		for platform in self.platforms:
+			self.start_process(platform)
+		self.tasks = [asyncio.create_task(self.receive()), asyncio.create_task(self.watch())]
+		metrics.register_source("Poller processes", self.snapshot)
+
+	def start_process(self, platform: str) -> None:
+		process = self.context.Process(target=run_poller_process, args=(platform, self.messages), name=f"dreamcatcher-{platform}", daemon=True)
+		process.start()
+		now = time.monotonic()
+		self.processes[platform] = process
+		self.started_at[platform] = now
+		self.last_heard[platform] = now
+		main.logger.info(f"Started the {platform} poller process, pid {process.pid}\n")
+
+	def next_message(self):
+		# runs in a worker thread, the timeout lets it notice the supervisor stopping
+		return self.messages.get(timeout=1)
+
+	async def receive(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			try:
+				kind, platform, value = await loop.run_in_executor(None, self.next_message)
+			except queue.Empty:
+				continue
+			self.last_heard[platform] = time.monotonic()
+			if kind == "notifications":
+				self.forwarded[platform] += len(value)
+				try:
+					bot.enqueue_forwarded_notifications(value)
+				except Exception as e:
+					# the entries are still in the outbox, the outbox task delivers them
+					main.logger.error(f"Error queueing notifications from the {platform} poller process: {e}\n")
+
+	async def watch(self) -> None:
+		while True:
+			await asyncio.sleep(HEARTBEAT_INTERVAL)
+			now = time.monotonic()
+			for platform, process in list(self.processes.items()):
+				if process.is_alive():
+					if now - self.last_heard[platform] <= STALL_TIMEOUT:
+						continue
+					main.logger.warning(f"The {platform} poller process has stalled, killing it...\n")
+					process.kill()
+					await asyncio.get_running_loop().run_in_executor(None, process.join, 10)
+
+				if platform not in self.restart_at:
+					quick_death = now - self.started_at[platform] < STABLE_UPTIME
+					delay = min(self.restart_delay.get(platform, RESTART_DELAY) * 2, MAX_RESTART_DELAY) if quick_death else RESTART_DELAY
+					self.restart_delay[platform] = delay
+					self.restart_at[platform] = now + delay
+					main.logger.warning(f"The {platform} poller process exited with code {process.exitcode}, restarting in {delay} s...\n")
+				if now >= self.restart_at[platform]:
+					del self.restart_at[platform]
+					self.restarts[platform] += 1
+					self.start_process(platform)
+
+	async def stop(self) -> None:
+		"""
+		Stops the poller processes. Notifications still on their way are delivered from the outbox on the next start.
+		"""
+		for task in self.tasks:
+			task.cancel()
+		await asyncio.gather(*self.tasks, return_exceptions=True)
+		loop = asyncio.get_running_loop()
+		for platform, process in self.processes.items():
+			if process.is_alive():
+				process.terminate()
+				await loop.run_in_executor(None, process.join, 10)
+			if process.is_alive():
+				main.logger.warning(f"The {platform} poller process didn't stop, killing it.\n")
+				process.kill()
+		self.messages.close()
+
+	def snapshot(self) -> dict:
+		now = time.monotonic()
+		return {
+			platform: (
+				f"pid {process.pid}, {'running' if process.is_alive() else 'stopped'}, "
+				f"last heard {now - self.last_heard[platform]:.0f} s ago, {self.restarts[platform]} restarts, "
+				f"{self.forwarded[platform]} notifications forwarded"
+			)
+			for platform, process in self.processes.items()
+		}
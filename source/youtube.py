@@ -1,4 +1,3 @@
-import asyncio
 from googleapiclient.discovery import build
 from datetime import datetime, timezone
 
@@ -6,6 +5,7 @@ import main
 import bot
 import sql
 from reconnect_decorator import reconnect_api_with_backoff
+from scheduler import poll_scheduler, PollBudget
 
 # To note: Youtube API has a quota limit of 10,000 units per day.
 # Activities.list() and PlaylistItems.list() both cost 1 unit per request.
@@ -32,6 +32,19 @@ def calculate_optimal_polling_interval(quota_limit: int = 10000, quota_buffer: f
 
 	return max(optimal_interval, 60)  # Minimum 60 seconds to avoid unecessary aggressive polling
 
+def youtube_poll_interval() -> int:
+	# recalculated before every cycle, so added and removed subscriptions are taken into account
+	main.yt_wait_time = calculate_optimal_polling_interval()
+	return main.yt_wait_time
+
+# Both YouTube jobs draw from the daily API quota. The interval is sized to fit it, the budget makes sure reconnects
+# (which run every job right away) and manual interval changes can't overspend it.
+YOUTUBE_QUOTA = PollBudget("YouTube API quota", capacity=10000 * (1.0 - 0.01), window=24 * 60 * 60)
+
+def youtube_poll_cost(platform: str) -> int:
+	# one call per channel and a batched video details call
+	return len(sql.get_all_social_media_subscriptions_for_platform(platform)) + 1
+
 #
 #	API initialization
 #
@@ -131,49 +144,33 @@ def is_likely_premiere(snippet: dict, live_details: dict) -> bool:
 #	Main YT API loop
 #
 
-@reconnect_api_with_backoff(initialize_youtube_client, "YouTube")
 async def check_for_youtube_activities() -> None:
 	"""
-	Main YouTube activity polling loop.
+	One YouTube activity polling cycle, run by the scheduler (see the registrations at the end).
 	"""
-	first_run_public = True
-
-	main.logger.info(f"Starting the Youtube activity sharing task...\n")
-	# Initialize wait_time from currently calculated value (may be updated externally)
-	main.yt_wait_time = calculate_optimal_polling_interval()
-
-	while True:
-		try:
-			# Fetch all Youtube subscriptions from the database
-			youtube_subscriptions = sql.get_all_social_media_subscriptions_for_platform("YouTube")
-
-			pending_notifications = []
-			video_ids_to_check = []
-
-			for channel_id in youtube_subscriptions:
-				try:
-					activity_info = fetch_latest_youtube_activity(channel_id)
-					if activity_info:
-						pending_notifications.append(activity_info)
-						if activity_info["video_id"]:
-							video_ids_to_check.append(activity_info["video_id"])
-				except Exception as e:
-					main.logger.error(f"Error processing activities for channel {channel_id}: {e}\n")
-			
-			video_metadata_map = batch_fetch_activity_metadata(video_ids_to_check)
-
-			await process_youtube_notifications(pending_notifications, video_metadata_map)
-			if first_run_public:
-				if hasattr(main, "startup") and main.startup.silent:
-					await main.startup.task_finished_first_run()
-				first_run_public = False
-				main.logger.info(f"Finished first run of Youtube activity sharing task.\n")
+	try:
+		# Fetch all Youtube subscriptions from the database
+		youtube_subscriptions = sql.get_all_social_media_subscriptions_for_platform("YouTube")
+
+		pending_notifications = []
+		video_ids_to_check = []
+
+		for channel_id in youtube_subscriptions:
+			try:
+				activity_info = fetch_latest_youtube_activity(channel_id)
+				if activity_info:
+					pending_notifications.append(activity_info)
+					if activity_info["video_id"]:
+						video_ids_to_check.append(activity_info["video_id"])
+			except Exception as e:
+				main.logger.error(f"Error processing activities for channel {channel_id}: {e}\n")
 		
-		except Exception as e:
-			main.logger.error(f"Error inside Youtube activity loop: {e}\n")
+		video_metadata_map = batch_fetch_activity_metadata(video_ids_to_check)
 
-		# simple sleep; loop will pick up any main.yt_wait_time changes next iteration
-		await asyncio.sleep(main.yt_wait_time)
+		await process_youtube_notifications(pending_notifications, video_metadata_map)
+	
+	except Exception as e:
+		main.logger.error(f"Error inside Youtube activity loop: {e}\n")
 
 def fetch_latest_youtube_activity(channel_id: str) -> dict | None:
 	"""
@@ -295,7 +292,6 @@ async def process_youtube_notifications(pending_notifications: list[dict], video
 		virtual_id = video_id + phase_suffix
 		if sql.check_post_match(item["internal_channel_id"], virtual_id):
 			continue
-		sql.update_latest_post(item["internal_channel_id"], virtual_id, title)
 
 		main.logger.info(f"New activity detected for channel {item['channel_name']} ({item['internal_channel_id']})")
 		main.logger.info(f"Activity type: {detected_status}")
@@ -303,82 +299,65 @@ async def process_youtube_notifications(pending_notifications: list[dict], video
 		main.logger.info(f"Video title: {title}")
 		main.logger.info(f"members only: {members_only}")
 
+		deliveries = []
 		if not main.startup.silent:
-			for discord_channel in item["discord_channels"]:
-				await bot.notify_youtube_activity(
-					discord_channel,
-					detected_status,
-					item["channel_name"],
-					item["video_id"],
-					members_only)
+			notification = bot.render_youtube_activity(detected_status, item["channel_name"], item["video_id"], members_only)
+			if notification:
+				deliveries = [(discord_channel, notification) for discord_channel in item["discord_channels"]]
 		else:
 			main.logger.info(f"Skipping notification for YouTube video {video_id} due to silent start.\n")
 
+		# the post is marked seen in the same transaction that stores its notifications in the outbox
+		outbox_ids = sql.update_latest_post(item["internal_channel_id"], virtual_id, title, outbox=bot.outbox_entries(deliveries))
+		bot.enqueue_outbox_deliveries(deliveries, outbox_ids)
+
 #
 #	Youtube Members-Only activity loop
 #
 
-@reconnect_api_with_backoff(initialize_youtube_client, "YouTube")
 async def check_for_members_only_youtube_activity() -> None:
 	"""
-	Main YouTube Members-Only activity polling loop.
+	One YouTube Members-Only activity polling cycle, run by the scheduler (see the registrations at the end).
 	"""
-	first_run_members_only = True
-
-	main.logger.info(f"Starting the Members-Only Youtube activity sharing task...\n")
-
-	# Use the shared main.yt_wait_time and allow dynamic updates via event
-	main.yt_wait_time = calculate_optimal_polling_interval()
-
-	while True:
-		try:
-			youtube_subscriptions = sql.get_all_social_media_subscriptions_for_platform("YouTube_members")
-
-			pending_notifications = []
-			video_ids_to_check = []
+	try:
+		youtube_subscriptions = sql.get_all_social_media_subscriptions_for_platform("YouTube_members")
 
+		pending_notifications = []
+		video_ids_to_check = []
 
-			for channel_url in youtube_subscriptions:
-				internal_id = sql.get_id_for_channel_url(channel_url, "YouTube_members")
-				channel_name = sql.get_channel_name(internal_id)
 
-				try:
-					members_only_videos = fetch_latest_members_only_content(channel_url, 1)
+		for channel_url in youtube_subscriptions:
+			internal_id = sql.get_id_for_channel_url(channel_url, "YouTube_members")
+			channel_name = sql.get_channel_name(internal_id)
 
-					for video_id in members_only_videos:
+			try:
+				members_only_videos = fetch_latest_members_only_content(channel_url, 1)
 
-						if sql.check_post_match(internal_id, video_id):
-							continue  # already processed
+				for video_id in members_only_videos:
 
-						pending_notifications.append({
-							"internal_channel_id": internal_id,
-							"channel_name": channel_name,
-							"activity_id": video_id,
-							"title": "(unknown title - resolving)",
-							"activity_type": "membersOnlyContent",
-							"video_id": video_id,
-							"discord_channels": sql.get_discord_channels_for_social_channel(internal_id)
-						})
-						video_ids_to_check.append(video_id)
+					if sql.check_post_match(internal_id, video_id):
+						continue  # already processed
 
-				except Exception as e:
-					main.logger.error(f"Error checking members-only playlist for {channel_name}: {e}\n")
+					pending_notifications.append({
+						"internal_channel_id": internal_id,
+						"channel_name": channel_name,
+						"activity_id": video_id,
+						"title": "(unknown title - resolving)",
+						"activity_type": "membersOnlyContent",
+						"video_id": video_id,
+						"discord_channels": sql.get_discord_channels_for_social_channel(internal_id)
+					})
+					video_ids_to_check.append(video_id)
 
-				video_metadata_map = batch_fetch_activity_metadata(set(video_ids_to_check))
-				
-				await process_youtube_notifications(pending_notifications, video_metadata_map)
-				
-				if first_run_members_only:
-					if hasattr(main, "startup") and main.startup.silent:
-						await main.startup.task_finished_first_run()
-					first_run_members_only = False
-					main.logger.info(f"Finished first run of Members-Only Youtube activity sharing task.\n")
+			except Exception as e:
+				main.logger.error(f"Error checking members-only playlist for {channel_name}: {e}\n")
 
-		except Exception as e:
-			main.logger.error(f"Error inside members-only Youtube activity loop: {e}\n")
+		video_metadata_map = batch_fetch_activity_metadata(set(video_ids_to_check))
+		
+		await process_youtube_notifications(pending_notifications, video_metadata_map)
 
-		# simple sleep; loop will pick up any main.yt_wait_time changes next iteration
-		await asyncio.sleep(main.yt_wait_time)
+	except Exception as e:
+		main.logger.error(f"Error inside members-only Youtube activity loop: {e}\n")
 
 def fetch_latest_members_only_content(channel_url: str, number_of_items: 1) -> list[str]:
 	"""
@@ -401,3 +380,8 @@ def fetch_latest_members_only_content(channel_url: str, number_of_items: 1) -> l
 			video_ids.append(video_id)
 
 	return video_ids
+
+poll_scheduler.register("YouTube activities", check_for_youtube_activities, interval=youtube_poll_interval, group="youtube",
+	budget=YOUTUBE_QUOTA, cost=lambda: youtube_poll_cost("YouTube"), reports_first_run=True)
+poll_scheduler.register("YouTube members-only content", check_for_members_only_youtube_activity, interval=youtube_poll_interval, group="youtube",
+	budget=YOUTUBE_QUOTA, cost=lambda: youtube_poll_cost("YouTube_members"), reports_first_run=True)